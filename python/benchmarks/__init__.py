@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+
+"""
+Benchmarks for digicert_client.  Nothing in this package talks to DigiCert; the
+benchmarks run against the local stand-in server in benchmarks.standin.
+"""
+
+import math
+
+
+def percentile(samples, pct):
+    """Return the pct'th percentile (0-100) of samples using the nearest-rank method."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    # pct * n first: pct / 100.0 * n is inexact, e.g. 7.000000000000001 for the 7th of 100
+    rank = int(math.ceil(pct * len(ordered) / 100.0)) - 1
+    return ordered[min(max(rank, 0), len(ordered) - 1)]
+
+
+def summarize(samples, elapsed):
+    """Summarize a list of latencies (seconds) gathered over elapsed seconds of wall time."""
+    return {
+        'count': len(samples),
+        'throughput': len(samples) / elapsed if elapsed else 0.0,
+        'p50': percentile(samples, 50),
+        'p90': percentile(samples, 90),
+        'p99': percentile(samples, 99),
+        'max': max(samples) if samples else None,
+    }
+
+
+if __name__ == '__main__':
+    pass
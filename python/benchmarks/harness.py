@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+
+"""
+Throughput and latency benchmark of CertificateOrder operations against the local
+stand-in server, e.g.
+
+    python -m benchmarks.harness --operations place,view,download --requests 500 --concurrency 8 \\
+        --latency 0.002 --organizations 1000 --domains 1000
+
+With --proxy-latency the requests are tunnelled through a local CONNECT proxy, and with --pool
+they share a ConnectionPool, e.g. to compare kept-alive tunnels against one tunnel per request:
+
+    python -m benchmarks.harness --operations view --proxy-latency 0.002 --pool
+"""
+
+import json
+import threading
+from argparse import ArgumentParser
+from timeit import default_timer
+
+from digicert_client import CertificateOrder
+from digicert_client.https import VerifiedHTTPSConnection
+from digicert_client.https.pool import ConnectionPool
+
+from . import summarize
+from .standin import StandInServer, TunnelProxy, STANDIN_ORDER, CA_FILE
+
+
+OPERATIONS = {
+    'place': lambda order, i: order.place(**STANDIN_ORDER),
+    'view': lambda order, i: order.view(digicert_order_id=str(i + 1)),
+    'view_all': lambda order, i: order.view_all(),
+    'download': lambda order, i: order.download(digicert_order_id=str(i + 1)),
+    'upload_csr': lambda order, i: order.upload_csr(digicert_order_id=str(i + 1), csr_text=STANDIN_ORDER['csr']),
+    'list_duplicates': lambda order, i: order.list_duplicates(digicert_order_id=str(i + 1)),
+    'download_duplicate': lambda order, i: order.download_duplicate(digicert_order_id=str(i + 1), sub_id='001'),
+    'create_duplicate': lambda order, i: order.create_duplicate(
+        digicert_order_id=str(i + 1),
+        certificate={'common_name': 'example.com', 'csr': STANDIN_ORDER['csr'], 'signature_hash': 'sha256'}),
+}
+
+
+def _failed(response):
+    if isinstance(response, dict):
+        return response.get('http_status', response.get('status', 200)) >= 300
+    return False
+
+
+def make_order(host, port, pool=None, proxy=None, **kwargs):
+    """
+    A CertificateOrder talking to the stand-in server with peer verification against its CA,
+    through pool (a ConnectionPool) if given and tunnelled through proxy, a (host, port), if given.
+    """
+    if pool is not None:
+        conn = pool.connection(host, port, proxy=proxy)
+    else:
+        conn = VerifiedHTTPSConnection(proxy[0] if proxy else host, port=proxy[1] if proxy else port,
+                                       ca_file=CA_FILE)
+        if proxy:
+            conn.set_tunnel(host, port)
+    return CertificateOrder(host=host, customer_api_key='BENCHMARK-KEY', conn=conn, **kwargs)
+
+
+def run(operation, host, port, requests, concurrency, **order_kwargs):
+    """
+    Run operation `requests` times spread over `concurrency` threads, each with its own
+    CertificateOrder, and return a summary of the observed latencies.
+    """
+    func = OPERATIONS[operation]
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    counter = iter(xrange(requests))
+
+    def worker():
+        order = make_order(host, port, **order_kwargs)
+        own = []
+        failed = 0
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            started = default_timer()
+            try:
+                if _failed(func(order, i)):
+                    failed += 1
+            except Exception:
+                failed += 1
+            own.append(default_timer() - started)
+        with lock:
+            latencies.extend(own)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = default_timer()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    summary = summarize(latencies, default_timer() - started)
+    summary['operation'] = operation
+    summary['errors'] = errors[0]
+    return summary
+
+
+def format_summary(summary):
+    ms = lambda seconds: '%9.2f' % (seconds * 1000) if seconds is not None else '%9s' % '-'
+    return '%-20s %7d %6d %10.1f %s %s %s %s' % (
+        summary['operation'], summary['count'], summary['errors'], summary['throughput'],
+        ms(summary['p50']), ms(summary['p90']), ms(summary['p99']), ms(summary['max']))
+
+
+def main():
+    parser = ArgumentParser(description='Benchmark CertificateOrder operations against a local stand-in server')
+    parser.add_argument('--operations', default='place,view,download',
+                        help='comma-separated list of: %s' % ', '.join(sorted(OPERATIONS)))
+    parser.add_argument('--requests', type=int, default=200, help='requests per operation')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.0, help='server-side seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--organizations', type=int, default=1)
+    parser.add_argument('--domains', type=int, default=1)
+    parser.add_argument('--orders', type=int, default=10)
+    parser.add_argument('--padding', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--compression', choices=['gzip', 'deflate'], help='compress response bodies')
+    parser.add_argument('--bandwidth', type=int, default=None, help='simulated link speed in bytes per second')
+    parser.add_argument('--proxy-latency', type=float, default=None,
+                        help='tunnel through a local proxy adding this many seconds to each CONNECT')
+    parser.add_argument('--pool', action='store_true', help='keep connections alive in a ConnectionPool')
+    parser.add_argument('--json', dest='json_path', help='also write the results to this file as JSON')
+    args = parser.parse_args()
+
+    server = StandInServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                           organizations=args.organizations, domains=args.domains, orders=args.orders,
+                           padding=args.padding, seed=args.seed, compression=args.compression,
+                           bandwidth=args.bandwidth)
+    proxy = TunnelProxy(latency=args.proxy_latency) if args.proxy_latency is not None else None
+    pool = ConnectionPool(ca_file=CA_FILE) if args.pool else None
+    results = []
+    with server:
+        if proxy is not None:
+            proxy.start()
+        print '%-20s %7s %6s %10s %9s %9s %9s %9s' % (
+            'operation', 'count', 'errors', 'req/s', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms')
+        for operation in args.operations.split(','):
+            summary = run(operation.strip(), 'localhost', server.port, args.requests, args.concurrency,
+                          pool=pool, proxy=('localhost', proxy.port) if proxy is not None else None)
+            print format_summary(summary)
+            results.append(summary)
+        hits = dict(server.hits)
+        if proxy is not None:
+            proxy.stop()
+            hits['tunnels'] = proxy.tunnels
+    if pool is not None:
+        pool.clear()
+        print 'pool: %s' % ', '.join('%s=%s' % item for item in sorted(pool.stats.items()))
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'arguments': vars(args), 'results': results, 'server_hits': hits}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
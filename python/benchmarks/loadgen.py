@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+
+"""
+Non-interactive batch/load client.  Reads operations from a CSV or JSONL file, runs them
+with the requested concurrency and rate, prints live throughput and latency percentiles
+to stderr and writes one NDJSON result per item, e.g.
+
+    python -m benchmarks.loadgen items.jsonl --standin --concurrency 8 --rate 50 --results out.ndjson
+    python -m benchmarks.loadgen items.csv --host www.digicert.com --api-key $DIGICERT_API_KEY
+
+Every item has an 'op' of 'place' (or 'order'), 'view' or 'download'.  'place' items carry
+the order properties accepted by CertificateOrder.place(); in CSV files list-valued
+properties such as 'sans' are separated by semicolons.  'view' and 'download' items carry
+an 'order_id' (or, for download, a 'certificate_id').
+"""
+
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+from Queue import Queue
+from timeit import default_timer
+
+from digicert_client import CertificateOrder
+from digicert_client.https import VerifiedHTTPSConnection
+
+from . import summarize
+from .standin import StandInServer, CA_FILE
+
+
+LIST_FIELDS = ('sans', 'dns_names', 'organization_units')
+
+
+def read_items(path):
+    """
+    Yield (line number, item dict) for every item in a CSV or JSONL file.  Raises ValueError,
+    naming the file and line, for a line that cannot be parsed.
+    """
+    with open(path) as f:
+        if path.endswith('.csv'):
+            reader = csv.DictReader(f)
+            try:
+                for row in reader:
+                    item = dict((k, v) for k, v in row.items() if v not in (None, ''))
+                    for field in LIST_FIELDS:
+                        if field in item:
+                            item[field] = [v.strip() for v in item[field].split(';') if v.strip()]
+                    yield reader.line_num, item
+            except csv.Error as e:
+                raise ValueError('%s line %d: %s' % (path, reader.line_num, e))
+        else:
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        item = json.loads(line)
+                    except ValueError as e:
+                        raise ValueError('%s line %d: %s' % (path, number, e))
+                    if not isinstance(item, dict):
+                        raise ValueError('%s line %d: not a JSON object' % (path, number))
+                    yield number, item
+
+
+def run_item(order, item):
+    fields = dict(item)
+    op = fields.pop('op', 'place')
+    if op in ('place', 'order'):
+        return order.place(**fields)
+    elif 'view' == op:
+        return order.view(digicert_order_id=fields['order_id'])
+    elif 'download' == op:
+        return order.download(digicert_order_id=fields.get('order_id'),
+                              digicert_certificate_id=fields.get('certificate_id'))
+    raise ValueError('Unsupported op "%s"' % op)
+
+
+def describe(response):
+    """Reduce a CertificateOrder response to the fields worth keeping in a result line."""
+    if not isinstance(response, dict):
+        return {'status': 200}
+    result = {'status': response.get('http_status', response.get('status'))}
+    if 'id' in response:
+        result['order_id'] = response['id']
+    if 'certificates' in response:
+        result['certificates'] = len(response['certificates'])
+    if 'errors' in response:
+        result['error'] = response['errors']
+    elif result['status'] >= 300 and 'response' in response:
+        result['error'] = response['response']
+    return result
+
+
+class Stats(object):
+    """Latencies and error counts, cumulative and for the current reporting window."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = default_timer()
+        self.latencies = []
+        self.window = []
+        self.window_started = self.started
+        self.errors = 0
+
+    def add(self, latency, failed):
+        with self.lock:
+            self.latencies.append(latency)
+            self.window.append(latency)
+            if failed:
+                self.errors += 1
+
+    def report(self, final=False):
+        with self.lock:
+            now = default_timer()
+            if final:
+                samples, elapsed = self.latencies, now - self.started
+            else:
+                samples, elapsed = self.window, now - self.window_started
+                self.window = []
+                self.window_started = now
+            s = summarize(samples, elapsed)
+            ms = lambda seconds: seconds * 1000 if seconds is not None else 0.0
+            return '%s%6d done %5d errors %8.1f req/s  p50 %7.1f  p90 %7.1f  p99 %7.1f ms' % (
+                'total ' if final else '', len(self.latencies), self.errors, s['throughput'],
+                ms(s['p50']), ms(s['p90']), ms(s['p99']))
+
+
+def main():
+    parser = ArgumentParser(description='Run orders, views and downloads from a CSV or JSONL file')
+    parser.add_argument('items', help='CSV (.csv) or JSONL file of items')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=None)
+    parser.add_argument('--api-key', default=os.environ.get('DIGICERT_API_KEY', 'LOADGEN-KEY'),
+                        help='API key (default: $DIGICERT_API_KEY)')
+    parser.add_argument('--customer-name', default=None, help='account number, selects the V1 API')
+    parser.add_argument('--ca-file', default=None, help='CA bundle used to verify the host')
+    parser.add_argument('--standin', action='store_true', help='run against a local stand-in server')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=0, help='maximum items started per second (0: unlimited)')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between progress lines')
+    parser.add_argument('--results', default='-', help='NDJSON result file (default: stdout)')
+    args = parser.parse_args()
+
+    server = None
+    if args.standin:
+        server = StandInServer().start()
+        args.host, args.port, args.ca_file = 'localhost', server.port, CA_FILE
+
+    out = sys.stdout if '-' == args.results else open(args.results, 'w')
+    out_lock = threading.Lock()
+    stats = Stats()
+    queue = Queue(maxsize=args.concurrency * 2)
+
+    def worker():
+        conn = VerifiedHTTPSConnection(args.host, port=args.port, ca_file=args.ca_file)
+        order = CertificateOrder(host=args.host, customer_api_key=args.api_key,
+                                 customer_name=args.customer_name, conn=conn)
+        while True:
+            entry = queue.get()
+            if entry is None:
+                break
+            number, item = entry
+            started = default_timer()
+            try:
+                result = describe(run_item(order, item))
+            except Exception as e:
+                result = {'status': None, 'error': '%s: %s' % (e.__class__.__name__, e)}
+            latency = default_timer() - started
+            stats.add(latency, result.get('status') is None or result['status'] >= 300)
+            result.update({'line': number, 'op': item.get('op', 'place'), 'latency': round(latency, 6)})
+            with out_lock:
+                out.write(json.dumps(result) + '\n')
+
+    def reporter():
+        while not done.wait(args.interval):
+            sys.stderr.write(stats.report() + '\n')
+
+    done = threading.Event()
+    workers = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    for thread in workers:
+        thread.start()
+    progress = threading.Thread(target=reporter)
+    progress.daemon = True
+    progress.start()
+
+    started = default_timer()
+    invalid = None
+    try:
+        for i, entry in enumerate(read_items(args.items)):
+            if args.rate:
+                delay = started + i / args.rate - default_timer()
+                if delay > 0:
+                    time.sleep(delay)
+            queue.put(entry)
+    except ValueError as e:
+        invalid = e
+    finally:
+        # also on errors, or the workers would wait for items forever
+        for _ in workers:
+            queue.put(None)
+        for thread in workers:
+            thread.join()
+        done.set()
+    if invalid is not None:
+        sys.stderr.write('Invalid item: %s\n' % invalid)
+    sys.stderr.write(stats.report(final=True) + '\n')
+
+    if out is not sys.stdout:
+        out.close()
+    if server:
+        server.stop()
+    return 2 if invalid is not None else 1 if stats.errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
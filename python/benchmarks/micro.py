@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+
+"""
+Microbenchmarks of the client's pure-Python hot paths, compared against the stored
+baselines in baselines.json:
+
+    python -m benchmarks.micro                 # run and compare against the baselines
+    python -m benchmarks.micro --save          # run and store the results as the new baselines
+    python -m benchmarks.micro --filter verify # run only the cases whose names contain 'verify'
+
+The exit status is 1 if any case is slower than its baseline by more than --threshold.
+Baselines are only comparable on the machine (and Python) they were recorded on.  They are
+only ever written by --save: a case is recorded with --save --filter <case> in the change that
+adds it, and a run of --save without --filter replaces the whole file.
+"""
+
+import json
+import os
+import platform
+import sys
+from argparse import ArgumentParser
+from timeit import Timer
+
+from digicert_client import CertificateOrder
+from digicert_client.api.commands import Command
+from digicert_client.api.commands.v1 import OrderCertificateCommand as OrderCertificateCommandV1
+from digicert_client.api.commands.v2 import OrderCertificateCommand as OrderCertificateCommandV2
+from digicert_client.api.commands.v2 import OrderDuplicateCommand, DuplicateTemplate
+from digicert_client.api.queries.v2 import DownloadCertificateQuery, DownloadDuplicateQuery
+from digicert_client.https import verify_peer
+from digicert_client.inventory import OrderTable
+
+from .standin import StandInServer, STANDIN_ORDER, SERVER_CERT, CA_FILE, _read_pem
+
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'baselines.json')
+
+CASES = []
+
+
+def case(func):
+    """Register a benchmark case.  The decorated function does its setup and returns the callable to time."""
+    CASES.append(func)
+    return func
+
+
+class _CannedResponse(object):
+    def __init__(self, status, reason, body):
+        self.status = status
+        self.reason = reason
+        self.body = body
+        self.offset = 0
+
+    def read(self, amt=None):
+        end = len(self.body) if amt is None else self.offset + amt
+        data = self.body[self.offset:end]
+        self.offset += len(data)
+        return data
+
+    def getheader(self, name, default=None):
+        return default
+
+
+class _CannedConnection(object):
+    """Connection that answers every request with the same pre-serialized body."""
+
+    def __init__(self, body, status=200, reason='OK'):
+        self.response = _CannedResponse(status, reason, body)
+
+    def request(self, method, path, body=None, headers=None):
+        pass
+
+    def getresponse(self):
+        self.response.offset = 0
+        return self.response
+
+    def close(self):
+        pass
+
+
+def _peer_certificate(san_count):
+    sans = [('DNS', 'host%d.example.com' % i) for i in range(san_count)]
+    sans += [('DNS', '*.zone%d.example.net' % i) for i in range(san_count / 10)]
+    return {
+        'subject': ((('organizationName', u'Example, Inc.'),), (('commonName', u'www.example.com'),)),
+        'subjectAltName': tuple(sans),
+    }
+
+
+@case
+def verify_peer_1000_sans():
+    cert = _peer_certificate(1000)
+    return lambda: verify_peer('host999.example.com', cert)
+
+
+@case
+def verify_peer_1000_sans_wildcard():
+    cert = _peer_certificate(1000)
+    return lambda: verify_peer('www.zone99.example.net', cert)
+
+
+@case
+def verify_peer_1000_sans_fingerprint():
+    cert = _peer_certificate(1000)
+    return lambda: verify_peer('host999.example.com', cert, 'FINGERPRINT')
+
+
+@case
+def action_get_params():
+    fields = dict(STANDIN_ORDER, sans=['www%d.example.com' % i for i in range(10)])
+    return lambda: Command(customer_api_key='BENCHMARK-KEY', **fields).get_params()
+
+
+@case
+def v2_command_get_params():
+    fields = dict(STANDIN_ORDER, organization_id=1)
+    return lambda: OrderCertificateCommandV2(customer_api_key='BENCHMARK-KEY', **fields).get_params()
+
+
+@case
+def v1_command_get_params():
+    return lambda: OrderCertificateCommandV1(customer_api_key='BENCHMARK-KEY', customer_name='012345',
+                                             **STANDIN_ORDER).get_params()
+
+
+@case
+def v2_command_cached_params_retried():
+    fields = dict(STANDIN_ORDER, organization_id=1)
+    command = OrderCertificateCommandV2(customer_api_key='BENCHMARK-KEY', cache_params=True, **fields)
+    return command.get_params
+
+
+_DUPLICATE = {'common_name': 'example.com', 'server_platform': {'id': 2}, 'signature_hash': 'sha256',
+              'organization_units': ['Operations'], 'dns_names': ['lb%d.example.com' % i for i in range(20)]}
+
+
+@case
+def duplicate_get_params():
+    certificate = dict(_DUPLICATE, csr=_read_pem(SERVER_CERT))
+    return lambda: OrderDuplicateCommand(customer_api_key='BENCHMARK-KEY', digicert_order_id=1,
+                                         certificate=certificate).get_params()
+
+
+@case
+def duplicate_template_get_params():
+    template = DuplicateTemplate(**_DUPLICATE)
+    overrides = {'csr': _read_pem(SERVER_CERT)}
+    return lambda: OrderDuplicateCommand(customer_api_key='BENCHMARK-KEY', digicert_order_id=1, template=template,
+                                         certificate=overrides).get_params()
+
+
+@case
+def action_make_response():
+    action = Command(customer_api_key='BENCHMARK-KEY')
+    payload = dict(('field_%d' % i, {'id': i, 'name': 'value %d' % i}) for i in range(200))
+    return lambda: action._make_response(200, 'OK', payload)
+
+
+@case
+def matching_organization_5000_orgs():
+    orgs = [{
+        'id': i,
+        'name': 'Organization %d' % i,
+        'address': STANDIN_ORDER['org_addr1'],
+        'city': STANDIN_ORDER['org_city'],
+        'state': STANDIN_ORDER['org_state'],
+        'zip': STANDIN_ORDER['org_zip'],
+        'country': STANDIN_ORDER['org_country'],
+    } for i in range(5000)]
+    orgs[-1]['name'] = STANDIN_ORDER['org_name']
+    order = CertificateOrder(host='localhost', customer_api_key='BENCHMARK-KEY',
+                             conn=_CannedConnection(json.dumps({'organizations': orgs})))
+    return lambda: order._get_matching_organization_id(100, **STANDIN_ORDER)
+
+
+def _order_listing(count):
+    return json.dumps({'orders': [StandInServer._order(i) for i in range(count)]})
+
+
+@case
+def view_all_10000_orders():
+    order = CertificateOrder(host='localhost', customer_api_key='BENCHMARK-KEY',
+                             conn=_CannedConnection(_order_listing(10000)))
+    return lambda: len(order.view_all())
+
+
+@case
+def view_all_stream_10000_orders():
+    order = CertificateOrder(host='localhost', customer_api_key='BENCHMARK-KEY',
+                             conn=_CannedConnection(_order_listing(10000)))
+    return lambda: sum(1 for _ in order.view_all(stream=True))
+
+
+@case
+def view_all_models_10000_orders():
+    order = CertificateOrder(host='localhost', customer_api_key='BENCHMARK-KEY', models=True,
+                             conn=_CannedConnection(_order_listing(10000)))
+    return lambda: len(order.view_all())
+
+
+@case
+def inventory_expiring_100000_orders():
+    statuses = ('issued', 'pending', 'revoked')
+    orders = []
+    for i in range(100000):
+        order = StandInServer._order(i)
+        order['status'] = statuses[i % 3]
+        order['certificate']['valid_till'] = '20%02d-01-01' % (20 + i % 15)
+        orders.append(order)
+    table = OrderTable.from_orders(orders)
+    return lambda: table.count_by('product', table.where('status', 'issued') & table.less('valid_till', '2030-01-01'))
+
+
+@case
+def download_certificate_pem_split():
+    query = DownloadCertificateQuery(customer_api_key='BENCHMARK-KEY', certificate_id='1')
+    chain = _read_pem(SERVER_CERT) + _read_pem(CA_FILE) + _read_pem(CA_FILE)
+    return lambda: query._subprocess_response(200, 'OK', chain)
+
+
+@case
+def download_duplicate_pem_split_50():
+    query = DownloadDuplicateQuery(customer_api_key='BENCHMARK-KEY', order_id='1', sub_id='001')
+    chain = _read_pem(SERVER_CERT) * 50
+    return lambda: query._subprocess_response(200, 'OK', chain)
+
+
+def measure(func, repeat=5, min_time=0.2):
+    """Return the best observed seconds per call of func."""
+    timer = Timer(func)
+    number = 1
+    while True:
+        if timer.timeit(number) >= min_time:
+            break
+        number *= 2
+    return min(timer.repeat(repeat, number)) / number
+
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)['cases']
+
+
+def save_baselines(path, results):
+    with open(path, 'w') as f:
+        json.dump({
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cases': results,
+        }, f, indent=2, sort_keys=True, separators=(',', ': '))
+        f.write('\n')
+
+
+def compare(name, seconds, baseline, threshold):
+    if baseline is None:
+        return '%-36s %12.2f %12s %8s  new' % (name, seconds * 1e6, '-', '-')
+    ratio = seconds / baseline
+    if ratio > 1 + threshold:
+        verdict = 'REGRESSED'
+    elif ratio < 1 - threshold:
+        verdict = 'improved'
+    else:
+        verdict = 'ok'
+    return '%-36s %12.2f %12.2f %7.2fx  %s' % (name, seconds * 1e6, baseline * 1e6, ratio, verdict)
+
+
+def main():
+    parser = ArgumentParser(description='Microbenchmarks of digicert_client hot paths')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='baseline file (default: %(default)s)')
+    parser.add_argument('--save', action='store_true', help='store the results as the new baselines')
+    parser.add_argument('--filter', default='', help='only run cases whose names contain this string')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='relative slowdown reported as a regression (default: %(default)s)')
+    args = parser.parse_args()
+
+    baselines = load_baselines(args.baseline)
+    results = {}
+    regressed = False
+    print '%-36s %12s %12s %8s' % ('case', 'us/call', 'baseline', 'ratio')
+    for func in CASES:
+        name = func.__name__
+        if args.filter not in name:
+            continue
+        results[name] = measure(func(), repeat=args.repeat)
+        line = compare(name, results[name], baselines.get(name), args.threshold)
+        regressed = regressed or line.endswith('REGRESSED')
+        print line
+    if args.save:
+        if not args.filter:
+            # every case was run: drop the baselines of cases that no longer exist
+            baselines = {}
+        baselines.update(results)
+        save_baselines(args.baseline, baselines)
+    return 1 if regressed and not args.save else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
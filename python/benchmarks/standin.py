@@ -0,0 +1,468 @@
+#!/usr/bin/env python
+
+"""
+A local HTTPS stand-in for the DigiCert V1/V2 endpoints used by digicert_client.
+
+The server certificate in certs/ is issued for localhost and 127.0.0.1 by a throwaway
+self-signed CA (certs/ca.pem) whose private key was not kept; clients verify against
+CA_FILE.  To regenerate both, run:
+
+    openssl req -x509 -newkey rsa:2048 -nodes -keyout ca-key.pem -out ca.pem -days 36500 \\
+        -subj "/O=digicert_client benchmarks/CN=Stand-in Root CA"
+    openssl req -newkey rsa:2048 -nodes -keyout server-key.pem -out server.csr \\
+        -subj "/O=digicert_client benchmarks/CN=localhost"
+    openssl x509 -req -in server.csr -CA ca.pem -CAkey ca-key.pem -out server.pem -days 36500 \\
+        -sha256 -extfile <(echo "subjectAltName = DNS:localhost, IP:127.0.0.1")
+
+Run it standalone with 'python -m benchmarks.standin --port 8443'.
+"""
+
+import json
+import os
+import random
+import re
+import select
+import socket
+import ssl
+import threading
+import time
+import zlib
+from argparse import ArgumentParser
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn, ThreadingTCPServer, StreamRequestHandler
+from urlparse import urlparse, parse_qs
+
+
+CERT_DIR = os.path.join(os.path.dirname(__file__), 'certs')
+CA_FILE = os.path.join(CERT_DIR, 'ca.pem')
+SERVER_CERT = os.path.join(CERT_DIR, 'server.pem')
+SERVER_KEY = os.path.join(CERT_DIR, 'server-key.pem')
+
+CONTAINER_ID = 100
+
+# Order properties that match the first organization and domain served by the stand-in,
+# suitable for CertificateOrder.place(**STANDIN_ORDER).
+STANDIN_ORDER = {
+    'certificate_type': 'sslplus',
+    'validity': 1,
+    'common_name': 'example.com',
+    'csr': '-----BEGIN CERTIFICATE REQUEST-----\r\nMIIBstandin\r\n-----END CERTIFICATE REQUEST-----',
+    'org_name': 'Example, Inc.',
+    'org_addr1': '123 Nowhere Lane',
+    'org_city': 'Nowhere',
+    'org_state': 'UT',
+    'org_zip': '84321',
+    'org_country': 'US',
+    'org_contact_firstname': 'William',
+    'org_contact_lastname': 'Billson',
+    'org_contact_email': 'bbillson@example.com',
+    'org_contact_telephone': '8015551234',
+}
+
+
+def _read_pem(path):
+    with open(path) as f:
+        return '\r\n'.join(line.rstrip('\r\n') for line in f) + '\r\n'
+
+
+class _Background(object):
+    """Running a SocketServer on a background thread, as a context manager."""
+
+    _thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        """Serve requests on a background thread and return self."""
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+class StandInServer(_Background, ThreadingMixIn, HTTPServer):
+    """
+    Threaded HTTPS server emulating the DigiCert endpoints.  Response latency, list sizes
+    and the rate of injected 500 errors are configurable; list bodies are serialized once
+    at startup so that the server's own CPU use stays out of the measurements.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self,
+                 host='localhost',
+                 port=0,
+                 latency=0.0,
+                 jitter=0.0,
+                 error_rate=0.0,
+                 organizations=1,
+                 domains=1,
+                 orders=10,
+                 padding=0,
+                 seed=None,
+                 compression=None,
+                 bandwidth=None):
+        """
+        :param host: Interface to listen on
+        :param port: Port to listen on, 0 picks a free port (see the port attribute)
+        :param latency: Seconds added to every response
+        :param jitter: Up to this many additional seconds, chosen at random, are added to every response
+        :param error_rate: Fraction (0-1) of requests that fail with a 500
+        :param organizations: Number of organizations returned for the container
+        :param domains: Number of domains returned for the container
+        :param orders: Number of orders returned by the order listing
+        :param padding: Number of filler characters added to every organization, domain and order
+        :param seed: Optional seed for the random number generator used for jitter and errors
+        :param compression: 'gzip' or 'deflate' to compress bodies of 1 KiB or more for clients that accept it
+        :param bandwidth: Optional bytes per second; writing each body is delayed as if sent over a link this fast
+        """
+        HTTPServer.__init__(self, (host, port), StandInHandler)
+        context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+        context.load_cert_chain(SERVER_CERT, SERVER_KEY)
+        self.socket = context.wrap_socket(self.socket, server_side=True, do_handshake_on_connect=False)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.compression = compression
+        self.bandwidth = bandwidth
+        self.hits = {}
+        self._compressed = {}
+        self._lock = threading.Lock()
+        self._next_id = 1000
+        self._build_bodies(organizations, domains, orders, padding)
+
+    def compressed(self, body):
+        """body compressed with self.compression, cached since most bodies are built at startup."""
+        with self._lock:
+            data = self._compressed.get(body)
+        if data is None:
+            wbits = 16 + zlib.MAX_WBITS if 'gzip' == self.compression else zlib.MAX_WBITS
+            compressor = zlib.compressobj(6, zlib.DEFLATED, wbits)
+            data = compressor.compress(body) + compressor.flush()
+            with self._lock:
+                self._compressed[body] = data
+        return data
+
+    def _build_bodies(self, organizations, domains, orders, padding):
+        filler = 'x' * padding
+        orgs = []
+        for i in range(organizations):
+            orgs.append({
+                'id': i + 1,
+                'name': STANDIN_ORDER['org_name'] if i == 0 else 'Organization %d' % i,
+                'address': STANDIN_ORDER['org_addr1'],
+                'city': STANDIN_ORDER['org_city'],
+                'state': STANDIN_ORDER['org_state'],
+                'zip': STANDIN_ORDER['org_zip'],
+                'country': STANDIN_ORDER['org_country'],
+                'container': {'id': CONTAINER_ID},
+                'comments': filler,
+            })
+        domain_list = []
+        for i in range(domains):
+            domain_list.append({
+                'id': i + 1,
+                'name': STANDIN_ORDER['common_name'] if i == 0 else 'host%d.example.net' % i,
+                'organization': {'id': 1},
+                'container': {'id': CONTAINER_ID},
+                'comments': filler,
+            })
+        order_list = [self._order(i + 1, filler) for i in range(orders)]
+        self.bodies = {
+            'me': json.dumps({'id': 1, 'username': 'standin', 'container': {'id': CONTAINER_ID}}),
+            'organizations': json.dumps({'organizations': orgs}),
+            'domains': json.dumps({'domains': domain_list}),
+            'orders': json.dumps({'orders': order_list, 'page': {'total': orders, 'limit': 0, 'offset': 0}}),
+            'chain': _read_pem(SERVER_CERT) + _read_pem(CA_FILE) + _read_pem(CA_FILE),
+        }
+
+    @staticmethod
+    def _order(order_id, filler=''):
+        return {
+            'id': order_id,
+            'certificate': {
+                'id': order_id,
+                'common_name': 'host%d.example.com' % order_id,
+                'dns_names': ['host%d.example.com' % order_id, 'www.host%d.example.com' % order_id],
+                'valid_till': '2030-01-01',
+                'signature_hash': 'sha256',
+                'server_platform': {'id': -1, 'name': 'OTHER'},
+            },
+            'status': 'issued',
+            'date_created': '2020-01-01T00:00:00+00:00',
+            'organization': {'id': 1, 'name': STANDIN_ORDER['org_name']},
+            'validity_years': 1,
+            'container': {'id': CONTAINER_ID},
+            'product': {'name_id': 'ssl_plus', 'name': 'SSL Plus', 'type': 'ssl_certificate'},
+            'comments': filler,
+        }
+
+    def next_id(self):
+        with self._lock:
+            self._next_id += 1
+            return self._next_id
+
+    def count(self, route):
+        with self._lock:
+            self.hits[route] = self.hits.get(route, 0) + 1
+
+    def handle_error(self, request, client_address):
+        # Clients dropping connections mid-handshake are expected under load; stay quiet.
+        pass
+
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    routes = [
+        ('GET', re.compile(r'^/services/v2/user/me$'), 'me'),
+        ('GET', re.compile(r'^/services/v2/organization$'), 'organizations'),
+        ('GET', re.compile(r'^/services/v2/domain$'), 'domains'),
+        ('GET', re.compile(r'^/services/v2/order/certificate$'), 'orders'),
+        ('GET', re.compile(r'^/services/v2/order/certificate/(\d+)$'), 'order'),
+        ('POST', re.compile(r'^/services/v2/order/certificate/([a-z_]+)$'), 'place'),
+        ('POST', re.compile(r'^/services/v2/order/certificate/(\d+)/csr$'), 'upload_csr'),
+        ('GET', re.compile(r'^/services/v2/order/certificate/(\d+)/duplicate$'), 'duplicates'),
+        ('POST', re.compile(r'^/services/v2/order/certificate/(\d+)/duplicate$'), 'create_duplicate'),
+        ('GET', re.compile(r'^/services/v2/certificate/(\d+)/download/format/pem_all$'), 'download'),
+        ('GET', re.compile(r'^/services/v2/certificate/download/order/(\d+)$'), 'download'),
+        ('POST', re.compile(r'^/clients/retail/api/$'), 'v1'),
+    ]
+
+    # Buffer each response so its status line, headers and body go out in one write, and send it
+    # without waiting for the client to acknowledge earlier writes (e.g. TLS session tickets);
+    # otherwise Nagle's algorithm and the client's delayed ACKs stall responses by ~40 ms.
+    wbufsize = -1
+
+    def setup(self):
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.request.do_handshake()
+        BaseHTTPRequestHandler.setup(self)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def _dispatch(self, method):
+        length = int(self.headers.getheader('Content-Length') or 0)
+        body = self.rfile.read(length) if length else ''
+        url = urlparse(self.path)
+        query = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+        server = self.server
+        if server.latency or server.jitter:
+            time.sleep(server.latency + server.random.uniform(0, server.jitter))
+        for route_method, pattern, name in self.routes:
+            match = pattern.match(url.path)
+            if match and route_method == method:
+                break
+        else:
+            return self._send_json(404, {'errors': [{'code': 'not_found', 'message': 'No such endpoint'}]})
+        server.count(name)
+        if not (self.headers.getheader('X-DC-DEVKEY') or self.headers.getheader('Authorization')):
+            return self._send_json(401, {'errors': [{'code': 'access_denied', 'message': 'No API key'}]})
+        if server.error_rate and server.random.random() < server.error_rate:
+            return self._send_json(500, {'errors': [{'code': 'server_error', 'message': 'Injected failure'}]})
+        getattr(self, '_' + name)(query, body, *match.groups())
+
+    def _send(self, status, content_type, body):
+        server = self.server
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        accepted = [e.split(';')[0].strip() for e in (self.headers.getheader('Accept-Encoding') or '').split(',')]
+        if server.compression in accepted and len(body) >= 1024:
+            body = server.compressed(body)
+            self.send_header('Content-Encoding', server.compression)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if server.bandwidth:
+            time.sleep(len(body) / float(server.bandwidth))
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload):
+        self._send(status, 'application/json', payload if isinstance(payload, str) else json.dumps(payload))
+
+    def _me(self, query, body):
+        self._send_json(200, self.server.bodies['me'])
+
+    def _organizations(self, query, body):
+        self._send_json(200, self.server.bodies['organizations'])
+
+    def _domains(self, query, body):
+        self._send_json(200, self.server.bodies['domains'])
+
+    def _orders(self, query, body):
+        self._send_json(200, self.server.bodies['orders'])
+
+    def _order(self, query, body, order_id):
+        self._send_json(200, self.server._order(int(order_id)))
+
+    def _place(self, query, body, product):
+        order_id = self.server.next_id()
+        self._send_json(201, {'id': order_id, 'requests': [{'id': order_id}]})
+
+    def _upload_csr(self, query, body, order_id):
+        self._send(204, 'application/json', '')
+
+    def _duplicates(self, query, body, order_id):
+        certificate = dict(self.server._order(int(order_id))['certificate'], sub_id='001', status='approved')
+        self._send_json(200, {'certificates': [certificate]})
+
+    def _create_duplicate(self, query, body, order_id):
+        sub_id = self.server.next_id()
+        self._send_json(201, {'id': int(order_id), 'requests': [{'id': sub_id}]})
+
+    def _download(self, query, body, certificate_id):
+        self._send(200, 'application/x-pem-file', self.server.bodies['chain'])
+
+    def _v1(self, query, body):
+        action = query.get('action')
+        params = dict((k, v[0]) for k, v in parse_qs(body).items())
+        if 'order_certificate' == action:
+            result = {'order_id': self.server.next_id()}
+        elif 'order_view_details' == action:
+            order = self.server._order(int(params.get('order_id', 1)))
+            result = {'certificate_details': {
+                'order_id': order['id'],
+                'status': order['status'],
+                'common_name': order['certificate']['common_name'],
+                'sans': order['certificate']['dns_names'],
+                'product_name': order['product']['name'],
+                'valid_from': order['date_created'],
+                'valid_till': order['certificate']['valid_till'],
+                'server_type': -1,
+                'server_type_name': 'OTHER',
+            }}
+        elif 'retrieve_certificate' == action:
+            pems = self.server.bodies['chain'].split('-----END CERTIFICATE-----\r\n')
+            result = {'order_id': params.get('order_id'), 'certs': {
+                'certificate': pems[0] + '-----END CERTIFICATE-----',
+                'intermediate': pems[1] + '-----END CERTIFICATE-----',
+                'root': pems[2] + '-----END CERTIFICATE-----',
+            }}
+        else:
+            return self._send_json(200, {'response': {'result': 'failure', 'error_codes': [
+                {'code': 'invalid_action', 'description': 'Unknown action'}]}})
+        self._send_json(200, {'response': {'result': 'success', 'return': result}})
+
+
+class TunnelProxy(_Background, ThreadingTCPServer):
+    """
+    Minimal HTTP proxy that only supports CONNECT tunnels, for measuring proxy-routed traffic.
+    tunnels counts the tunnels opened.  If credentials are given, tunnels require them as Basic
+    Proxy-Authorization.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='localhost', port=0, latency=0.0, credentials=None):
+        """
+        :param latency: Seconds added before answering each CONNECT
+        :param credentials: Optional (user, password) required from clients
+        """
+        ThreadingTCPServer.__init__(self, (host, port), TunnelHandler)
+        self.latency = latency
+        self.authorization = 'Basic ' + ('%s:%s' % credentials).encode('base64').strip() if credentials else None
+        self.tunnels = 0
+        self._lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # Tunnels are torn down by either side at any point; stay quiet.
+        pass
+
+
+class TunnelHandler(StreamRequestHandler):
+    def handle(self):
+        method, target, _ = self.rfile.readline().split(' ', 2)
+        headers = {}
+        for line in iter(self.rfile.readline, '\r\n'):
+            if not line:
+                return
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if 'CONNECT' != method:
+            return self.wfile.write('HTTP/1.1 405 Method Not Allowed\r\nContent-Length: 0\r\n\r\n')
+        if self.server.authorization and headers.get('proxy-authorization') != self.server.authorization:
+            return self.wfile.write('HTTP/1.1 407 Proxy Authentication Required\r\nContent-Length: 0\r\n\r\n')
+        host, _, port = target.rpartition(':')
+        upstream = socket.create_connection((host, int(port)))
+        # Relay each write as it comes rather than letting Nagle's algorithm hold it back.
+        for sock in (self.connection, upstream):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server._lock:
+            self.server.tunnels += 1
+        self.wfile.write('HTTP/1.1 200 Connection established\r\n\r\n')
+        self.wfile.flush()
+        # Anything the client sent after the CONNECT is still buffered in rfile.
+        pending = self.rfile._rbuf.getvalue()
+        if pending:
+            upstream.sendall(pending)
+        peers = {self.connection: upstream, upstream: self.connection}
+        by_fd = dict((sock.fileno(), sock) for sock in peers)
+        # poll() where available: select() cannot watch descriptors of 1024 or more, which a
+        # load test opening many tunnels reaches
+        poller = select.poll() if hasattr(select, 'poll') else None
+        for sock in peers if poller is not None else ():
+            poller.register(sock, select.POLLIN)
+        try:
+            while True:
+                if poller is not None:
+                    readable = [by_fd[fd] for fd, _ in poller.poll()]
+                else:
+                    readable = select.select(list(peers), [], [])[0]
+                for sock in readable:
+                    data = sock.recv(65536)
+                    if not data:
+                        return
+                    peers[sock].sendall(data)
+        finally:
+            upstream.close()
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Local HTTPS stand-in for the DigiCert APIs')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8443)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='maximum random seconds added to every response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with a 500')
+    parser.add_argument('--organizations', type=int, default=1)
+    parser.add_argument('--domains', type=int, default=1)
+    parser.add_argument('--orders', type=int, default=10)
+    parser.add_argument('--padding', type=int, default=0, help='filler characters added to every list entry')
+    parser.add_argument('--compression', choices=['gzip', 'deflate'], help='compress bodies for clients accepting it')
+    parser.add_argument('--bandwidth', type=int, default=None, help='simulated link speed in bytes per second')
+    args = parser.parse_args()
+    server = StandInServer(host=args.host, port=args.port, latency=args.latency, jitter=args.jitter,
+                           error_rate=args.error_rate, organizations=args.organizations, domains=args.domains,
+                           orders=args.orders, padding=args.padding, compression=args.compression,
+                           bandwidth=args.bandwidth)
+    print 'Stand-in DigiCert API listening on https://%s:%d/ (CA: %s)' % (args.host, server.port, CA_FILE)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
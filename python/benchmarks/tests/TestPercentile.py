@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+
+import unittest
+
+from .. import percentile, summarize
+
+
+class TestPercentile(unittest.TestCase):
+    def test_nearest_rank(self):
+        samples = range(1, 11)
+        self.assertEqual(5, percentile(samples, 50))
+        self.assertEqual(9, percentile(samples, 90))
+        self.assertEqual(10, percentile(samples, 99))
+        self.assertEqual(1, percentile(samples, 0))
+        self.assertEqual(10, percentile(samples, 100))
+        self.assertEqual(3, percentile([5, 1, 3], 50))
+        self.assertEqual(7, percentile(range(1, 101), 7))
+        self.assertEqual(None, percentile([], 50))
+
+    def test_summarize(self):
+        summary = summarize([0.4, 0.1, 0.3, 0.2], 2.0)
+        self.assertEqual((4, 2.0, 0.2, 0.4, 0.4), (summary['count'], summary['throughput'], summary['p50'],
+                                                   summary['p90'], summary['max']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,11 @@
 #!/usr/bin/env python
 
+import copy
+from timeit import default_timer
+
 from .https import VerifiedHTTPSConnection
-from .api import Request
+from .https.pool import ConnectionPool
+from .api import Request, Trace, LazyResponse
 from .api.commands.v1 import OrderCertificateCommand as OrderCertificateCommandV1
 from .api.commands.v2 import OrderCertificateCommand as OrderCertificateCommandV2
 from .api.commands.v2 import UploadCSRCommand as UploadCSRCommandV2
@@ -13,6 +17,9 @@ from .api.queries.v2 import DownloadCertificateQuery as DownloadCertificateQuery
 from .api.queries.v2 import MyUserQuery, OrganizationByContainerIdQuery, DomainByContainerIdQuery
 from .api.queries.v2 import CertificateDuplicateListQuery, DownloadDuplicateQuery
 from .api.commands.v2 import OrderDuplicateCommand as OrderDuplicateCommandV2
+from .api.commands.v2 import DuplicateTemplate
+from .validation import validate_order, validate_csr
+from .bulk import imap_unordered
 
 
 class CertificateType(object):
@@ -43,7 +50,8 @@ class Validity(object):
 class CertificateOrder(object):
     """High-level representation of a certificate order, for placing new orders or working with existing orders."""
 
-    def __init__(self, host, customer_api_key, customer_name=None, conn=None):
+    def __init__(self, host, customer_api_key, customer_name=None, conn=None, trace_hook=None, lookup_ttl=0,
+                 stream_lookups=False, lazy_responses=False, models=False, max_body_size=None, preflight=False):
         """
         Constructor for CertificateOrder.
 
@@ -51,22 +59,119 @@ class CertificateOrder(object):
         :param customer_api_key: Customer's API key for use in authorizing requests
         :param customer_name: Optional customer account ID.  If left blank, the V2 API will be used;
         if not, the V1 API will be used.
-        :param conn: Optional connection class instance, defaults to VerifiedHTTPSConnection to the provided host
+        :param conn: Optional connection class instance, defaults to VerifiedHTTPSConnection to the provided host.
+        The bulk methods (e.g. upload_csr_many()) run several requests at a time if conn is a PooledConnection,
+        or is left to default (they then use a ConnectionPool of their own), and one at a time otherwise.
+        :param trace_hook: Optional callable; if provided, it is called with a Trace describing every
+        request made by each call to place(), view(), download(), etc.
+        :param lookup_ttl: Number of seconds the user, organization and domain lookups made by a V2
+        place() are cached for.  Defaults to 0 (no caching).
+        :param stream_lookups: If true, the organization and domain lists searched by a V2 place() are
+        parsed incrementally as they are read rather than held in memory (and are never cached).
+        :param lazy_responses: If true, responses are returned as LazyResponse objects that wrap the decoded
+        payload rather than as copies of it.
+        :param models: If true, view(), view_all() and list_duplicates() return records from
+        digicert_client.models (an Order, or lists of Order and DuplicateCertificate) instead of dicts
+        when they succeed.
+        :param max_body_size: Optional limit, in bytes, on response bodies; longer ones are abandoned with
+        a RuntimeError.
+        :param preflight: If true, place() checks the order locally with validate() first, and returns
+        the errors found, as a 400 response, without making any request if there are any.
         :return:
         """
         self.host = host
         self.customer_api_key = customer_api_key
         self.customer_name = customer_name if customer_name and len(customer_name.strip()) else None
         self.conn = conn if conn else VerifiedHTTPSConnection(self.host)
+        self._pool = None if conn else ConnectionPool()
+        self.trace_hook = trace_hook
+        self.lookup_ttl = lookup_ttl
+        self.stream_lookups = stream_lookups
+        self.lazy_responses = lazy_responses
+        self.models = models
+        self.max_body_size = max_body_size
+        self.preflight = preflight
+        self._lookups = {}
+
+    def worker_order(self):
+        """
+        A copy of this CertificateOrder with its own connection from a ConnectionPool, for use on
+        another thread, or None if this order's connection cannot be pooled.  The copy starts with
+        the lookups cached so far, in a cache of its own.
+        """
+        if not self._poolable():
+            return None
+        if hasattr(self.conn, 'clone'):
+            conn = self.conn.clone()
+        else:
+            conn = self._pool.connection(self.host)
+        worker = copy.copy(self)
+        worker.conn = conn
+        worker._lookups = dict(self._lookups)
+        return worker
+
+    def _poolable(self):
+        return hasattr(self.conn, 'clone') or self._pool is not None
+
+    def _bulk(self, func, items, concurrency):
+        """imap_unordered() of func over items, on concurrency worker copies of this order if it can make them."""
+        if concurrency > 1 and self._poolable():
+            return imap_unordered(func, items, concurrency, initializer=self.worker_order)
+        return imap_unordered(func, items, 1, initializer=lambda: self)
+
+    def _begin_trace(self, operation):
+        return Trace(operation) if self.trace_hook else None
+
+    def _end_trace(self, trace):
+        if trace is not None:
+            self.trace_hook(trace)
+
+    def _request(self, action, trace=None, lazy=False, models=False):
+        return Request(action=action, host=self.host, conn=self.conn, trace=trace, lazy=lazy, models=models,
+                       max_body_size=self.max_body_size)
 
-    def _get_container_id_for_active_user(self):
+    def _send(self, action, trace=None, cacheable=False, models=False, sink=None):
+        if sink is not None:
+            return self._request(action, trace).send_to(sink)
+        if not (cacheable and self.lookup_ttl):
+            return self._request(action, trace, lazy=self.lazy_responses, models=models).send()
+        started = default_timer()
+        key = action.get_path()
+        if key in self._lookups:
+            expires, response, response_bytes = self._lookups[key]
+            if expires > started:
+                if trace is not None:
+                    trace.record(action, action.get_method(), key,
+                                 status=200,
+                                 elapsed=default_timer() - started,
+                                 request_bytes=0,
+                                 response_bytes=response_bytes,
+                                 items=len(response) if isinstance(response, list) else None,
+                                 cache='hit')
+                return response
+        request = self._request(action, trace, lazy=self.lazy_responses)
+        response = request.send()
+        if request.status < 300:
+            self._lookups[key] = (default_timer() + self.lookup_ttl, response, request.response_bytes)
+        return response
+
+    def _send_list(self, action, trace=None):
+        if self.stream_lookups:
+            return self._request(action, trace).iter_items()
+        return self._send(action, trace, cacheable=True)
+
+    def clear_lookups(self):
+        """Discard the cached user, organization and domain lookups."""
+        self._lookups.clear()
+
+    def _get_container_id_for_active_user(self, trace=None):
         cmd = MyUserQuery(customer_api_key=self.customer_api_key)
-        me = Request(cmd, self.host, self.conn).send()
+        me = self._send(cmd, trace, cacheable=True)
         return me['container']['id']
 
-    def _get_matching_organization_id(self, container_id, **kwargs):
+    def _get_matching_organization_id(self, container_id, trace=None, **kwargs):
         cmd = OrganizationByContainerIdQuery(customer_api_key=self.customer_api_key, container_id=container_id)
-        orgs = Request(cmd, self.host, self.conn).send()
+        orgs = self._send_list(cmd, trace)
         matching_org = None
         for org in orgs:
             if org['name'] != kwargs['org_name'] or \
@@ -98,34 +203,58 @@ class CertificateOrder(object):
             matching_org = org
         return matching_org['id'] if matching_org else None
 
-    def _has_matching_domain(self, container_id, organization_id, common_name):
+    def _has_matching_domain(self, container_id, organization_id, common_name, trace=None):
         cmd = DomainByContainerIdQuery(customer_api_key=self.customer_api_key, container_id=container_id)
-        domains = Request(cmd, self.host, self.conn).send()
+        domains = self._send_list(cmd, trace)
+        found = False
         for domain in domains:
             if domain['organization']['id'] == organization_id and domain['name'] == common_name:
-                return True
-        return False
+                found = True
+                break
+        if hasattr(domains, 'close'):
+            domains.close()
+        return found
+
+    def validate(self, **kwargs):
+        """
+        Check an order locally, without placing it (see digicert_client.validation).
+
+        :return: a list of the errors found, each a dict with 'code', 'field' and 'message'
+        """
+        return validate_order(kwargs)
 
     def place(self, **kwargs):
         """Place this order."""
+        if self.preflight:
+            errors = self.validate(**kwargs)
+            if errors:
+                return {'status': 400, 'reason': 'Bad Request', 'response': {'errors': errors}}
+        trace = self._begin_trace('place')
+        try:
+            return self._place(trace, **kwargs)
+        finally:
+            self._end_trace(trace)
+
+    def _place(self, trace, **kwargs):
         if self.customer_name:
             cmd = OrderCertificateCommandV1(customer_api_key=self.customer_api_key,
                                             customer_name=self.customer_name,
                                             **kwargs)
-            response = Request(action=cmd, host=self.host, conn=self.conn).send()
+            response = self._send(cmd, trace)
             return response
         else:
             # This is a multi-request interaction
-            container_id = self._get_container_id_for_active_user()
-            org_id = self._get_matching_organization_id(container_id, **kwargs)
+            container_id = self._get_container_id_for_active_user(trace)
+            org_id = self._get_matching_organization_id(container_id, trace, **kwargs)
             if org_id is None:
                 return {'status': 404, 'reason': 'Not Found', 'response': 'No matching organization found'}
             if not self._has_matching_domain(container_id=container_id,
                                              organization_id=org_id,
-                                             common_name=kwargs['common_name']):
+                                             common_name=kwargs['common_name'],
+                                             trace=trace):
                 return {'status': 404, 'reason': 'Not Found', 'response': 'No matching domain found'}
             cmd = OrderCertificateCommandV2(customer_api_key=self.customer_api_key, organization_id=org_id, **kwargs)
-            response = Request(action=cmd, host=self.host, conn=self.conn).send()
+            response = self._send(cmd, trace)
             return response
 
     def view(self, digicert_order_id=None, **kwargs):
@@ -138,11 +267,33 @@ class CertificateOrder(object):
                                           **kwargs)
         else:
             cmd = ViewOrderDetailsQueryV2(customer_api_key=self.customer_api_key, **kwargs)
-        return Request(action=cmd, host=self.host, conn=self.conn).send()
+        return self._send_traced('view', cmd)
+
+    def _send_traced(self, operation, action, sink=None):
+        trace = self._begin_trace(operation)
+        try:
+            return self._send(action, trace, models=self.models, sink=sink)
+        finally:
+            self._end_trace(trace)
+
+    def _iter_traced(self, operation, action):
+        trace = self._begin_trace(operation)
+        try:
+            for item in self._request(action, trace, models=self.models).iter_items():
+                yield item
+        finally:
+            self._end_trace(trace)
 
-    def view_all(self):
+    def view_all(self, stream=False, sink=None):
+        """
+        List all orders.  With stream=True, returns an iterator yielding each order as soon as it
+        has been read from the connection, instead of a response holding the whole list.  With a
+        sink, the JSON listing is written to it as it is read, see Request.send_to().
+        """
         cmd = ViewOrdersQueryV2(customer_api_key=self.customer_api_key)
-        return Request(action=cmd, host=self.host, conn=self.conn).send()
+        if stream:
+            return self._iter_traced('view_all', cmd)
+        return self._send_traced('view_all', cmd, sink=sink)
 
     def upload_csr(self, digicert_order_id=None, csr_text=None, **kwargs):
         if digicert_order_id:
@@ -150,39 +301,115 @@ class CertificateOrder(object):
         if csr_text:
             kwargs['csr'] = csr_text
         cmd = UploadCSRCommandV2(customer_api_key=self.customer_api_key, **kwargs)
-        return Request(action=cmd, host=self.host, conn=self.conn).send()
+        return self._send_traced('upload_csr', cmd)
+
+    def upload_csr_many(self, items, concurrency=4, validate=True):
+        """
+        Upload a CSR for each of many orders, concurrency at a time.
+
+        :param items: An iterable of (order_id, csr) pairs, read lazily
+        :param concurrency: Number of uploads made at a time
+        :param validate: If true, each CSR is checked first (see digicert_client.validation.validate_csr()),
+        and if it has errors, they are returned, as a 400 response, instead of uploading it
+        :return: a generator of (order_id, response, error) tuples, as each upload completes; error is
+        the exception raised uploading the CSR, if one was
+        """
+        csrs = {}
+
+        def upload(order, item):
+            order_id, csr = item
+            if validate:
+                errors = validate_csr(csr, csrs=csrs)
+                if errors:
+                    return {'status': 400, 'reason': 'Bad Request', 'response': {'errors': errors}}
+            return order.upload_csr(order_id=order_id, csr=csr)
+
+        results = self._bulk(upload, items, concurrency)
+        try:
+            for item, response, error in results:
+                yield item[0], response, error
+        finally:
+            # stops the uploads not yet started if the caller stops early
+            results.close()
 
-    def download(self, digicert_order_id=None, digicert_certificate_id=None, **kwargs):
-        """Retrieve an issued certificate represented by this order."""
+    def download(self, digicert_order_id=None, digicert_certificate_id=None, sink=None, **kwargs):
+        """
+        Retrieve an issued certificate represented by this order.  With a sink (a file-like object,
+        hash or callable), the certificate file is written to it as it is read, rather than returned,
+        and the number of bytes written is returned; see Request.send_to().
+        """
         if digicert_order_id:
             if 'order_id' not in kwargs:
                 kwargs['order_id'] = digicert_order_id
         if digicert_certificate_id:
             kwargs['certificate_id'] = digicert_certificate_id
-        if self.customer_name:
-            cmd = DownloadCertificateQueryV1(customer_api_key=self.customer_api_key,
-                                             customer_name=self.customer_name,
-                                             **kwargs)
-        else:
-            if not 'certificate_id' in kwargs and 'order_id' in kwargs:
-                cmd = ViewOrderDetailsQueryV2(customer_api_key=self.customer_api_key, **kwargs)
-                order_details_rsp = Request(action=cmd, host=self.host, conn=self.conn).send()
-                if 'certificate' in order_details_rsp and 'id' in order_details_rsp['certificate']:
-                    kwargs['certificate_id'] = order_details_rsp['certificate']['id']
-            cmd = DownloadCertificateQueryV2(customer_api_key=self.customer_api_key, **kwargs)
-        return Request(action=cmd, host=self.host, conn=self.conn).send()
+        trace = self._begin_trace('download')
+        try:
+            if self.customer_name:
+                cmd = DownloadCertificateQueryV1(customer_api_key=self.customer_api_key,
+                                                 customer_name=self.customer_name,
+                                                 **kwargs)
+            else:
+                if not 'certificate_id' in kwargs and 'order_id' in kwargs:
+                    cmd = ViewOrderDetailsQueryV2(customer_api_key=self.customer_api_key, **kwargs)
+                    order_details_rsp = self._send(cmd, trace)
+                    if 'certificate' in order_details_rsp and 'id' in order_details_rsp['certificate']:
+                        kwargs['certificate_id'] = order_details_rsp['certificate']['id']
+                cmd = DownloadCertificateQueryV2(customer_api_key=self.customer_api_key, **kwargs)
+            return self._send(cmd, trace, sink=sink)
+        finally:
+            self._end_trace(trace)
 
     def list_duplicates(self, digicert_order_id=None, **kwargs):
         query = CertificateDuplicateListQuery(customer_api_key=self.customer_api_key, order_id=digicert_order_id)
-        return Request(action=query, host=self.host, conn=self.conn).send()
+        return self._send_traced('list_duplicates', query)
+
+    def download_duplicate(self, digicert_order_id=None, sub_id=None, sink=None, **kwargs):
+        query = DownloadDuplicateQuery(customer_api_key=self.customer_api_key, order_id=digicert_order_id,
+                                       sub_id=sub_id)
+        return self._send_traced('download_duplicate', query, sink=sink)
+
+    def create_duplicate(self, digicert_order_id=None, template=None, **kwargs):
+        """
+        Create a duplicate of an order's certificate.  With a template (a DuplicateTemplate), the
+        certificate property holds only the properties this duplicate sets itself.
+        """
+        cmd = OrderDuplicateCommandV2(customer_api_key=self.customer_api_key, digicert_order_id=digicert_order_id,
+                                      template=template, **kwargs)
+        return self._send_traced('create_duplicate', cmd)
+
+    def create_duplicates_many(self, items, template=None, concurrency=4, validate=True):
+        """
+        Create many duplicates, concurrency at a time.
+
+        :param items: An iterable of (order_id, certificate) pairs, read lazily, where certificate holds
+        the properties of the duplicate not in the template, e.g. {'csr': ..., 'dns_names': [...]}
+        :param template: The certificate properties shared by the duplicates, e.g. {'server_platform':
+        {'id': 2}, 'signature_hash': 'sha256'}, as a dict or a DuplicateTemplate
+        :param concurrency: Number of duplicates created at a time
+        :param validate: If true, each duplicate's CSR is checked first against its common_name and
+        dns_names (see digicert_client.validation.validate_csr()), and if it has errors, they are
+        returned, as a 400 response, instead of creating the duplicate
+        :return: a generator of (item, response, error) tuples, as each duplicate is created; error is
+        the exception raised creating the duplicate, if one was
+        """
+        if not isinstance(template, DuplicateTemplate):
+            template = DuplicateTemplate(**(template or {}))
+        csrs = {}
 
-    def download_duplicate(self, digicert_order_id=None, sub_id=None, **kwargs):
-        query = DownloadDuplicateQuery(customer_api_key=self.customer_api_key, order_id=digicert_order_id, sub_id=sub_id)
-        return Request(action=query, host=self.host, conn=self.conn).send()
+        def create(order, item):
+            order_id, certificate = item
+            if validate:
+                csr = certificate.get('csr', template.certificate.get('csr'))
+                if csr is not None:
+                    common_name = certificate.get('common_name', template.certificate.get('common_name'))
+                    dns_names = certificate.get('dns_names', template.certificate.get('dns_names'))
+                    errors = validate_csr(csr, common_name, dns_names, csrs)
+                    if errors:
+                        return {'status': 400, 'reason': 'Bad Request', 'response': {'errors': errors}}
+            return order.create_duplicate(digicert_order_id=order_id, template=template, certificate=certificate)
 
-    def create_duplicate(self, digicert_order_id=None, **kwargs):
-        cmd = OrderDuplicateCommandV2(customer_api_key=self.customer_api_key, digicert_order_id=digicert_order_id, **kwargs)
-        return Request(action=cmd, host=self.host, conn=self.conn).send()
+        return self._bulk(create, items, concurrency)
 
 
 if __name__ == '__main__':
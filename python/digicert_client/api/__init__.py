@@ -1,8 +1,13 @@
 #!/usr/bin/env python
 
-import json
-from urllib import urlencode
+from timeit import default_timer
 
+from . import codec
+from .compression import decompressor_for, decoding_reader
+from .credentials import BASE_HEADERS, credentials_for
+from .params import compile_params
+from .response import LazyResponse
+from .stream import iter_array_items, DEFAULT_CHUNK_SIZE
 from ..https import VerifiedHTTPSConnection
 
 
@@ -14,7 +19,7 @@ class Request(object):
     the connection is also optionally provided via the constructor.
     """
 
-    def __init__(self, action, host, conn=None):
+    def __init__(self, action, host, conn=None, trace=None, lazy=False, models=False, max_body_size=None):
         """
         Constructs a Request with the provided Action, host, and connection.
         Connection is optional but assumes the same interface as HTTPConnection.
@@ -25,38 +30,296 @@ class Request(object):
         :param host:  The host to send the request to.
         :param conn:  The optional HTTPConnection-style connection to use, defaults
         to VerifiedHTTPSConnection.
+        :param trace:  Optional Trace that a step describing this request is recorded to.
+        :param lazy:  If true, dict responses are returned as LazyResponse objects that wrap
+        the decoded payload instead of copying it.
+        :param models:  If true, successful responses of actions with a model (see Action.get_model())
+        are returned as records from digicert_client.models instead of dicts.
+        :param max_body_size:  Optional limit, in bytes, on the (decompressed) response body; reading a
+        longer one is aborted with a RuntimeError and the connection is closed.
         """
         self.action = action
         self.host = host
         self.conn = conn if conn is not None else VerifiedHTTPSConnection(host)
+        self.trace = trace
+        self.lazy = lazy
+        self.models = models
+        self.max_body_size = max_body_size
+        self.status = None
+        self.response_bytes = 0
 
     def send(self):
         """
         Issues the request represented by this object, obtains the response, extracts the
-        response data (converting it from JSON if it is in JSON format), sends all the
-        response data to the Action object for processing, and returns the result of the
-        response processing.
-        """
-        self.conn.request(self.action.get_method(),
-                          self.action.get_path(),
-                          self.action.get_params(),
-                          self.action.get_headers())
-        conn_rsp = self.conn.getresponse()
-        response_data = conn_rsp.read()
+        response data (decompressing it if it has a gzip or deflate Content-Encoding, and
+        decoding it if its Content-Type is JSON), sends all the response data to the Action
+        object for processing, and returns the result of the response processing.
+        response_bytes is the size of the body as received, before decompression.
+        """
+        started, method, path, params, conn_rsp = self._issue()
+        self.status = conn_rsp.status
+        response = None
+        try:
+            response_data = self._read_body(conn_rsp)
+            payload = self._decode(conn_rsp, response_data)
+            response = self.action.process_response(conn_rsp.status, conn_rsp.reason, payload, lazy=self.lazy,
+                                                   models=self.models)
+            return response
+        finally:
+            self.conn.close()
+            if self.trace is not None:
+                self.trace.record(self.action, method, path,
+                                  status=conn_rsp.status,
+                                  elapsed=default_timer() - started,
+                                  request_bytes=len(params) if params else 0,
+                                  response_bytes=self.response_bytes,
+                                  items=len(response) if isinstance(response, list) else None)
+
+    def _read_body(self, conn_rsp, chunk_size=DEFAULT_CHUNK_SIZE):
+        if self.max_body_size is None and decompressor_for(conn_rsp) is None:
+            response_data = conn_rsp.read()
+            self.response_bytes = len(response_data)
+            return response_data
+        return ''.join(str(chunk) for chunk in self._chunks(conn_rsp, chunk_size))
+
+    def _chunks(self, conn_rsp, chunk_size, buf=None):
+        """
+        Yields the response body, decompressed, in pieces of at most chunk_size bytes, counting
+        the bytes received in response_bytes and enforcing max_body_size.  If buf (a bytearray) is
+        given and the response has readinto(), the body is read into buf and the pieces are
+        buffer objects over it, only valid until the next one is read.
+        """
+        self.response_bytes = 0
+        self._check_size(self._declared_length(conn_rsp))
+        decompressor = decompressor_for(conn_rsp)
+        readinto = getattr(conn_rsp, 'readinto', None) if buf is not None else None
+        total = 0
+        while True:
+            if readinto is not None:
+                size = readinto(buf)
+                chunk = buffer(buf, 0, size) if size else ''
+            else:
+                chunk = conn_rsp.read(chunk_size)
+            if not chunk:
+                break
+            self.response_bytes += len(chunk)
+            data = chunk if decompressor is None else decompressor.decompress(chunk, chunk_size)
+            while data:
+                total += len(data)
+                self._check_size(total)
+                yield data
+                data = decompressor.decompress('', chunk_size) if decompressor and decompressor.pending else ''
+        if decompressor is not None:
+            data = decompressor.flush()
+            self._check_size(total + len(data))
+            if data:
+                yield data
+
+    def _check_size(self, size):
+        if self.max_body_size is not None and size > self.max_body_size:
+            raise RuntimeError('Response body exceeds the maximum of %d bytes' % self.max_body_size)
+
+    def _limited(self, read, conn_rsp):
+        """read, aborting once more than max_body_size bytes have been read with it."""
+        self._check_size(self._declared_length(conn_rsp))
+        total = [0]
+
+        def limited_read(size):
+            data = read(size)
+            total[0] += len(data)
+            self._check_size(total[0])
+            return data
+
+        return limited_read
+
+    @staticmethod
+    def _declared_length(conn_rsp):
+        length = conn_rsp.getheader('Content-Length') if hasattr(conn_rsp, 'getheader') else None
+        try:
+            return int(length)
+        except (TypeError, ValueError):
+            return -1
+
+    def send_to(self, sink, chunk_size=DEFAULT_CHUNK_SIZE, buf=None):
+        """
+        Counterpart of send() that writes the response body, decompressed but otherwise untouched,
+        to sink instead of returning it, in chunks of at most chunk_size bytes, so memory use stays
+        flat however large the body is.  Returns the number of bytes written.  Raises RuntimeError
+        if the request fails; the error body is not written.
+
+        :param sink: A file-like object (anything with write()), a hash (anything with update(), e.g.
+        hashlib.sha256()) or a callable, which is given each chunk
+        :param chunk_size: Number of bytes read from the connection at a time
+        :param buf: Optional bytearray the body is read into where the connection supports readinto(),
+        so that one buffer can be reused across requests; chunk_size is then len(buf)
+        """
+        write = _sink_writer(sink)
+        if buf is not None:
+            chunk_size = len(buf)
+        started, method, path, params, conn_rsp = self._issue()
+        self.status = conn_rsp.status
+        written = 0
+        try:
+            if conn_rsp.status >= 300:
+                raise self._failure(method, path, conn_rsp)
+            if buf is None and hasattr(conn_rsp, 'readinto'):
+                buf = bytearray(chunk_size)
+            for chunk in self._chunks(conn_rsp, chunk_size, buf):
+                write(chunk)
+                written += len(chunk)
+            return written
+        finally:
+            self.conn.close()
+            if self.trace is not None:
+                self.trace.record(self.action, method, path,
+                                  status=conn_rsp.status,
+                                  elapsed=default_timer() - started,
+                                  request_bytes=len(params) if params else 0,
+                                  response_bytes=self.response_bytes)
+
+    def _failure(self, method, path, conn_rsp):
+        response_data = self._read_body(conn_rsp)
+        return RuntimeError('%s %s failed with %d %s: %s' % (method, path, conn_rsp.status, conn_rsp.reason,
+                                                             response_data[:1000]))
+
+    def iter_items(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Streaming counterpart of send() for queries whose response is a list (those with a
+        stream key, see Action.get_stream_key()).  Issues the request and yields each element
+        of the list as soon as it has been read and parsed, without holding the whole body.
+        Raises RuntimeError if the request fails.
+
+        :param chunk_size: Number of bytes read from the connection at a time
+        """
+        key = self.action.get_stream_key()
+        if key is None:
+            raise TypeError('%s does not return a list' % self.action.__class__.__name__)
+        model = self.action.get_model() if self.models else None
+        started, method, path, params, conn_rsp = self._issue()
+        self.status = conn_rsp.status
+        items = 0
+        try:
+            if conn_rsp.status >= 300:
+                raise self._failure(method, path, conn_rsp)
+
+            def count(size):
+                self.response_bytes += size
+
+            def read(size):
+                data = conn_rsp.read(size)
+                count(len(data))
+                return data
+
+            decompressor = decompressor_for(conn_rsp)
+            if decompressor is not None:
+                read = decoding_reader(conn_rsp.read, decompressor, count)
+            if self.max_body_size is not None:
+                read = self._limited(read, conn_rsp)
+            for item in iter_array_items(read, key, chunk_size):
+                items += 1
+                yield model.from_dict(item) if model is not None else item
+        finally:
+            self.conn.close()
+            if self.trace is not None:
+                self.trace.record(self.action, method, path,
+                                  status=conn_rsp.status,
+                                  elapsed=default_timer() - started,
+                                  request_bytes=len(params) if params else 0,
+                                  response_bytes=self.response_bytes,
+                                  items=items)
+
+    def _issue(self):
+        started = default_timer()
+        method = self.action.get_method()
+        path = self.action.get_path()
+        params = self.action.get_params()
+        self.conn.request(method, path, params, self.action.get_headers())
+        return started, method, path, params, self.conn.getresponse()
+
+    @staticmethod
+    def _decode(conn_rsp, response_data):
+        """
+        Decodes the response body if its Content-Type is JSON, otherwise (certificates, zip files)
+        returns it untouched.  Bodies of responses without a Content-Type are decoded if they parse.
+        """
+        content_type = conn_rsp.getheader('Content-Type') if hasattr(conn_rsp, 'getheader') else None
+        if not response_data or (content_type is not None and not codec.is_json(content_type)):
+            return response_data
         try:
-            payload = json.loads(response_data)
+            return codec.loads(response_data)
         except ValueError:
-            payload = response_data
-        response = self.action.process_response(conn_rsp.status, conn_rsp.reason, payload)
-        self.conn.close()
-        return response
+            return response_data
+
+
+def _sink_writer(sink):
+    for name in ('write', 'update'):
+        method = getattr(sink, name, None)
+        if method is not None:
+            return method
+    if callable(sink):
+        return sink
+    raise TypeError('Response sink must have write() or update(), or be callable')
+
+
+class Trace(object):
+    """
+    Per-request breakdown of a (possibly multi-request) interaction such as a V2
+    CertificateOrder.place().  Each step is a dict with the keys 'action', 'method',
+    'path', 'status', 'elapsed' (seconds), 'request_bytes', 'response_bytes',
+    'items' (length of list responses, otherwise None) and 'cache' ('hit' or 'miss').
+    """
+
+    def __init__(self, operation=None):
+        self.operation = operation
+        self.steps = []
+
+    def record(self, action, method, path, status, elapsed, request_bytes, response_bytes, items=None,
+               cache='miss'):
+        self.steps.append({
+            'action': action.__class__.__name__,
+            'method': method,
+            'path': path,
+            'status': status,
+            'elapsed': elapsed,
+            'request_bytes': request_bytes,
+            'response_bytes': response_bytes,
+            'items': items,
+            'cache': cache,
+        })
+
+    @property
+    def elapsed(self):
+        return sum(step['elapsed'] for step in self.steps)
+
+    def slowest(self):
+        return max(self.steps, key=lambda step: step['elapsed']) if self.steps else None
+
+    def __str__(self):
+        lines = ['%s: %.1f ms' % (self.operation or 'request', self.elapsed * 1000)]
+        for step in self.steps:
+            lines.append('  %-32s %4s %8.1f ms %9d B %6s items  cache %s' % (
+                step['action'], step['status'], step['elapsed'] * 1000, step['response_bytes'],
+                '-' if step['items'] is None else step['items'], step['cache']))
+        return '\n'.join(lines)
 
 
 class Action(object):
     """
-    Base class for all Commands or Queries.
+    Base class for all Commands or Queries.  Actions of an API version (_api_version) share the
+    precomputed headers of their Credentials (see credentials_for()) rather than building their own.
+    Subclasses declare the attributes sent as the request body in _params, encoded as _body_format
+    ('form' or 'json'); see params.compile_params().  Constructor keyword arguments become attributes;
+    those named in _special are first offered to _process_special() (every one is, if _special is None).
     """
-    _headers = {'Accept': 'application/json'}
+    _headers = BASE_HEADERS
+    _api_version = None
+    _params = None
+    _body_format = 'form'
+    _cache_params = False
+    _body = None
+    _special = None
+    _stream_key = None
+    _model = None
 
     def __init__(self, customer_api_key, customer_name=None, **kwargs):
         """
@@ -65,35 +328,81 @@ class Action(object):
         :param customer_api_key: the customer's DigiCert API key
         :param customer_name: the customer's DigiCert account number, e.g. '012345'  Required for
         V1-style actions, not required for V2-style actions.
-        :param kwargs:
+        :param kwargs: The action's properties.  cache_params=True makes get_params() encode the body
+        only once, so a retried action sends the same body without re-encoding it (later changes to
+        the action's properties are then not sent).
         :return:
         """
+        if kwargs.pop('cache_params', False):
+            self._cache_params = True
         self._customer_api_key = customer_api_key
         if customer_name is not None:
             self._customer_name = customer_name
-        for key, value in kwargs.items():
-            if not self._process_special(key, value):
-                setattr(self, key, value)
+        if self._api_version is not None:
+            self._headers = credentials_for(customer_api_key, customer_name, self._api_version).headers
+        if self._special is None:
+            for key, value in kwargs.items():
+                if not self._process_special(key, value):
+                    setattr(self, key, value)
+        else:
+            for key in self._special:
+                if key in kwargs and self._process_special(key, kwargs[key]):
+                    del kwargs[key]
+            self.__dict__.update(kwargs)
 
     def _process_special(self, key, value):
         pass
 
+    @property
+    def customer_api_key(self):
+        return self._customer_api_key
+
+    @property
+    def customer_name(self):
+        return getattr(self, '_customer_name', None)
+
+    @property
+    def _credentials(self):
+        # looked up rather than kept, so that the action's __dict__ holds only its own properties
+        if self._api_version is None:
+            return None
+        return credentials_for(self._customer_api_key, self.customer_name, self._api_version)
+
     def set_header(self, key, value):
-        self._headers[key] = value
+        """Sets a header for this action only; the shared headers are copied first."""
+        headers = dict(self._headers)
+        headers[key] = value
+        self._headers = headers
 
     def get_params(self):
-        params = {}
-        for param, value in self.__dict__.items():
-            if not param.startswith('_'):
-                params[param] = value
-        return urlencode(params)
+        """The encoded request body, or None if the action has none."""
+        if self._body is not None:
+            return self._body
+        cls = type(self)
+        encode = cls.__dict__.get('_encode_params')
+        if encode is None:
+            encode = compile_params(cls._params, cls._body_format)
+            cls._encode_params = encode
+        body = encode(self)
+        if self._cache_params:
+            self._body = body
+        return body
 
     def get_headers(self):
-        return self._headers
+        """The request headers; a copy, as the action's own may be shared with other actions."""
+        return dict(self._headers)
 
     def get_method(self):
         raise NotImplementedError
 
+    def get_stream_key(self):
+        """Name of the property holding the list returned by this action, for Request.iter_items()."""
+        return self._stream_key
+
+    def get_model(self):
+        """Record class (from digicert_client.models) of the object, or list elements, returned by this action."""
+        return self._model
+
     def _subprocess_response(self, status, reason, response):
         raise NotImplementedError
 
@@ -102,20 +411,44 @@ class Action(object):
 
     def _make_response(self, status, reason, response):
         if len(response) == 0:
-            return dict({'http_status': status, 'http_reason': reason}.items())
+            return LazyResponse(status, reason)
         else:
             if isinstance(response, dict):
-                return dict({'http_status': status, 'http_reason': reason}.items() + response.items())
+                return LazyResponse(status, reason, response)
             else:
-                return dict({'http_status': status, 'http_reason': reason, 'response': response}.items())
+                return LazyResponse(status, reason, {'response': response})
 
-    def process_response(self, status, reason, response):
+    def _make_models(self, response):
+        model = self.get_model()
+        key = self.get_stream_key()
+        if key is None:
+            return model.from_dict(response)
+        return [model.from_dict(item) for item in response.get(key) or []]
+
+    def process_response(self, status, reason, response, lazy=False, models=False):
+        """
+        Processes the response to this action.
+
+        :param status: HTTP status code of the response
+        :param reason: HTTP reason phrase of the response
+        :param response: The response body, decoded if it was JSON
+        :param lazy: If true, dict responses are returned as a LazyResponse wrapping the decoded
+        payload; otherwise they are returned as plain dicts.
+        :param models: If true and this action has a model, a successful response is returned as
+        records (a list of them for list queries) instead.
+        """
+        if models and status < 300 and self.get_model() is not None and isinstance(response, dict):
+            return self._make_models(response)
         if status >= 300:
-            return self._make_response(status, reason, response)
-        try:
-            return self._subprocess_response(status, reason, response)
-        except KeyError:
-            return self._make_response(status, reason, {'result': 'unknown failure', 'response': str(response)})
+            result = self._make_response(status, reason, response)
+        else:
+            try:
+                result = self._subprocess_response(status, reason, response)
+            except KeyError:
+                result = self._make_response(status, reason, {'result': 'unknown failure', 'response': str(response)})
+        if not lazy and isinstance(result, LazyResponse):
+            return result.to_dict()
+        return result
 
 
 if __name__ == '__main__':
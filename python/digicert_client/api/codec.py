@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+"""
+JSON codec used for request and response bodies.  The fastest implementation available
+at import time is used (ujson, then simplejson, then the standard library json module);
+set DIGICERT_CLIENT_JSON to one of those names to force a particular one, or call use().
+Call codec.loads/codec.dumps through the module so that use() takes effect everywhere.
+"""
+
+import json
+import os
+
+IMPLEMENTATIONS = ('ujson', 'simplejson', 'json')
+
+name = None
+loads = None
+dumps = None
+
+
+def use(implementation):
+    """
+    Switch the JSON implementation.
+
+    :param implementation: One of IMPLEMENTATIONS
+    :return: The name of the implementation now in use
+    """
+    global name, loads, dumps
+    if implementation not in IMPLEMENTATIONS:
+        raise ValueError('Unsupported JSON implementation "%s"' % implementation)
+    module = json if 'json' == implementation else __import__(implementation)
+    name, loads, dumps = implementation, module.loads, module.dumps
+    return name
+
+
+def is_json(content_type):
+    """True if the media type of a Content-Type header value is JSON (including +json types)."""
+    media_type = content_type.split(';', 1)[0].strip().lower()
+    return media_type == 'application/json' or media_type.endswith('+json') or media_type == 'text/json'
+
+
+def _use_fastest():
+    preferred = os.environ.get('DIGICERT_CLIENT_JSON')
+    for implementation in ([preferred] if preferred else []) + list(IMPLEMENTATIONS):
+        try:
+            return use(implementation)
+        except (ImportError, ValueError):
+            continue
+
+_use_fastest()
+
+
+if __name__ == '__main__':
+    pass
@@ -1,16 +1,24 @@
-from base64 import b64encode
-
 from . import Command
 
+ORDER_FIELDS = ('certificate_type', 'csr', 'validity', 'common_name',
+                'org_name', 'org_addr1', 'org_city', 'org_state', 'org_zip', 'org_country',
+                'org_contact_firstname', 'org_contact_lastname', 'org_contact_email', 'org_contact_telephone')
+OPTIONAL_ORDER_FIELDS = ('server_type', 'org_unit', 'sans', 'org_addr2', 'telephone', 'org_contact_job_title',
+                         'org_contact_telephone_ext', 'custom_expiration_date', 'comments')
+
 
 class V1Command(Command):
+    _api_version = 1
+    _special = ()
+
     def __init__(self, customer_api_key, customer_name, **kwargs):
         super(V1Command, self).__init__(customer_api_key=customer_api_key, customer_name=customer_name, **kwargs)
-        self.set_header('Authorization', b64encode(':'.join([self.customer_name, self.customer_api_key])))
-        self.set_header('Content-Type', 'application/x-www-form-urlencoded')
 
 
 class OrderCertificateCommand(V1Command):
+    _params = ORDER_FIELDS + OPTIONAL_ORDER_FIELDS
+    _special = ('server_type', 'validity')
+
     def __init__(self,
                  customer_api_key,
                  customer_name,
@@ -54,9 +62,7 @@ class OrderCertificateCommand(V1Command):
 
         # certificate_types: 'sslplus', 'uc', 'wildcard', 'evssl' or 'evmulti'
 
-        for field in ['certificate_type', 'csr', 'validity', 'common_name',
-                      'org_name', 'org_addr1', 'org_city', 'org_state', 'org_zip', 'org_country',
-                      'org_contact_firstname', 'org_contact_lastname', 'org_contact_email', 'org_contact_telephone']:
+        for field in ORDER_FIELDS:
             if not field in self.__dict__:
                 raise KeyError('No value provided for required property "%s"' % field)
 
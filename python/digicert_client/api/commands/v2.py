@@ -1,22 +1,28 @@
 import json
 
 from . import Command
+from .. import codec
+from .v1 import ORDER_FIELDS, OPTIONAL_ORDER_FIELDS
 
 
 class V2Command(Command):
+    _api_version = 2
+    _special = ()
+    _body_format = 'json'
+
     def __init__(self, customer_api_key, **kwargs):
         super(V2Command, self).__init__(customer_api_key=customer_api_key, customer_name=None, **kwargs)
-        self.set_header('X-DC-DEVKEY', customer_api_key)
-        self.set_header('Content-Type', 'application/json')
 
     def _is_failure_response(self, response):
         return 'errors' in response
 
-    def get_params(self):
-        return json.dumps(self.__dict__)
-
 
 class OrderCertificateCommand(V2Command):
+    _params = ORDER_FIELDS + OPTIONAL_ORDER_FIELDS + (
+        'organization_id', 'organization_units', 'server_platform', 'signature_hash',
+        'certificate', 'organization', 'validity_years')
+    _special = ('server_type', 'validity')
+
     def __init__(self, customer_api_key, **kwargs):
         """
         Constructs an OrderCertificateCommand, a CQRS-style Command object for ordering certificates.
@@ -91,6 +97,7 @@ class OrderCertificateCommand(V2Command):
 
 
 class UploadCSRCommand(V2Command):
+    _params = ('order_id', 'csr')
 
     def __init__(self, customer_api_key, **kwargs):
         """
@@ -114,17 +121,53 @@ class UploadCSRCommand(V2Command):
         return self._make_response(status, reason, response)
 
 
+class DuplicateTemplate(object):
+    """
+    The certificate properties shared by many duplicates (server_platform, signature_hash, etc.).
+    The JSON of the shared properties is encoded once, for each set of properties the duplicates
+    set themselves, and body() only encodes each duplicate's own properties (csr, dns_names, etc.).
+    """
+
+    def __init__(self, **certificate):
+        self.certificate = certificate
+        self._shared = {}
+
+    def body(self, overrides):
+        """The request body of a duplicate with the template's properties and overrides, which take precedence."""
+        keys = frozenset(overrides)
+        shared = self._shared.get(keys)
+        if shared is None:
+            shared = self._shared[keys] = codec.dumps(
+                dict((key, value) for key, value in self.certificate.iteritems() if key not in keys))[1:-1]
+        own = codec.dumps(overrides)[1:-1] if overrides else ''
+        return '{"certificate":{%s%s%s}}' % (shared, ',' if shared and own else '', own)
+
+
 class OrderDuplicateCommand(V2Command):
+    _params = ('certificate',)
+    _special = ('_order_id',)
 
-    def __init__(self, customer_api_key, digicert_order_id=None, **kwargs):
+    def __init__(self, customer_api_key, digicert_order_id=None, template=None, **kwargs):
         """
 
         :param customer_api_key:
+        :param template: Optional DuplicateTemplate; the certificate property then holds only this
+        duplicate's own properties, and the other properties (comments, etc.) are sent alongside
         :param kwargs:
         :return:
         """
         super(OrderDuplicateCommand, self).__init__(customer_api_key=customer_api_key, **kwargs)
         self._order_id = digicert_order_id
+        if template is not None:
+            overrides = kwargs.get('certificate') or {}
+            body = template.body(overrides)
+            other = dict((key, value) for key, value in kwargs.iteritems()
+                         if key not in ('certificate', 'cache_params') and not key.startswith('_'))
+            if other:
+                body = '%s,%s}' % (body[:-1], codec.dumps(other)[1:-1])
+            self._body = body
+            self.certificate = dict(template.certificate)
+            self.certificate.update(overrides)
 
     def get_path(self):
         return '/services/v2/order/certificate/%s/duplicate' % self._order_id
@@ -136,14 +179,6 @@ class OrderDuplicateCommand(V2Command):
     def _subprocess_response(self, status, reason, response):
         return response
 
-    def get_params(self):
-        d = self.__dict__
-        if '_order_id' in d:
-            del d['_order_id']
-        if '_customer_api_key' in d:
-            del d['_customer_api_key']
-        return json.dumps(d)
-
 
 if __name__ == '__main__':
     pass
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+"""
+Decoding of compressed response bodies.  Requests advertise ACCEPT_ENCODING, and a response
+with a gzip or deflate Content-Encoding is decompressed as it is read: decompressor_for()
+gives the Decompressor for a response (None if its body is not compressed), which
+Request.send() feeds the body through chunk by chunk and Request.iter_items() wraps around
+its reads with decoding_reader(), so the compressed body is never held whole.
+"""
+
+import zlib
+
+ACCEPT_ENCODING = 'gzip, deflate'
+
+_WBITS = {
+    'gzip': 16 + zlib.MAX_WBITS,
+    'x-gzip': 16 + zlib.MAX_WBITS,
+    'deflate': zlib.MAX_WBITS,
+}
+
+
+class Decompressor(object):
+    """
+    Incremental decompressor for one response body.  'deflate' is meant to be zlib-wrapped
+    (RFC 7230) but some servers send raw deflate data, so the wrapping is detected from the
+    first two bytes.
+    """
+
+    def __init__(self, encoding):
+        """
+        :param encoding: The response's Content-Encoding: gzip, x-gzip or deflate
+        """
+        self.encoding = encoding
+        self._obj = None if 'deflate' == encoding else zlib.decompressobj(_WBITS[encoding])
+        self._head = ''
+
+    def _start(self, data):
+        data = self._head + str(data)
+        if len(data) < 2:
+            self._head = data
+            return None
+        self._head = ''
+        cmf, flg = ord(data[0]), ord(data[1])
+        zlib_wrapped = 8 == cmf & 0x0f and 0 == ((cmf << 8) | flg) % 31
+        self._obj = zlib.decompressobj(zlib.MAX_WBITS if zlib_wrapped else -zlib.MAX_WBITS)
+        return data
+
+    def decompress(self, data, max_length=0):
+        """
+        Decompressed data for the next piece of the body, a string or buffer.  With max_length, at
+        most that many bytes are returned and the rest of the input is kept (see pending) for the
+        next call.
+        """
+        if self._obj is None:
+            data = self._start(data)
+            if data is None:
+                return ''
+        tail = self._obj.unconsumed_tail
+        try:
+            return self._obj.decompress(tail + str(data) if tail else data, max_length)
+        except zlib.error as e:
+            raise ValueError('Invalid %s response body: %s' % (self.encoding, e))
+
+    @property
+    def pending(self):
+        """True if input given to decompress() with a max_length has not been decompressed yet."""
+        return self._obj is not None and bool(self._obj.unconsumed_tail)
+
+    def flush(self):
+        """The rest of the decompressed body, once all of it has been given to decompress()."""
+        if self._obj is None:
+            return ''
+        try:
+            return self._obj.flush()
+        except zlib.error as e:
+            raise ValueError('Invalid %s response body: %s' % (self.encoding, e))
+
+
+def decompressor_for(conn_rsp):
+    """
+    A Decompressor for the body of conn_rsp, or None if it has no Content-Encoding (or identity).
+    Raises RuntimeError for encodings other than those in ACCEPT_ENCODING.
+    """
+    encoding = conn_rsp.getheader('Content-Encoding') if hasattr(conn_rsp, 'getheader') else None
+    encoding = (encoding or '').strip().lower()
+    if not encoding or 'identity' == encoding:
+        return None
+    if encoding not in _WBITS:
+        raise RuntimeError('Unsupported Content-Encoding "%s"' % encoding)
+    return Decompressor(encoding)
+
+
+def decoding_reader(read, decompressor, counter=None):
+    """
+    A read(size) function returning at most size bytes of the decompressed body read with read,
+    and '' at its end.
+
+    :param counter: Optional callable given the number of compressed bytes of each read
+    """
+    state = {'eof': False}
+
+    def decoded_read(size):
+        while True:
+            if decompressor.pending:
+                data = decompressor.decompress('', size)
+            elif state['eof']:
+                return ''
+            else:
+                chunk = read(size)
+                if counter is not None:
+                    counter(len(chunk))
+                if not chunk:
+                    state['eof'] = True
+                    return decompressor.flush()
+                data = decompressor.decompress(chunk, size)
+            if data:
+                return data
+
+    return decoded_read
+
+
+if __name__ == '__main__':
+    pass
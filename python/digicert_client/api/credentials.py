@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+"""
+Request headers that identify the customer.  Credentials holds the complete header set for
+one API key (and account, for V1) and API version, computed once and shared, read-only, by
+every action made with them; credentials_for() returns the same object each time it is asked
+for the same key, so building an action costs a dictionary lookup rather than a base64
+encoding and a copy of the headers.  Only the MAX_CACHED most recently created are kept, so a
+process cycling through many API keys does not keep every one of them alive.
+"""
+
+from base64 import b64encode
+from collections import OrderedDict
+from threading import Lock
+
+from .compression import ACCEPT_ENCODING
+
+BASE_HEADERS = {'Accept': 'application/json', 'Accept-Encoding': ACCEPT_ENCODING}
+
+_CONTENT_TYPES = {
+    1: 'application/x-www-form-urlencoded',
+    2: 'application/json',
+}
+
+MAX_CACHED = 64
+
+_credentials = OrderedDict()
+_credentials_lock = Lock()
+
+
+class Credentials(object):
+    """
+    The headers for one customer and API version.  headers is shared by all actions using
+    these credentials and must not be modified; Action.set_header() copies it first.
+    """
+
+    __slots__ = ('api_key', 'customer_name', 'version', 'headers')
+
+    def __init__(self, api_key, customer_name=None, version=2):
+        """
+        :param api_key: The customer's DigiCert API key
+        :param customer_name: The customer's DigiCert account number, required for version 1
+        :param version: The API version, 1 or 2
+        """
+        if version not in _CONTENT_TYPES:
+            raise ValueError('Unsupported API version %r' % version)
+        if 1 == version and not customer_name:
+            raise KeyError('No value provided for required property "customer_name"')
+        self.api_key = api_key
+        self.customer_name = customer_name
+        self.version = version
+        headers = dict(BASE_HEADERS)
+        headers['Content-Type'] = _CONTENT_TYPES[version]
+        if 1 == version:
+            headers['Authorization'] = b64encode(':'.join([customer_name, api_key]))
+        else:
+            headers['X-DC-DEVKEY'] = api_key
+        self.headers = headers
+
+    def __repr__(self):
+        return 'Credentials(version=%d, customer_name=%r)' % (self.version, self.customer_name)
+
+
+def credentials_for(api_key, customer_name=None, version=2):
+    """
+    The shared Credentials for api_key (and customer_name, for V1) and the API version.  Beyond
+    MAX_CACHED, the oldest are dropped (and made again if asked for).
+    """
+    key = (version, api_key, customer_name if 1 == version else None)
+    credentials = _credentials.get(key)
+    if credentials is None:
+        with _credentials_lock:
+            credentials = _credentials.get(key)
+            if credentials is None:
+                credentials = _credentials[key] = Credentials(api_key, key[2], version)
+                while len(_credentials) > MAX_CACHED:
+                    _credentials.popitem(last=False)
+    return credentials
+
+
+if __name__ == '__main__':
+    pass
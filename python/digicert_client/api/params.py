@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+"""
+Request bodies.  An Action subclass declares the attributes that make up its request body
+in _params, and compile_params() turns that declaration, once per class, into a function
+that encodes an action's body directly, as a urlencoded form ('form') or as JSON ('json'),
+without filtering the action's attributes one by one.  An attribute is included only if it has
+been set on the action; class-level defaults are not sent.  Public attributes that are not
+declared (properties the caller passed that the declaration does not list) are sent too, after
+the declared ones, so a declaration never changes what is sent.  Actions that declare no
+_params (None) get all of their public attributes encoded (see public_params()).
+"""
+
+from urllib import quote_plus, urlencode
+
+from . import codec
+
+
+def public_params(action):
+    """The action's public (not underscore-prefixed) attributes, for actions without a declared _params."""
+    return dict((name, value) for name, value in action.__dict__.iteritems() if not name.startswith('_'))
+
+
+# the private attributes actions set (Action itself, and commands for their paths), skipped wholesale
+_ACTION_ATTRIBUTES = frozenset(('_customer_api_key', '_customer_name', '_headers', '_cache_params', '_body',
+                                '_order_id'))
+
+
+def _undeclared(d, declared):
+    """The names of the public attributes in d that are not in declared, in a stable order."""
+    extra = d.viewkeys() - declared
+    return sorted(name for name in extra if not name.startswith('_')) if extra else ()
+
+
+def _form_value(value):
+    return quote_plus(value if isinstance(value, str) else str(value))
+
+
+def _form(names):
+    prefixes = tuple((name, quote_plus(name) + '=') for name in names)
+    declared = frozenset(names) | _ACTION_ATTRIBUTES
+
+    def encode(action):
+        d = action.__dict__
+        parts = [prefix + _form_value(d[name]) for name, prefix in prefixes if name in d]
+        for name in _undeclared(d, declared):
+            parts.append(quote_plus(name) + '=' + _form_value(d[name]))
+        return '&'.join(parts)
+
+    return encode
+
+
+def _json(names):
+    declared = frozenset(names) | _ACTION_ATTRIBUTES
+
+    def encode(action):
+        d = action.__dict__
+        params = {name: d[name] for name in names if name in d}
+        for name in _undeclared(d, declared):
+            params[name] = d[name]
+        return codec.dumps(params)
+
+    return encode
+
+
+_ENCODERS = {'form': _form, 'json': _json}
+
+_FALLBACKS = {
+    'form': lambda action: urlencode(public_params(action)),
+    'json': lambda action: codec.dumps(public_params(action)),
+}
+
+
+def compile_params(names, body_format):
+    """
+    The function encoding an action's body for the attributes in names, and any public
+    attributes not in names, in body_format ('form' or 'json').  With names None, all public
+    attributes are encoded; with no names, the action has no body and the function returns None.
+    """
+    if body_format not in _ENCODERS:
+        raise ValueError('Unsupported body format "%s"' % body_format)
+    if names is None:
+        return _FALLBACKS[body_format]
+    if not names:
+        return lambda action: None
+    return _ENCODERS[body_format](tuple(names))
+
+
+if __name__ == '__main__':
+    pass
@@ -1,15 +1,14 @@
-from base64 import b64encode
-
 from ..queries import Query
 
 
 class V1Query(Query):
+    _api_version = 1
+    _special = ()
+    _params = ('order_id',)
     order_id = None
 
     def __init__(self, customer_api_key, customer_name, **kwargs):
         super(V1Query, self).__init__(customer_api_key, customer_name=customer_name, **kwargs)
-        self.set_header('Authorization', b64encode(':'.join([self.customer_name, self.customer_api_key])))
-        self.set_header('Content-Type', 'application/x-www-form-urlencoded')
         if self.order_id is None:
             raise KeyError('No value provided for required property "order_id"')
 
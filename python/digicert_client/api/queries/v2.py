@@ -1,13 +1,15 @@
 from ..queries import Query
+from ...models import Order, Organization, Domain, DuplicateCertificate
 
 
 class V2Query(Query):
+    _api_version = 2
+    _special = ()
+    _params = ()
     _base_path = '/services/v2'
 
     def __init__(self, customer_api_key, **kwargs):
         super(V2Query, self).__init__(customer_api_key=customer_api_key, customer_name=None)
-        self.set_header('X-DC-DEVKEY', customer_api_key)
-        self.set_header('Content-Type', 'application/json')
 
     def get_method(self):
         return 'GET'
@@ -17,6 +19,7 @@ class V2Query(Query):
 
 
 class ViewOrderDetailsQuery(V2Query):
+    _model = Order
     order_id = None
 
     def __init__(self, customer_api_key, **kwargs):
@@ -44,6 +47,8 @@ class ViewOrderDetailsQuery(V2Query):
 
 
 class ViewOrdersQuery(V2Query):
+    _stream_key = 'orders'
+    _model = Order
 
     def __init__(self, customer_api_key):
         super(ViewOrdersQuery, self).__init__(customer_api_key=customer_api_key)
@@ -125,6 +130,9 @@ class MyUserQuery(V2Query):
 
 
 class OrganizationByContainerIdQuery(V2Query):
+    _stream_key = 'organizations'
+    _model = Organization
+
     def __init__(self, customer_api_key, container_id):
         """
         Construct an OrganizationByContainerIdQuery, a CQRS-style query object to obtain
@@ -148,6 +156,9 @@ class OrganizationByContainerIdQuery(V2Query):
 
 
 class DomainByContainerIdQuery(V2Query):
+    _stream_key = 'domains'
+    _model = Domain
+
     def __init__(self, customer_api_key, container_id):
         """
         Construct a DomainByContainerIdQuery, a CQRS-style query object to obtain
@@ -171,6 +182,9 @@ class DomainByContainerIdQuery(V2Query):
 
 
 class CertificateDuplicateListQuery(V2Query):
+    _stream_key = 'certificates'
+    _model = DuplicateCertificate
+
     def __init__(self, customer_api_key, order_id):
         """
         :param customer_api_key: the customer's DigiCert API key
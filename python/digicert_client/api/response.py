@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+from collections import Mapping, MutableMapping
+
+
+class LazyResponse(object):
+    """
+    Dict-compatible response that wraps the decoded payload instead of copying it into a
+    new dict.  The HTTP status and reason are attributes (http_status, http_reason) that
+    are also visible as keys, as they are in the dicts returned by default; everything
+    else is looked up in the payload, whose nested objects are handed out as they are
+    rather than copied.  Writes go to the payload.  to_dict() returns the equivalent dict.
+    """
+
+    __slots__ = ('http_status', 'http_reason', 'payload')
+
+    _status_keys = ('http_status', 'http_reason')
+    _missing = object()
+
+    def __init__(self, http_status, http_reason, payload=None):
+        self.http_status = http_status
+        self.http_reason = http_reason
+        self.payload = payload if payload is not None else {}
+
+    def __getitem__(self, key):
+        payload = self.payload
+        if key in payload:
+            return payload[key]
+        if 'http_status' == key:
+            return self.http_status
+        if 'http_reason' == key:
+            return self.http_reason
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return key in self.payload or key in self._status_keys
+
+    has_key = __contains__
+
+    def __setitem__(self, key, value):
+        if key in self._status_keys and key not in self.payload:
+            setattr(self, key, value)
+        else:
+            self.payload[key] = value
+
+    def __delitem__(self, key):
+        del self.payload[key]
+
+    def pop(self, key, default=_missing):
+        if key in self.payload or default is self._missing:
+            return self.payload.pop(key)
+        return default
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).iteritems():
+            self[key] = value
+
+    def __iter__(self):
+        payload = self.payload
+        for key in self._status_keys:
+            if key not in payload:
+                yield key
+        for key in payload:
+            yield key
+
+    iterkeys = __iter__
+
+    def itervalues(self):
+        for key in self:
+            yield self[key]
+
+    def iteritems(self):
+        for key in self:
+            yield key, self[key]
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return list(self.itervalues())
+
+    def items(self):
+        return list(self.iteritems())
+
+    def __len__(self):
+        payload = self.payload
+        return len(payload) + sum(1 for key in self._status_keys if key not in payload)
+
+    def __eq__(self, other):
+        if isinstance(other, LazyResponse):
+            other = other.to_dict()
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        return self.to_dict() == dict(other.items())
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def copy(self):
+        return self.to_dict()
+
+    def to_dict(self):
+        d = {'http_status': self.http_status, 'http_reason': self.http_reason}
+        d.update(self.payload)
+        return d
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+MutableMapping.register(LazyResponse)
+
+
+if __name__ == '__main__':
+    pass
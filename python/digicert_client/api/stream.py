@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+"""
+Incremental parsing of list responses.  iter_array_items() walks the top-level JSON object
+of a response body as it is read and yields the elements of one of its arrays as soon as
+each is complete, so memory use is bounded by the largest element plus one read chunk
+rather than by the size of the whole body.
+"""
+
+import json
+import re
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class _JSONStream(object):
+    """A read-ahead buffer over a file-like read() that decodes one JSON value at a time."""
+
+    def __init__(self, read, chunk_size):
+        self.read = read
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size):
+        if self.eof:
+            return False
+        chunk = self.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Skip whitespace and return the next character, or '' at the end of the body."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill(self.chunk_size):
+                return ''
+
+    def take(self, expected):
+        c = self.peek()
+        if not c or c not in expected:
+            raise ValueError('Expected one of "%s" but found "%s"' % (expected, c or 'end of body'))
+        self.pos += 1
+        return c
+
+    def value(self):
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                # A value ending exactly at the end of the buffer may be a number cut short.
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            if self._fill(size):
+                size *= 2
+
+
+def iter_array_items(read, key, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield the decoded elements of the array stored under key in the JSON object read from read.
+    Nothing is yielded if the object has no such key.
+
+    :param read: A read(size) function, e.g. HTTPResponse.read
+    :param key: The name of the top-level property holding the array
+    :param chunk_size: Number of bytes requested per read
+    """
+    stream = _JSONStream(read, chunk_size)
+    stream.take('{')
+    if '}' == stream.peek():
+        return
+    while True:
+        name = stream.value()
+        stream.take(':')
+        if name == key and '[' == stream.peek():
+            stream.take('[')
+            if ']' == stream.peek():
+                return
+            while True:
+                yield stream.value()
+                if ']' == stream.take(',]'):
+                    return
+        stream.value()
+        if '}' == stream.take(',}'):
+            return
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+"""
+Bounded concurrency for bulk operations.  imap_unordered() calls a function for each item
+on a fixed number of worker threads, each with its own state (typically a CertificateOrder
+with its own connection), and yields the results as they complete.  Items are read lazily
+and no more than backlog of them are in progress or waiting to be consumed at a time, so a
+large batch never sits in memory and a slow consumer holds the workers back.  Closing the
+generator early stops the work: items already handed to a worker but not yet started are
+dropped, not run.
+"""
+
+import threading
+from Queue import Queue
+
+
+def imap_unordered(func, items, workers=4, backlog=None, initializer=None):
+    """
+    Call func for each item on worker threads.
+
+    :param func: Callable taking (state, item), where state is what initializer returned on
+    the calling thread (or None without an initializer)
+    :param items: An iterable of the items, read lazily
+    :param workers: Number of worker threads
+    :param backlog: Maximum number of items in progress or waiting to be consumed.  Defaults to
+    twice workers.
+    :param initializer: Optional callable returning each worker thread's state
+    :return: a generator of (item, result, error) tuples, in the order they complete; error is the
+    exception func raised, if it did, and result is then None
+    """
+    backlog = max(backlog or 2 * workers, workers)
+    todo = Queue()
+    done = Queue()
+    stopped = threading.Event()
+
+    def work():
+        try:
+            state = initializer() if initializer is not None else None
+        except Exception as e:
+            state, failed = None, e
+        else:
+            failed = None
+        while True:
+            item = todo.get()
+            if item is todo:
+                return
+            if stopped.is_set():
+                continue
+            if failed is not None:
+                done.put((item, None, failed))
+                continue
+            try:
+                done.put((item, func(state, item), None))
+            except Exception as e:
+                done.put((item, None, e))
+
+    threads = [threading.Thread(target=work) for _ in range(workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    pending = 0
+    try:
+        for item in items:
+            if pending == backlog:
+                yield done.get()
+                pending -= 1
+            todo.put(item)
+            pending += 1
+        while pending:
+            yield done.get()
+            pending -= 1
+    finally:
+        # the queue itself is the signal to stop; workers finish the item they are on first and
+        # skip the ones still queued (the consumer has gone, e.g. closed the generator early)
+        stopped.set()
+        for _ in threads:
+            todo.put(todo)
+        for thread in threads:
+            thread.join()
+
+
+if __name__ == '__main__':
+    pass
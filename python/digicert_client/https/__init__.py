@@ -1,116 +1,164 @@
 #!/usr/bin/env python
 
-import socket
 import ssl
 import os
-import sys
-from fnmatch import fnmatch
+from hashlib import sha256
 from httplib import HTTPSConnection
+from threading import Lock
+from timeit import default_timer
+
+from .hostname import match_hostname, certificate_names
+from .resolver import Resolver, default_resolver
+
+DEFAULT_CA_FILE = os.path.join(os.path.dirname(__file__), 'DigiCertRoots.pem')
+
+_contexts = {}
+_contexts_lock = Lock()
+
+
+def _as_cadata(ca_data):
+    """
+    PEM text (as unicode, which is what SSLContext.load_verify_locations() takes as PEM) for
+    cadata given as PEM or as DER certificates.  DER is converted here because loading it
+    directly fails on some OpenSSL versions after the certificates have been read.
+    """
+    if isinstance(ca_data, unicode):
+        return ca_data
+    ca_data = str(ca_data)
+    if '-----BEGIN' in ca_data:
+        return ca_data.decode('ascii')
+    pems = []
+    while ca_data:
+        # Each certificate is an ASN.1 SEQUENCE: 0x30, then its length in short or long form.
+        if len(ca_data) < 2 or '\x30' != ca_data[0]:
+            raise ValueError('CA data is neither PEM nor DER certificates')
+        size = ord(ca_data[1])
+        header = 2
+        if size & 0x80:
+            header += size & 0x7f
+            size = int(ca_data[2:header].encode('hex') or '0', 16)
+        pems.append(ssl.DER_cert_to_PEM_cert(ca_data[:header + size]))
+        ca_data = ca_data[header + size:]
+    return u''.join(pems)
+
+
+def trust_context(ca_file=None, ca_data=None, key_file=None, cert_file=None):
+    """
+    The SSLContext trusting the CA certificates in ca_file (a path) or ca_data (PEM text or DER
+    bytes), defaulting to the bundled DigiCert roots.  The certificates are read and parsed the
+    first time a trust store is asked for and the context is shared from then on, so changes to
+    ca_file after that are not seen.  Raises RuntimeError if the certificates cannot be loaded.
+
+    :param key_file: Optional client private key, as for HTTPSConnection
+    :param cert_file: Optional client certificate chain, as for HTTPSConnection
+    """
+    if ca_data is not None:
+        source = ('data', ca_data)
+    else:
+        source = ('file', os.path.abspath(ca_file or DEFAULT_CA_FILE))
+    key = source + (key_file, cert_file)
+    with _contexts_lock:
+        context = _contexts.get(key)
+        if context is None:
+            try:
+                if 'data' == source[0]:
+                    cadata = _as_cadata(source[1])
+                else:
+                    with open(source[1], 'rb') as f:
+                        cadata = _as_cadata(f.read())
+                if not cadata.strip():
+                    raise ValueError('No CA certificates')
+                # Given cadata, create_default_context() trusts only it, not the system's CAs.
+                context = ssl.create_default_context(cadata=cadata)
+                context.check_hostname = False  # verify_peer() matches the host name
+                if cert_file:
+                    context.load_cert_chain(cert_file, key_file)
+            except (IOError, ssl.SSLError, ValueError) as e:
+                raise RuntimeError('Unable to load CA certificates for VerifiedHTTPSConnection: %s' % e)
+            _contexts[key] = context
+    return context
 
 
 class VerifiedHTTPSConnection(HTTPSConnection):
     """
     VerifiedHTTPSConnection - an HTTPSConnection that performs name and server cert verification
-    when a connection is created.
+    when a connection is created.  The trust store is loaded (once per process, see trust_context())
+    when the connection is constructed, so a missing or invalid one fails here rather than on connect.
     """
 
     # This code is based very closely on https://gist.github.com/Caligatio/3399114.
 
     ca_file = None
+    timings = None
 
     def __init__(self,
                  host,
                  port=None,
                  ca_file=None,
+                 ca_data=None,
+                 resolver=None,
                  **kwargs):
+        """
+        :param ca_file: Path of a PEM file of trusted CA certificates, defaults to the bundled DigiCert roots
+        :param ca_data: Trusted CA certificates as PEM text or DER bytes, instead of ca_file
+        :param resolver: The Resolver used to look up and connect to the host, defaults to one
+        shared by the process
+        """
+        if ca_data is None:
+            self.ca_file = ca_file or DEFAULT_CA_FILE
+        key_file, cert_file = kwargs.pop('key_file', None), kwargs.pop('cert_file', None)
+        self.context = trust_context(self.ca_file, ca_data, key_file, cert_file)
+        # Given no context, HTTPSConnection would build (and load the system CAs into) one of its own.
         HTTPSConnection.__init__(self,
                                  host=host,
                                  port=port,
+                                 context=self.context,
                                  **kwargs)
-
-        if ca_file:
-            self.ca_file = ca_file
-        else:
-            self.ca_file = os.path.join(os.path.dirname(__file__), 'DigiCertRoots.pem')
+        self.key_file, self.cert_file = key_file, cert_file
+        self.resolver = resolver if resolver is not None else default_resolver
 
     def connect(self):
-        if self.ca_file and os.path.exists(self.ca_file):
-            # TODO: is there a better way to do this? 2.6 doesn't support source_address.
-            if sys.version_info < (2, 7, 0):
-                sock = socket.create_connection(
-                    (self.host, self.port),
-                    self.timeout
-                )
-            else:
-                sock = socket.create_connection(
-                    (self.host, self.port),
-                    self.timeout, self.source_address
-                )
-
-            if self._tunnel_host:
-                self.sock = sock
-                self._tunnel()
-
-            # Wrap the socket using verification with the root certs, note the hardcoded path
-            self.sock = ssl.wrap_socket(sock,
-                                        self.key_file,
-                                        self.cert_file,
-                                        cert_reqs=ssl.CERT_REQUIRED,
-                                        ca_certs=self.ca_file)
-            verify_peer(self.host, self.sock.getpeercert())
-        else:
-            raise RuntimeError('No CA file configured for VerifiedHTTPSConnection')
-
-
-def verify_peer(remote_host, peer_certificate):
+        """
+        Connects, through the proxy if a tunnel has been set, and verifies the peer.  The seconds
+        taken by each stage are kept in the timings dict: 'connect' (TCP), 'tunnel' (the CONNECT
+        exchange, None without a proxy) and 'handshake' (TLS and peer verification).
+        """
+        started = default_timer()
+        sock = self.resolver.create_connection(
+            (self.host, self.port),
+            self.timeout, self.source_address
+        )
+        connected = default_timer()
+
+        if self._tunnel_host:
+            self.sock = sock
+            self._tunnel()
+        tunneled = default_timer()
+
+        host = self._tunnel_host or self.host
+        self.sock = self.context.wrap_socket(sock, server_hostname=host)
+        verify_peer(host, self.sock.getpeercert(), sha256(self.sock.getpeercert(True)).digest())
+        self.timings = {
+            'connect': connected - started,
+            'tunnel': tunneled - connected if self._tunnel_host else None,
+            'handshake': default_timer() - tunneled,
+        }
+
+
+def verify_peer(remote_host, peer_certificate, fingerprint=None):
     """
     check_hostname()
 
     Checks the hostname being accessed against the various hostnames present
-    in the remote certificate
+    in the remote certificate (see hostname.match_hostname()), raising SSLError
+    if none of them match.
+
+    :param fingerprint: Optional digest of the DER form of the certificate, used
+    to identify the certificate in the matching caches
     """
-    hostnames = set()
-    wildcard_hostnames = set()
-
-    for subject in peer_certificate['subject']:
-        if 'commonName' == subject[0] and len(subject) > 1:
-            hostname = subject[1].encode('utf-8')
-            wch_tuple = tuple(hostname.split('.'))
-            if -1 != wch_tuple[0].find('*'):
-                wildcard_hostnames.add(wch_tuple)
-            else:
-                hostnames.add(hostname)
-
-    # Get the subject alternative names out of the certificate
-    try:
-        sans = (x for x in peer_certificate['subjectAltName'] if x[0] == 'DNS')
-        for san in sans:
-            if len(san) > 1:
-                wch_tuple = tuple(san[1].split('.'))
-                if -1 != wch_tuple[0].find('*'):
-                    wildcard_hostnames.add(wch_tuple)
-                else:
-                    hostnames.add(san[1])
-    except KeyError:
-        pass
-
-    if remote_host not in hostnames:
-        wildcard_match = False
-        rh_tuple = tuple(remote_host.split('.'))
-        for wch_tuple in wildcard_hostnames:
-            l = len(wch_tuple)
-            if len(rh_tuple) == l:
-                l -= 1
-                rhparts_match = True
-                while l < 0:
-                    if rh_tuple[l] != wch_tuple[l]:
-                        rhparts_match = False
-                        break
-                if rhparts_match and fnmatch(rh_tuple[0], wch_tuple[0]):
-                    wildcard_match = True
-        if not wildcard_match:
-            raise ssl.SSLError('hostname "%s" doesn\'t match certificate name(s) "%s"' %
-                               (remote_host, ', '.join(hostnames)))
+    if not match_hostname(remote_host, peer_certificate, fingerprint):
+        raise ssl.SSLError('hostname "%s" doesn\'t match certificate name(s) "%s"' %
+                           (remote_host, ', '.join(certificate_names(peer_certificate))))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+"""
+Matching of host names against the names in a peer certificate, following the rules of
+RFC 6125 section 6.4:
+
+- names are compared case-insensitively, ignoring a trailing dot;
+- the DNS names in subjectAltName are used if there are any, otherwise the subject's commonName;
+- a wildcard is only recognized in the left-most label, where it matches exactly one
+  (non-empty) label, either as the whole label (*.example.com) or as part of it
+  (log*.example.com matches login.example.com);
+- a partial wildcard in an internationalized label (xn--...) never matches.
+
+A HostnameMatcher is compiled once per certificate; match_hostname() keeps the compiled
+matchers and the results of matching in bounded LRU caches, so reconnecting to the same
+host with the same certificate does not repeat the work.
+"""
+
+import re
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache(object):
+    """A thread-safe mapping that holds at most size entries, discarding the least recently used."""
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._entries.pop(key)
+            except KeyError:
+                return default
+            self._entries[key] = value
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            if len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _normalize(name):
+    name = name.strip().rstrip('.').lower()
+    if isinstance(name, unicode):
+        try:
+            name = name.encode('ascii')
+        except UnicodeEncodeError:
+            pass
+    return name
+
+
+def certificate_names(peer_certificate):
+    """The DNS names a certificate (as returned by SSLSocket.getpeercert()) is valid for."""
+    names = [san[1] for san in peer_certificate.get('subjectAltName', ()) if san[0] == 'DNS' and len(san) > 1]
+    if not names:
+        for rdn in peer_certificate.get('subject', ()):
+            # Each relative distinguished name is a tuple of (type, value) pairs; older callers
+            # (and the tests) also pass the pair itself.
+            for attribute in (rdn if rdn and isinstance(rdn[0], tuple) else (rdn,)):
+                if 'commonName' == attribute[0] and len(attribute) > 1:
+                    names.append(attribute[1])
+    return names
+
+
+class HostnameMatcher(object):
+    """The names of one certificate, compiled for matching host names against them."""
+
+    def __init__(self, names):
+        self.names = list(names)
+        self._exact = set()
+        self._wildcards = {}
+        for name in self.names:
+            name = _normalize(name)
+            label, _, rest = name.partition('.')
+            if '*' not in name:
+                self._exact.add(name)
+            elif '*' in label and '*' not in rest and rest and label.count('*') == 1:
+                if '*' == label:
+                    pattern = None
+                elif label.startswith('xn--'):
+                    continue
+                else:
+                    prefix, suffix = label.split('*')
+                    pattern = re.compile(r'%s[^.]*%s\Z' % (re.escape(prefix), re.escape(suffix)))
+                self._wildcards.setdefault(rest, []).append(pattern)
+
+    @classmethod
+    def from_certificate(cls, peer_certificate):
+        return cls(certificate_names(peer_certificate))
+
+    def match(self, host):
+        host = _normalize(host)
+        if host in self._exact:
+            return True
+        label, _, rest = host.partition('.')
+        if not label:
+            return False
+        for pattern in self._wildcards.get(rest, ()):
+            if pattern is None or pattern.match(label):
+                return True
+        return False
+
+
+_matchers = LRUCache(64)
+_results = LRUCache(1024)
+
+
+def _certificate_key(peer_certificate):
+    return peer_certificate.get('subject'), peer_certificate.get('subjectAltName')
+
+
+def match_hostname(host, peer_certificate, fingerprint=None):
+    """
+    True if host matches one of the names in peer_certificate.
+
+    :param host: The host name connected to
+    :param peer_certificate: The certificate, as returned by SSLSocket.getpeercert()
+    :param fingerprint: Optional digest of the DER form of the certificate.  If given, it identifies
+    the certificate in the caches instead of its names.
+    """
+    key = fingerprint if fingerprint is not None else _certificate_key(peer_certificate)
+    matched = _results.get((host, key))
+    if matched is None:
+        matcher = _matchers.get(key)
+        if matcher is None:
+            matcher = _matchers.put(key, HostnameMatcher.from_certificate(peer_certificate))
+        matched = _results.put((host, key), matcher.match(host))
+    return matched
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+
+"""
+Persistent connections.  A ConnectionPool keeps connections open after their responses have
+been read, keyed by (proxy, target host and port), so later requests to the same host skip the
+TCP connect, the proxy's CONNECT exchange and the TLS handshake.  PooledConnection is the
+connection-like front end to use wherever a connection is expected, e.g.
+
+    pool = ConnectionPool()
+    order = CertificateOrder(host, api_key, conn=pool.connection(host, proxy='proxy.fakeco.biz:3128',
+                                                                 proxy_auth=('user', 'password')))
+"""
+
+import select
+import socket
+from base64 import b64encode
+from httplib import HTTPException, BadStatusLine
+from threading import Lock
+from timeit import default_timer
+
+from . import VerifiedHTTPSConnection
+
+# methods that can be sent again without the risk of the server carrying them out twice
+_IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD'))
+
+
+def _split_address(address, default_port):
+    if address is None or isinstance(address, tuple):
+        return address
+    host, _, port = address.rpartition(':')
+    if not host or not port.isdigit():
+        return address, default_port
+    return host, int(port)
+
+
+class ConnectionPool(object):
+    """
+    Idle connections, by (proxy, target).  Connections are created with connection_class
+    (VerifiedHTTPSConnection by default) and the keyword arguments given here, e.g. ca_file.
+
+    stats counts the connections 'opened', 'reused' and 'discarded' (closed instead of being kept,
+    or found closed by the server), the 'tunnels' set up through a proxy and the total seconds spent
+    in 'connect_time', 'tunnel_time' and 'handshake_time' (see VerifiedHTTPSConnection.timings).
+    """
+
+    def __init__(self, max_idle=4, idle_timeout=30, connection_class=VerifiedHTTPSConnection, **kwargs):
+        """
+        :param max_idle: Idle connections kept per (proxy, target)
+        :param idle_timeout: Seconds an idle connection is kept before it is closed instead of reused
+        :param connection_class: Class of the connections; takes (host, port, **kwargs) and set_tunnel()
+        """
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.connection_class = connection_class
+        self.kwargs = kwargs
+        self.stats = {'opened': 0, 'reused': 0, 'discarded': 0, 'tunnels': 0,
+                      'connect_time': 0.0, 'tunnel_time': 0.0, 'handshake_time': 0.0}
+        self._idle = {}
+        self._proxy_headers = {}
+        self._lock = Lock()
+
+    def connection(self, host, port=None, proxy=None, proxy_auth=None):
+        """
+        A PooledConnection to host:port.
+
+        :param proxy: Optional HTTP proxy to tunnel through, as 'host:port' or (host, port)
+        :param proxy_auth: Optional (user, password) for the proxy's Basic authentication
+        """
+        return PooledConnection(self, host, port, proxy, proxy_auth)
+
+    def _proxy_headers_for(self, proxy, proxy_auth):
+        key = (proxy, proxy_auth)
+        headers = self._proxy_headers.get(key)
+        if headers is None:
+            headers = {}
+            if proxy_auth:
+                headers['Proxy-Authorization'] = 'Basic ' + b64encode('%s:%s' % proxy_auth)
+            self._proxy_headers[key] = headers
+        return headers
+
+    def acquire(self, key, proxy_auth=None):
+        """
+        An idle connection for key, a (proxy, (host, port)) pair, or a new one.
+
+        :return: (connection, True if it was idle)
+        """
+        now = default_timer()
+        with self._lock:
+            idle = self._idle.get(key)
+            while idle:
+                released, conn = idle.pop()
+                if released + self.idle_timeout > now and not self._closed_by_peer(conn):
+                    self.stats['reused'] += 1
+                    return conn, True
+                conn.close()
+                self.stats['discarded'] += 1
+        proxy, (host, port) = key
+        if proxy is None:
+            return self.connection_class(host, port, **self.kwargs), False
+        conn = self.connection_class(proxy[0], proxy[1], **self.kwargs)
+        conn.set_tunnel(host, port, dict(self._proxy_headers_for(proxy, proxy_auth)))
+        return conn, False
+
+    @staticmethod
+    def _closed_by_peer(conn):
+        # An idle connection has nothing to read unless the server has closed it.  poll() rather
+        # than select(), which cannot watch descriptors of 1024 (FD_SETSIZE) or more.
+        sock = getattr(conn, 'sock', None)
+        if sock is None:
+            return False
+        try:
+            if not hasattr(select, 'poll'):
+                return bool(select.select([sock], [], [], 0)[0])
+            poller = select.poll()
+            poller.register(sock, select.POLLIN)
+            return bool(poller.poll(0))
+        except (select.error, socket.error, ValueError):
+            return True
+
+    def opened(self, conn):
+        """Account for a connection that has just connected."""
+        timings = getattr(conn, 'timings', None) or {}
+        with self._lock:
+            self.stats['opened'] += 1
+            self.stats['connect_time'] += timings.get('connect') or 0.0
+            self.stats['handshake_time'] += timings.get('handshake') or 0.0
+            if timings.get('tunnel') is not None:
+                self.stats['tunnels'] += 1
+                self.stats['tunnel_time'] += timings['tunnel']
+
+    def release(self, key, conn):
+        """Keep a connection whose response has been read completely for reuse."""
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append((default_timer(), conn))
+                return
+            self.stats['discarded'] += 1
+        conn.close()
+
+    def clear(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.itervalues():
+            for _, conn in connections:
+                conn.close()
+
+
+class PooledConnection(object):
+    """
+    Connection-like object (request(), getresponse(), close()) that takes a connection from a
+    ConnectionPool for each request and gives it back on close() if the response was read
+    completely and the server did not ask to close it.  A GET or HEAD that fails on a reused
+    connection, which the server may have closed in the meantime, is retried once on a new one.
+    Other requests (a POST placing an order) are never sent twice: once written to a connection,
+    the server may have carried them out even if the connection then failed, so their errors are
+    raised.  Connections the server closed while idle are discarded before they are used (see
+    ConnectionPool.acquire()), so that rarely happens.  Like an HTTPConnection, it handles one
+    request at a time.
+    """
+
+    def __init__(self, pool, host, port=None, proxy=None, proxy_auth=None):
+        self.pool = pool
+        self.host = host
+        self.port = port
+        self.proxy_auth = proxy_auth
+        self.key = (_split_address(proxy, 8080), (host, port))
+        self._conn = None
+        self._response = None
+        self._request = None
+        self._reused = False
+
+    def clone(self):
+        """Another PooledConnection to the same host, through the same pool, e.g. for another thread."""
+        clone = PooledConnection(self.pool, self.host, self.port, proxy_auth=self.proxy_auth)
+        clone.key = self.key
+        return clone
+
+    def _send(self):
+        conn, self._reused = self.pool.acquire(self.key, self.proxy_auth)
+        self._conn = conn
+        connected = getattr(conn, 'sock', None) is not None
+        conn.request(*self._request)
+        if not connected:
+            self.pool.opened(conn)
+
+    def _retriable(self):
+        return self._reused and self._request[0] in _IDEMPOTENT_METHODS
+
+    def request(self, method, url, body=None, headers={}):
+        self.close()
+        self._request = (method, url, body, headers)
+        try:
+            self._send()
+        except (socket.error, HTTPException):
+            if not self._retriable():
+                self.close()
+                raise
+            self._retry()
+
+    def _retry(self):
+        self._conn.close()
+        self._conn = None
+        self._send()
+
+    def getresponse(self):
+        try:
+            self._response = self._conn.getresponse()
+        except (socket.error, BadStatusLine):
+            if not self._retriable():
+                raise
+            self._retry()
+            self._response = self._conn.getresponse()
+        return self._response
+
+    def close(self):
+        conn, response = self._conn, self._response
+        self._conn = self._response = None
+        if conn is None:
+            return
+        if response is not None and response.isclosed() and not response.will_close:
+            self.pool.release(self.key, conn)
+        else:
+            conn.close()
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+
+import gzip
+import json
+import re
+import threading
+import time
+from base64 import b64encode, b64decode
+from collections import deque
+from timeit import default_timer
+
+
+REDACTED = '[REDACTED]'
+
+# Request headers worth keeping in a cassette; everything else (credentials in particular) is dropped.
+_RECORDED_HEADERS = ('content-type', 'accept', 'accept-encoding')
+# Body parameters whose values are replaced with REDACTED, in both urlencoded and JSON request bodies.
+_SECRET_PARAMS = re.compile(r'(api_key|apikey|password|secret|token|private_key)', re.IGNORECASE)
+
+
+def _encode_body(body):
+    if body is None:
+        return None, None
+    try:
+        return body.decode('utf-8'), None
+    except UnicodeDecodeError:
+        return b64encode(body), 'b64'
+
+
+def _decode_body(body, encoding):
+    if body is None:
+        return None
+    if 'b64' == encoding:
+        return b64decode(body)
+    return body.encode('utf-8')
+
+
+def redact_body(body):
+    """Replace the values of secret-looking parameters in a urlencoded or JSON request body."""
+    if not body:
+        return body
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        pairs = []
+        for pair in body.split('&'):
+            name = pair.split('=', 1)[0]
+            pairs.append('%s=%s' % (name, REDACTED) if _SECRET_PARAMS.search(name) else pair)
+        return '&'.join(pairs)
+
+    def scrub(value):
+        if isinstance(value, dict):
+            return dict((k, REDACTED if _SECRET_PARAMS.search(k) else scrub(v)) for k, v in value.items())
+        if isinstance(value, list):
+            return [scrub(v) for v in value]
+        return value
+    return json.dumps(scrub(payload))
+
+
+class Cassette(object):
+    """
+    An ordered list of recorded request/response exchanges.  A cassette file holds one
+    JSON object per line (gzip-compressed if the file name ends in .gz) with the keys
+    't' (seconds since recording started), 'd' (seconds until the response was read),
+    'm', 'p', 'q' (request method, path, redacted body), 'qh' (non-secret request headers),
+    's', 'r', 'h', 'b' (response status, reason, headers, body) and 'e' ('b64' if the
+    response body is base64-encoded binary).
+    """
+
+    def __init__(self, exchanges=None, stream=None):
+        """
+        :param exchanges: Optional list of exchanges, as read from a cassette file
+        :param stream: Optional file-like object every newly recorded exchange is written to
+        """
+        self.exchanges = exchanges if exchanges is not None else []
+        self.stream = stream
+        self.started = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _open(path, mode):
+        return gzip.open(path, mode) if path.endswith('.gz') else open(path, mode)
+
+    @classmethod
+    def load(cls, path):
+        with cls._open(path, 'rb') as f:
+            return cls([json.loads(line) for line in f if line.strip()])
+
+    @classmethod
+    def create(cls, path):
+        """A new, empty cassette that streams exchanges to path as they are recorded."""
+        return cls(stream=cls._open(path, 'wb'))
+
+    def save(self, path):
+        with self._open(path, 'wb') as f:
+            for exchange in self.exchanges:
+                f.write(json.dumps(exchange, separators=(',', ':')) + '\n')
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    def record(self, started, duration, method, path, body, headers, status, reason, response_headers,
+               response_body):
+        response_body, encoding = _encode_body(response_body)
+        with self._lock:
+            if self.started is None:
+                self.started = started
+            exchange = {
+                't': round(started - self.started, 6),
+                'd': round(duration, 6),
+                'm': method,
+                'p': path,
+                'q': redact_body(body),
+                'qh': dict((k, v) for k, v in (headers or {}).items() if k.lower() in _RECORDED_HEADERS),
+                's': status,
+                'r': reason,
+                'h': dict(response_headers),
+                'b': response_body,
+            }
+            if encoding:
+                exchange['e'] = encoding
+            self.exchanges.append(exchange)
+            if self.stream is not None:
+                self.stream.write(json.dumps(exchange, separators=(',', ':')) + '\n')
+                self.stream.flush()
+
+
+class CassetteResponse(object):
+    """HTTPResponse-like object backed by a recorded (or just-read) response body."""
+
+    def __init__(self, status, reason, headers, body):
+        self.status = status
+        self.reason = reason
+        self.msg = headers
+        self._headers = dict((k.lower(), v) for k, v in headers.items())
+        self._body = body
+        self._offset = 0
+
+    def read(self, amt=None):
+        if amt is None:
+            data = self._body[self._offset:]
+        else:
+            data = self._body[self._offset:self._offset + amt]
+        self._offset += len(data)
+        return data
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def getheader(self, name, default=None):
+        return self._headers.get(name.lower(), default)
+
+    def getheaders(self):
+        return self._headers.items()
+
+
+class RecordingConnection(object):
+    """
+    Wraps an HTTPConnection-style connection and records every exchange made through it
+    to a Cassette.  Credentials are never recorded.
+    """
+
+    def __init__(self, conn, cassette):
+        self.conn = conn
+        self.cassette = cassette
+        self._request = None
+
+    def request(self, method, path, body=None, headers=None):
+        self._request = (default_timer(), method, path, body, headers or {})
+        self.conn.request(method, path, body, headers or {})
+
+    def getresponse(self):
+        started, method, path, body, headers = self._request
+        rsp = self.conn.getresponse()
+        data = rsp.read()
+        response_headers = dict(rsp.getheaders()) if hasattr(rsp, 'getheaders') else {}
+        self.cassette.record(started, default_timer() - started, method, path, body, headers,
+                             rsp.status, rsp.reason, response_headers, data)
+        return CassetteResponse(rsp.status, rsp.reason, response_headers, data)
+
+    def close(self):
+        self.conn.close()
+
+
+class ReplayConnection(object):
+    """
+    Serves the responses of a Cassette.  Each request gets the next recorded response for
+    the same method and path; once those run out they are served again from the start.
+    """
+
+    def __init__(self, cassette, timing=False, speed=1.0):
+        """
+        :param cassette: The Cassette to serve responses from
+        :param timing: If true, each response is delayed by its recorded duration divided by speed
+        :param speed: Speed-up factor applied to recorded durations when timing is enabled
+        """
+        self.cassette = cassette
+        self.timing = timing
+        self.speed = speed
+        self._recorded = {}
+        for exchange in cassette.exchanges:
+            self._recorded.setdefault((exchange['m'], exchange['p']), []).append(exchange)
+        self._pending = dict((key, deque(exchanges)) for key, exchanges in self._recorded.items())
+        self._lock = threading.Lock()
+        self._request = None
+
+    def request(self, method, path, body=None, headers=None):
+        self._request = (method, path)
+
+    def getresponse(self):
+        key = self._request
+        with self._lock:
+            if key not in self._recorded:
+                raise RuntimeError('No recorded response for %s %s' % key)
+            if not self._pending[key]:
+                self._pending[key].extend(self._recorded[key])
+            exchange = self._pending[key].popleft()
+        if self.timing and exchange['d']:
+            time.sleep(exchange['d'] / self.speed)
+        return CassetteResponse(exchange['s'], exchange['r'], exchange['h'],
+                                _decode_body(exchange['b'], exchange.get('e')))
+
+    def close(self):
+        pass
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+"""
+Cached name resolution and multi-address connects for VerifiedHTTPSConnection.
+
+A Resolver caches getaddrinfo() results per (host, port) for a fixed time (getaddrinfo()
+does not report the records' TTLs, so the time is configurable) and connects "happy
+eyeballs" style (RFC 8305): addresses are tried in getaddrinfo() order with the IPv6 and
+IPv4 addresses interleaved, and each attempt after the first starts when the previous one
+fails or has not completed within a short delay, the first to complete being used.
+Addresses that failed, or lost a race they had a head start in, are remembered for a while
+and tried after the others.
+"""
+
+import errno
+import math
+import os
+import select
+import socket
+from threading import Lock
+from timeit import default_timer
+
+
+def _completed(socks, timeout):
+    """
+    The sockets among socks, connecting without blocking, whose connect has completed or failed,
+    waiting up to timeout seconds (None: indefinitely) for one.  Uses poll() where available, as
+    select() cannot watch descriptors of FD_SETSIZE (usually 1024) or more.
+    """
+    if not hasattr(select, 'poll'):
+        _, writable, failed = select.select([], socks, socks, timeout)
+        return set(writable + failed)
+    poller = select.poll()
+    by_fd = {}
+    for sock in socks:
+        by_fd[sock.fileno()] = sock
+        # errors and hang-ups are reported whether asked for or not
+        poller.register(sock, select.POLLOUT)
+    events = poller.poll(None if timeout is None else int(math.ceil(max(timeout, 0) * 1000)))
+    return set(by_fd[fd] for fd, _ in events)
+
+
+class Resolver(object):
+    def __init__(self, ttl=60, failure_ttl=30, attempt_delay=0.25, getaddrinfo=socket.getaddrinfo):
+        """
+        :param ttl: Seconds resolved addresses are cached for; 0 disables caching
+        :param failure_ttl: Seconds an address that failed is tried after the others
+        :param attempt_delay: Seconds to wait for a connect attempt before starting the next in parallel
+        :param getaddrinfo: The resolver function, socket.getaddrinfo by default
+        """
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.attempt_delay = attempt_delay
+        self._getaddrinfo = getaddrinfo
+        self._addresses = {}
+        self._failed = {}
+        self._lock = Lock()
+
+    def resolve(self, host, port):
+        """
+        The (family, socktype, proto, canonname, sockaddr) tuples for a TCP connection to host:port.
+        If resolving fails, addresses cached earlier are used even if they have expired.
+        """
+        key = (host, port)
+        now = default_timer()
+        with self._lock:
+            cached = self._addresses.get(key)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        try:
+            infos = self._getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        except socket.gaierror:
+            if cached is None:
+                raise
+            return cached[1]
+        if self.ttl:
+            with self._lock:
+                self._addresses[key] = (now + self.ttl, infos)
+        return infos
+
+    def clear(self):
+        """Forget all resolved and failed addresses."""
+        with self._lock:
+            self._addresses.clear()
+            self._failed.clear()
+
+    def mark_failed(self, sockaddr):
+        with self._lock:
+            self._failed[sockaddr] = default_timer() + self.failure_ttl
+
+    def recently_failed(self, sockaddr):
+        with self._lock:
+            until = self._failed.get(sockaddr)
+            if until is not None and until <= default_timer():
+                del self._failed[sockaddr]
+                until = None
+        return until is not None
+
+    def _ordered(self, infos):
+        """infos with address families interleaved, starting with the first, and recent failures last."""
+        by_family = {}
+        families = []
+        for info in infos:
+            if info[0] not in by_family:
+                families.append(info[0])
+            by_family.setdefault(info[0], []).append(info)
+        interleaved = []
+        while any(by_family.values()):
+            for family in families:
+                if by_family[family]:
+                    interleaved.append(by_family[family].pop(0))
+        healthy = [info for info in interleaved if not self.recently_failed(info[4])]
+        return healthy + [info for info in interleaved if info not in healthy]
+
+    def create_connection(self, address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+        """Connected socket to address, a (host, port) pair, with the interface of socket.create_connection()."""
+        host, port = address
+        candidates = self._ordered(self.resolve(host, port))
+        if not candidates:
+            raise socket.error('getaddrinfo returns an empty list')
+        if timeout is socket._GLOBAL_DEFAULT_TIMEOUT:
+            timeout = socket.getdefaulttimeout()
+        started = default_timer()
+        deadline = started + timeout if timeout is not None else None
+        pending = {}
+        error = None
+        next_attempt = started
+        try:
+            while True:
+                now = default_timer()
+                if candidates and (now >= next_attempt or not pending):
+                    family, socktype, proto, _, sockaddr = candidates.pop(0)
+                    sock = None
+                    try:
+                        sock = socket.socket(family, socktype, proto)
+                        if source_address:
+                            sock.bind(source_address)
+                        sock.setblocking(0)
+                        code = sock.connect_ex(sockaddr)
+                    except socket.error as e:
+                        if sock is not None:
+                            sock.close()
+                        error = e
+                        self.mark_failed(sockaddr)
+                        continue
+                    if code in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+                        pending[sock] = (sockaddr, now)
+                    else:
+                        sock.close()
+                        error = socket.error(code, os.strerror(code))
+                        self.mark_failed(sockaddr)
+                        continue
+                    next_attempt = now + self.attempt_delay
+                if not pending:
+                    raise error
+                if deadline is not None and now >= deadline:
+                    raise socket.timeout('timed out')
+                wait = [deadline - now] if deadline is not None else []
+                if candidates:
+                    wait.append(max(next_attempt - now, 0))
+                for sock in _completed(list(pending), min(wait) if wait else None):
+                    sockaddr, attempted = pending.pop(sock)
+                    code = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    if 0 == code:
+                        for loser, (loser_sockaddr, loser_attempted) in pending.items():
+                            if loser_attempted < attempted:
+                                self.mark_failed(loser_sockaddr)
+                        sock.setblocking(1)
+                        sock.settimeout(timeout)
+                        return sock
+                    sock.close()
+                    error = socket.error(code, os.strerror(code))
+                    self.mark_failed(sockaddr)
+                    next_attempt = now
+        finally:
+            for sock in pending:
+                sock.close()
+
+
+default_resolver = Resolver()
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,409 @@
+#!/usr/bin/env python
+
+"""
+Column-oriented, in-memory table of an order inventory (e.g. the result of view_all()) for
+answering expiry and inventory questions over large numbers of orders without walking dicts.
+
+Each column is a compact array: order and certificate ids and validity timestamps are
+array('l') columns, status and product are one-byte codes into a per-table list of values,
+and common names and SANs share one string pool indexed by an offsets column.  Filters
+return Selection objects (bit masks over the rows) that combine with &, | and ~.
+
+DomainIndex maps the names on the orders' certificates back to the orders, to find the
+orders covering a host or any name in a zone without scanning the inventory.
+"""
+
+import calendar
+import gc
+import operator
+import time
+from array import array
+from binascii import hexlify, unhexlify
+from itertools import repeat
+
+from .models import Order
+
+
+def _timestamp(value, _cache={}):
+    """Seconds since the epoch (UTC) of a 'YYYY-MM-DD...' date, or 0 if there is none."""
+    if not value:
+        return 0
+    if isinstance(value, (int, long, float)):
+        return int(value)
+    day = value[:10]
+    if day not in _cache:
+        _cache[day] = calendar.timegm(time.strptime(day, '%Y-%m-%d'))
+    return _cache[day]
+
+
+class Selection(object):
+    """
+    A set of rows of an OrderTable, held as an integer bit mask with one byte per row.
+    Selections of the same table combine with & (and), | (or) and ~ (not).
+    """
+
+    def __init__(self, table, bits):
+        self.table = table
+        self.bits = bits
+
+    @classmethod
+    def from_mask(cls, table, mask):
+        """Selection of the rows whose byte in mask (a bytearray of 0s and 1s) is 1."""
+        return cls(table, long(hexlify(mask), 16) if mask else 0L)
+
+    def _combine(self, other, op):
+        if other.table is not self.table:
+            raise RuntimeError('Cannot combine selections of different tables')
+        return Selection(self.table, op(self.bits, other.bits))
+
+    def __and__(self, other):
+        return self._combine(other, operator.and_)
+
+    def __or__(self, other):
+        return self._combine(other, operator.or_)
+
+    def __invert__(self):
+        return Selection(self.table, self.table.all().bits ^ self.bits)
+
+    def __len__(self):
+        return bin(self.bits).count('1')
+
+    def __nonzero__(self):
+        return self.bits != 0
+
+    def mask(self):
+        """The selection as a string with one '\\x00' or '\\x01' byte per row."""
+        rows = len(self.table)
+        return unhexlify('%0*x' % (2 * rows, self.bits)) if rows else ''
+
+    def indices(self):
+        """Row numbers of the selected rows, in ascending order."""
+        mask = self.mask()
+        found = []
+        i = mask.find('\x01')
+        while i >= 0:
+            found.append(i)
+            i = mask.find('\x01', i + 1)
+        return found
+
+    def ids(self):
+        """Order ids of the selected rows."""
+        ids = self.table.order_ids
+        return [ids[i] for i in self.indices()]
+
+    def rows(self):
+        """The selected rows, as dicts (see OrderTable.row())."""
+        return [self.table.row(i) for i in self.indices()]
+
+
+def _listed(orders):
+    """The orders of a view_all() response, or orders themselves if they are already a list or iterator."""
+    if hasattr(orders, 'get'):
+        return orders.get('orders') or ()
+    return orders
+
+
+class OrderTable(object):
+    """
+    Columnar table of orders.  Build one with from_orders() or append(), then query it, e.g.
+
+        issued = table.where('status', 'issued')
+        expiring = issued & table.less('valid_till', time.time() + 30 * 86400)
+        table.count_by('product', expiring)
+    """
+
+    _code_columns = ('status', 'product')
+    _time_columns = ('valid_from', 'valid_till')
+
+    def __init__(self):
+        self.order_ids = array('l')
+        self.certificate_ids = array('l')
+        self.status = bytearray()
+        self.product = bytearray()
+        self.valid_from = array('l')
+        self.valid_till = array('l')
+        self.name_offsets = array('l', [0])
+        self.names = []
+        self._values = {'status': [None], 'product': [None]}
+        self._codes = {'status': {None: 0}, 'product': {None: 0}}
+
+    @classmethod
+    def from_orders(cls, orders):
+        """
+        :param orders: What view_all() returns: its response (a dict with an 'orders' list), or with
+        stream=True or models=True, the orders themselves (dicts, or Order records from
+        digicert_client.models)
+        """
+        table = cls()
+        for order in _listed(orders):
+            table.append(order)
+        return table
+
+    def _code(self, column, value):
+        codes = self._codes[column]
+        code = codes.get(value)
+        if code is None:
+            code = len(codes)
+            if code > 255:
+                raise RuntimeError('Too many distinct values in column "%s"' % column)
+            codes[value] = code
+            self._values[column].append(value)
+        return code
+
+    def append(self, order):
+        """Add an order, a dict from view_all()'s 'orders' list or an Order record."""
+        if isinstance(order, Order):
+            certificate = order.certificate.to_dict() if order.certificate is not None else {}
+            order_id, status, product = order.id, order.status, order.product_name_id
+        else:
+            certificate = order.get('certificate') or {}
+            order_id, status, product = order['id'], order.get('status'), (order.get('product') or {}).get('name_id')
+        self.order_ids.append(int(order_id))
+        self.certificate_ids.append(int(certificate.get('id') or 0))
+        self.status.append(self._code('status', status))
+        self.product.append(self._code('product', product))
+        self.valid_from.append(_timestamp(certificate.get('valid_from')))
+        self.valid_till.append(_timestamp(certificate.get('valid_till')))
+        common_name = certificate.get('common_name')
+        self.names.append(common_name or '')
+        self.names.extend(name for name in certificate.get('dns_names') or () if name != common_name)
+        self.name_offsets.append(len(self.names))
+
+    def __len__(self):
+        return len(self.order_ids)
+
+    def row(self, i):
+        """Row i as a dict with the keys id, certificate_id, status, product, valid_from, valid_till,
+        common_name and dns_names (the other names on the certificate)."""
+        names = self.names[self.name_offsets[i]:self.name_offsets[i + 1]]
+        return {
+            'id': self.order_ids[i],
+            'certificate_id': self.certificate_ids[i],
+            'status': self._values['status'][self.status[i]],
+            'product': self._values['product'][self.product[i]],
+            'valid_from': self.valid_from[i],
+            'valid_till': self.valid_till[i],
+            'common_name': names[0] or None,
+            'dns_names': names[1:],
+        }
+
+    def all(self):
+        return Selection.from_mask(self, bytearray('\x01') * len(self))
+
+    def where(self, column, *values):
+        """Rows whose status or product is one of values."""
+        if column not in self._code_columns:
+            raise KeyError('"%s" is not one of %s' % (column, ', '.join(self._code_columns)))
+        codes = self._codes[column]
+        table = bytearray(256)
+        for value in values:
+            if value in codes:
+                table[codes[value]] = 1
+        return Selection.from_mask(self, getattr(self, column).translate(str(table)))
+
+    def _compare(self, column, op, when):
+        if column not in self._time_columns:
+            raise KeyError('"%s" is not one of %s' % (column, ', '.join(self._time_columns)))
+        values = getattr(self, column)
+        return Selection.from_mask(self, bytearray(map(op, values, repeat(_timestamp(when), len(values)))))
+
+    def less(self, column, when):
+        """Rows whose valid_from or valid_till is before when (epoch seconds or a 'YYYY-MM-DD' date).
+        Rows without a certificate have timestamps of 0."""
+        return self._compare(column, operator.lt, when)
+
+    def greater(self, column, when):
+        """Rows whose valid_from or valid_till is after when (epoch seconds or a 'YYYY-MM-DD' date)."""
+        return self._compare(column, operator.gt, when)
+
+    def between(self, column, start, end):
+        """Rows whose valid_from or valid_till is in [start, end)."""
+        return ~self._compare(column, operator.lt, start) & self._compare(column, operator.lt, end)
+
+    def count_by(self, column, selection=None):
+        """
+        Number of (selected) rows for each value of a column.  status and product are counted
+        without visiting the rows; other columns (including valid_from and valid_till, in epoch
+        seconds) are counted row by row.
+
+        :return: A dict mapping values to counts, without values that have no rows
+        """
+        if selection is None:
+            selection = self.all()
+        counts = {}
+        if column in self._code_columns:
+            for value in self._values[column]:
+                count = len(selection & self.where(column, value))
+                if count:
+                    counts[value] = count
+            return counts
+        values = getattr(self, column) if column in self._time_columns else None
+        if values is None:
+            raise KeyError('Cannot group by "%s"' % column)
+        for i in selection.indices():
+            counts[values[i]] = counts.get(values[i], 0) + 1
+        return counts
+
+
+
+def _order_names(order):
+    """Order id and the names (common name and SANs) on the certificate of an order dict or record."""
+    if isinstance(order, Order):
+        certificate = order.certificate
+        if certificate is None:
+            return order.id, []
+        return order.id, [certificate.common_name] + list(certificate.dns_names or ())
+    certificate = order.get('certificate') or {}
+    return order['id'], [certificate.get('common_name')] + list(certificate.get('dns_names') or ())
+
+
+class _Node(object):
+    """Trie node; its containers are only created once something is stored in them."""
+    __slots__ = ('children', 'exact', 'wildcard')
+
+    def __init__(self):
+        self.children = None
+        self.exact = None
+        self.wildcard = None
+
+    def is_empty(self):
+        return not (self.children or self.exact or self.wildcard)
+
+
+class DomainIndex(object):
+    """
+    Index of the names on the orders' certificates, for finding the orders covering a host.
+    Names are stored in a trie of their labels in reverse order (com -> fakeco -> www), so the
+    orders covering a host are found by walking its labels, and those with names in a zone by
+    walking the zone's subtree.  A wildcard name (*.fakeco.biz) covers exactly one more label
+    (www.fakeco.biz but not fakeco.biz or a.www.fakeco.biz).  Names are compared case-insensitively.
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self._names = {}
+
+    @classmethod
+    def from_orders(cls, orders):
+        """
+        :param orders: What view_all() returns: its response (a dict with an 'orders' list), or with
+        stream=True or models=True, the orders themselves (dicts, or Order records from
+        digicert_client.models)
+        """
+        index = cls()
+        # The trie is built from many small objects; collecting garbage while they are created
+        # would repeatedly scan all of them for cycles that cannot exist.
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            for order in _listed(orders):
+                index.insert(order)
+        finally:
+            if collecting:
+                gc.enable()
+        return index
+
+    @staticmethod
+    def _normalize(name):
+        return name.strip().rstrip('.').lower()
+
+    def insert(self, order):
+        """Index (or re-index) the names of an order, a dict from view_all()'s 'orders' list or an Order record."""
+        order_id, names = _order_names(order)
+        names = [name for name in names if name]
+        self.delete(order_id)
+        if names:
+            self.add(order_id, *names)
+
+    def add(self, order_id, *names):
+        """Index names under order_id, in addition to any already indexed for it."""
+        indexed = set(self._names.get(order_id, ()))
+        for name in set(self._normalize(name) for name in names) - indexed:
+            labels = name.split('.')
+            wildcard = labels[0] == '*'
+            node = self._root
+            for label in reversed(labels[1:] if wildcard else labels):
+                if node.children is None:
+                    node.children = {}
+                child = node.children.get(label)
+                if child is None:
+                    child = node.children[label] = _Node()
+                node = child
+            if wildcard:
+                if node.wildcard is None:
+                    node.wildcard = set()
+                node.wildcard.add(order_id)
+            else:
+                if node.exact is None:
+                    node.exact = set()
+                node.exact.add(order_id)
+            indexed.add(name)
+        self._names[order_id] = tuple(indexed)
+
+    def delete(self, order_id):
+        """Remove all the names indexed for order_id.  Unknown ids are ignored."""
+        for name in self._names.pop(order_id, ()):
+            labels = name.split('.')
+            wildcard = labels[0] == '*'
+            labels = labels[:0:-1] if wildcard else labels[::-1]
+            path = [self._root]
+            for label in labels:
+                node = (path[-1].children or {}).get(label)
+                if node is None:
+                    break
+                path.append(node)
+            else:
+                ids = path[-1].wildcard if wildcard else path[-1].exact
+                if ids:
+                    ids.discard(order_id)
+                for i in range(len(labels), 0, -1):
+                    if not path[i].is_empty():
+                        break
+                    del path[i - 1].children[labels[i - 1]]
+
+    def __contains__(self, order_id):
+        return order_id in self._names
+
+    def __len__(self):
+        return len(self._names)
+
+    def names(self, order_id):
+        """The (lower-cased) names indexed for order_id."""
+        return set(self._names.get(order_id, ()))
+
+    def _find(self, labels):
+        node = self._root
+        for label in reversed(labels):
+            node = node.children.get(label) if node.children else None
+            if node is None:
+                break
+        return node
+
+    def covering(self, host):
+        """Ids of the orders with a name that matches host exactly or as a wildcard."""
+        labels = self._normalize(host).split('.')
+        found = set()
+        parent = self._find(labels[1:])
+        if parent is not None:
+            found.update(parent.wildcard or ())
+            node = parent.children.get(labels[0]) if parent.children else None
+            if node is not None:
+                found.update(node.exact or ())
+        return found
+
+    def under(self, zone):
+        """Ids of the orders with a name in zone (the zone itself, or any name or wildcard below it)."""
+        found = set()
+        node = self._find(self._normalize(zone).split('.'))
+        nodes = [node] if node is not None else []
+        while nodes:
+            node = nodes.pop()
+            found.update(node.exact or ())
+            found.update(node.wildcard or ())
+            if node.children:
+                nodes.extend(node.children.itervalues())
+        return found
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+
+"""
+Write-ahead journal for bulk order submission.  Before an order is placed (or a duplicate
+created), its intent is written to the journal and made durable; once the response arrives,
+the resulting order id is written too.  A batch run again after a crash can then tell, without
+any request, which items went through (skip them), which were rejected or never sent (submit
+them again), and which were sent but not answered (in doubt: they may have been placed, so
+they are reported rather than submitted twice).
+
+Items are identified by a key chosen by the caller (e.g. the common name) and the fingerprint
+of the request (see fingerprint()); an item whose request has changed since it was journaled
+is submitted again.
+
+The journal is a JSON-lines file, only ever appended to.  Records are made durable with group
+commit: a thread that needs its record on disk fsyncs every record written so far, and the
+threads that wrote records meanwhile wait for that fsync instead of each making their own, so
+with several submitting threads there are far fewer fsyncs than records.  A record torn by a
+crash is cut off when the journal is next opened.
+"""
+
+import hashlib
+import json
+import os
+import socket
+import threading
+from httplib import HTTPException
+
+from .bulk import imap_unordered
+
+INTENT = 'intent'
+DONE = 'done'
+FAILED = 'failed'
+
+SUBMITTED = 'submitted'
+SKIPPED = 'skipped'
+IN_DOUBT = 'in_doubt'
+
+# errors after which the request may or may not have reached the server
+_IN_DOUBT_ERRORS = (socket.error, HTTPException)
+
+
+def fingerprint(operation, params):
+    """A digest of a request: its operation (e.g. 'place') and its parameters."""
+    text = json.dumps(params, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(operation + '\0' + text).hexdigest()
+
+
+def _response_failed(response):
+    if not hasattr(response, 'get'):
+        return response is None
+    if response.get('errors'):
+        return True
+    status = response.get('http_status', response.get('status'))
+    return isinstance(status, int) and status >= 300
+
+
+class Journal(object):
+    """
+    An append-only journal of submissions.  stats counts the 'records' written and the 'syncs'
+    (fsyncs) made to persist them.
+    """
+
+    def __init__(self, path, sync=True):
+        """
+        :param path: The journal file; created if missing
+        :param sync: If false, records are flushed but not fsynced, surviving the process crashing
+        but not the machine
+        """
+        self.path = path
+        self.sync = sync
+        self.stats = {'records': 0, 'syncs': 0}
+        self._lock = threading.Lock()
+        self._synced = threading.Condition(self._lock)
+        self._written = 0
+        self._durable = 0
+        self._syncing = False
+        self._states = {}
+        self._file = self._open()
+
+    def _open(self):
+        """Read the journal's records, cut off a torn last record and open the file to append to."""
+        f = open(self.path, 'a+b')
+        f.seek(0)
+        end = 0
+        for line in f:
+            if not line.endswith('\n'):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            self._states[record['key']] = record
+            end += len(line)
+        f.seek(0, os.SEEK_END)
+        if f.tell() != end:
+            f.truncate(end)
+            f.flush()
+            os.fsync(f.fileno())
+        return f
+
+    def state(self, key):
+        """The last record of key, a dict with 'op' (INTENT, DONE or FAILED), 'fp', etc., or None."""
+        with self._lock:
+            return self._states.get(key)
+
+    def in_doubt(self):
+        """The keys of the items whose requests were sent but not answered."""
+        with self._lock:
+            return sorted(key for key, record in self._states.iteritems() if INTENT == record['op'])
+
+    def _append(self, record):
+        line = json.dumps(record, sort_keys=True, separators=(',', ':')) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._written += 1
+            self.stats['records'] += 1
+            self._states[record['key']] = record
+            sequence = self._written
+            while self._durable < sequence:
+                if self._syncing:
+                    self._synced.wait()
+                    continue
+                self._syncing = True
+                target = self._written
+                try:
+                    self._file.flush()
+                    if self.sync:
+                        self._lock.release()
+                        try:
+                            os.fsync(self._file.fileno())
+                        finally:
+                            self._lock.acquire()
+                    self._durable = target
+                    self.stats['syncs'] += 1
+                finally:
+                    self._syncing = False
+                    self._synced.notify_all()
+
+    def begin(self, key, fp, operation):
+        """Record, durably, that the request fingerprinted fp is about to be sent for key."""
+        self._append({'op': INTENT, 'key': key, 'fp': fp, 'operation': operation})
+
+    def complete(self, key, fp, order_id, request_ids=None):
+        """Record the order id that the request for key resulted in."""
+        record = {'op': DONE, 'key': key, 'fp': fp, 'order_id': order_id}
+        if request_ids:
+            record['request_ids'] = request_ids
+        self._append(record)
+
+    def fail(self, key, fp, error):
+        """Record that the request for key was not carried out, so it may be sent again."""
+        self._append({'op': FAILED, 'key': key, 'fp': fp, 'error': str(error)})
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class Submission(object):
+    """The outcome of a journaled submission."""
+
+    __slots__ = ('key', 'status', 'order_id', 'response', 'error')
+
+    def __init__(self, key, status, order_id=None, response=None, error=None):
+        """
+        :param key: The item's key
+        :param status: SUBMITTED, SKIPPED (done in an earlier run), IN_DOUBT or FAILED
+        :param order_id: The resulting order id, if known
+        :param response: The response, if the request was sent in this run
+        :param error: The error, if the submission failed or is in doubt
+        """
+        self.key = key
+        self.status = status
+        self.order_id = order_id
+        self.response = response
+        self.error = error
+
+    def __repr__(self):
+        return 'Submission(key=%r, status=%r, order_id=%r)' % (self.key, self.status, self.order_id)
+
+
+def submit(journal, key, operation, params, send):
+    """
+    Submit one request through the journal, unless the journal shows it has already been.
+
+    :param journal: The Journal
+    :param key: The item's key
+    :param operation: The operation, e.g. 'place' or 'create_duplicate'
+    :param params: The request's parameters, fingerprinted with operation
+    :param send: Callable taking params and returning the response
+    :return: a Submission
+    """
+    fp = fingerprint(operation, params)
+    record = journal.state(key)
+    if record is not None and record['fp'] == fp:
+        if DONE == record['op']:
+            return Submission(key, SKIPPED, record.get('order_id'))
+        if INTENT == record['op']:
+            return Submission(key, IN_DOUBT, error=RuntimeError('"%s" was sent but its outcome is unknown' % key))
+    journal.begin(key, fp, operation)
+    try:
+        response = send(params)
+    except _IN_DOUBT_ERRORS as e:
+        return Submission(key, IN_DOUBT, error=e)
+    except Exception as e:
+        journal.fail(key, fp, e)
+        return Submission(key, FAILED, error=e)
+    if _response_failed(response):
+        journal.fail(key, fp, response)
+        return Submission(key, FAILED, response=response, error=RuntimeError('Rejected: %r' % (response,)))
+    order_id = response.get('id')
+    request_ids = [request.get('id') for request in response.get('requests') or [] if hasattr(request, 'get')]
+    journal.complete(key, fp, order_id, request_ids)
+    return Submission(key, SUBMITTED, order_id, response)
+
+
+def submit_many(journal, make_order, items, operation='place', workers=4):
+    """
+    Submit a batch of requests through the journal, skipping those already done.
+
+    :param journal: The Journal
+    :param make_order: Callable returning a new CertificateOrder; each worker thread makes its own
+    :param items: An iterable of (key, params) pairs; params are the kwargs of the CertificateOrder
+    method named by operation
+    :param operation: 'place' or 'create_duplicate'
+    :param workers: Number of requests sent at a time
+    :return: a generator of Submission, in the order they complete
+    """
+    def send(certificate_order, item):
+        key, params = item
+        return submit(journal, key, operation, params, lambda p: getattr(certificate_order, operation)(**p))
+
+    for item, submission, error in imap_unordered(send, items, workers, initializer=make_order):
+        yield submission if error is None else Submission(item[0], FAILED, error=error)
+
+
+if __name__ == '__main__':
+    pass
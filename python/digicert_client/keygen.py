@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+
+"""
+Key and CSR generation for bulk orders.  KeyGenerator makes a private key and CSR for each
+order with the openssl command, running up to workers openssl processes at a time, and
+yields each order, with its CSR filled in, as soon as its key is ready, so orders can be
+placed while later keys are still being generated.  It never runs more than backlog keys
+ahead of the consumer, so a slow submitter holds generation back rather than piling up keys.
+
+Private keys are written to key_dir, each in a new file created with mode 0600, and
+place_orders() records the order id placed for each key in key_dir's keys.jsonl manifest.
+"""
+
+import errno
+import json
+import os
+import re
+import subprocess
+import tempfile
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from Queue import Queue
+from threading import Lock
+
+MANIFEST = 'keys.jsonl'
+
+_UNSAFE_FILENAME = re.compile(r'[^A-Za-z0-9.-]')
+
+
+class GeneratedKey(object):
+    """A private key generated for an order, and the order with its CSR."""
+
+    __slots__ = ('order', 'key_path', 'csr', 'error', 'order_id')
+
+    def __init__(self, order, key_path=None, csr=None, error=None):
+        """
+        :param order: The order's properties (the kwargs of CertificateOrder.place()), including the csr
+        :param key_path: The file the private key was written to
+        :param csr: The PEM CSR
+        :param error: The exception raised generating the key, if it could not be
+        """
+        self.order = order
+        self.key_path = key_path
+        self.csr = csr
+        self.error = error
+        self.order_id = None
+
+    @property
+    def common_name(self):
+        return self.order.get('common_name')
+
+    def __repr__(self):
+        return 'GeneratedKey(common_name=%r, key_path=%r, order_id=%r)' % (self.common_name, self.key_path,
+                                                                          self.order_id)
+
+
+def _escape(value):
+    return re.sub(r'([\\/+])', r'\\\1', value)
+
+
+class KeyGenerator(object):
+    """Generates the keys and CSRs for a stream of orders on a pool of openssl processes."""
+
+    # subject attribute: order property
+    _subject_fields = (('C', 'org_country'), ('ST', 'org_state'), ('L', 'org_city'), ('O', 'org_name'),
+                       ('OU', 'org_unit'), ('CN', 'common_name'))
+
+    def __init__(self, key_dir, key_type='rsa', key_size=2048, curve='prime256v1', digest='sha256', workers=None,
+                 backlog=None, openssl='openssl'):
+        """
+        :param key_dir: Directory the private keys (and the manifest) are written to; created if missing
+        :param key_type: 'rsa' or 'ec'
+        :param key_size: Size of RSA keys, in bits
+        :param curve: Curve of EC keys
+        :param digest: Digest the CSRs are signed with
+        :param workers: Number of keys generated at a time.  Defaults to the number of CPUs.
+        :param backlog: Maximum number of keys generated ahead of the consumer, including those being
+        generated.  Defaults to twice workers.
+        :param openssl: The openssl command
+        """
+        if key_type not in ('rsa', 'ec'):
+            raise ValueError('Unsupported key type "%s"' % key_type)
+        self.key_dir = key_dir
+        self.key_type = key_type
+        self.key_size = key_size
+        self.curve = curve
+        self.digest = digest
+        self.workers = workers or cpu_count()
+        self.backlog = max(backlog or 2 * self.workers, self.workers)
+        self.openssl = openssl
+        self._manifest_lock = Lock()
+        try:
+            os.makedirs(key_dir, 0700)
+        except OSError as e:
+            if errno.EEXIST != e.errno:
+                raise
+
+    def _newkey(self):
+        if 'rsa' == self.key_type:
+            return ['-newkey', 'rsa:%d' % self.key_size]
+        return ['-newkey', 'ec', '-pkeyopt', 'ec_paramgen_curve:%s' % self.curve]
+
+    def _subject(self, order):
+        return ''.join('/%s=%s' % (attribute, _escape(order[field]))
+                       for attribute, field in self._subject_fields if order.get(field))
+
+    def _key_file(self, common_name):
+        """A new, empty file for a key, created with mode 0600 so the key is never readable by others."""
+        prefix = _UNSAFE_FILENAME.sub('_', (common_name or 'key').replace('*', 'wildcard')) + '.'
+        fd, path = tempfile.mkstemp(suffix='.key', prefix=prefix, dir=self.key_dir)
+        os.close(fd)
+        return path
+
+    def generate_one(self, order):
+        """
+        Generate a key and CSR for an order.
+
+        :param order: The order's properties; common_name is required, and sans and the organization's
+        name, unit, city, state and country are included in the CSR when given.
+        :return: a GeneratedKey whose order is a copy of order with the csr filled in
+        """
+        if not order.get('common_name'):
+            raise KeyError('No value provided for required property "common_name"')
+        key_path = self._key_file(order['common_name'])
+        args = [self.openssl, 'req', '-new', '-nodes', '-keyout', key_path, '-subj', self._subject(order),
+                '-%s' % self.digest] + self._newkey()
+        if order.get('sans'):
+            args += ['-addext', 'subjectAltName=' + ','.join('DNS:' + name for name in order['sans'])]
+        try:
+            process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            csr, errors = process.communicate()
+            if process.returncode:
+                raise RuntimeError('openssl failed for "%s": %s' % (order['common_name'], errors.strip()))
+        except:
+            os.unlink(key_path)
+            raise
+        os.chmod(key_path, 0600)
+        csr = csr.strip().replace('\r\n', '\n').replace('\n', '\r\n')
+        generated = dict(order)
+        generated['csr'] = csr
+        return GeneratedKey(generated, key_path, csr)
+
+    def _generate(self, order):
+        try:
+            return self.generate_one(order)
+        except Exception as e:
+            return GeneratedKey(dict(order), error=e)
+
+    def generate(self, orders):
+        """
+        Generate the keys and CSRs for orders, in parallel.  orders is consumed lazily: once backlog
+        keys are generated or being generated, no more are started until one is consumed.
+
+        :param orders: An iterable of the orders' properties (see generate_one())
+        :return: a generator of GeneratedKey, in the order they are finished.  Orders whose keys could
+        not be generated are yielded with the error set.
+        """
+        pool = ThreadPool(self.workers)
+        finished = Queue()
+        pending = 0
+        try:
+            for order in orders:
+                if pending == self.backlog:
+                    yield finished.get()
+                    pending -= 1
+                pool.apply_async(self._generate, (order,), callback=finished.put)
+                pending += 1
+            while pending:
+                yield finished.get()
+                pending -= 1
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def link(self, generated, order_id):
+        """Record the order placed with a generated key, in generated and in the key directory's manifest."""
+        generated.order_id = order_id
+        entry = json.dumps({'common_name': generated.common_name, 'key_path': generated.key_path,
+                            'order_id': order_id}, sort_keys=True)
+        with self._manifest_lock:
+            with open(os.path.join(self.key_dir, MANIFEST), 'a') as f:
+                f.write(entry + '\n')
+
+    def manifest(self):
+        """The entries of the key directory's manifest, oldest first."""
+        try:
+            with open(os.path.join(self.key_dir, MANIFEST)) as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except IOError as e:
+            if errno.ENOENT == e.errno:
+                return []
+            raise
+
+
+def place_orders(certificate_order, orders, generator):
+    """
+    Generate a key and CSR for each order and place it, placing each order as soon as its key is
+    ready while generator works on the next ones.
+
+    :param certificate_order: The CertificateOrder to place the orders with
+    :param orders: An iterable of the orders' properties, without CSRs
+    :param generator: The KeyGenerator
+    :return: a generator of (GeneratedKey, response) pairs; the response is None for orders whose
+    keys could not be generated
+    """
+    for generated in generator.generate(orders):
+        if generated.error is not None:
+            yield generated, None
+            continue
+        response = certificate_order.place(**generated.order)
+        order_id = response.get('id') if hasattr(response, 'get') else None
+        if order_id is not None:
+            generator.link(generated, order_id)
+        yield generated, response
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+
+"""
+Compact record classes for the V2 API's orders, certificates, organizations and domains.
+
+These are optional alternatives to the nested dicts returned by default (see the models
+parameter of CertificateOrder and Request).  Each record keeps only the fields listed in
+its _fields in __slots__, stores ASCII text as byte strings, interns low-cardinality values
+(statuses, product names, signature hashes, dates) and keeps nested objects (an order's
+certificate and organization) as compact JSON text that is only decoded into records when
+first accessed.
+"""
+
+from .api import codec
+
+_interned = {}
+
+
+def _text(value):
+    if isinstance(value, unicode):
+        try:
+            return value.encode('ascii')
+        except UnicodeEncodeError:
+            return value
+    return value
+
+
+def _intern(value):
+    if value is None:
+        return None
+    value = _text(value)
+    return _interned.setdefault(value, value)
+
+
+def _texts(values):
+    return tuple(_text(value) for value in values) if values is not None else None
+
+
+def _nested(key, field=None, convert=None):
+    """Extractor for a field of a nested object, e.g. _nested('organization', 'id')."""
+    def extract(d):
+        value = d.get(key)
+        if value is not None and field is not None:
+            value = value.get(field) if isinstance(value, dict) else None
+        return convert(value) if convert and value is not None else value
+    return extract
+
+
+class _Record(object):
+    """
+    Base class for records.  _fields lists (attribute, source) pairs where source is
+    either the key of the attribute in the decoded object or a function extracting it;
+    _converters maps attributes to functions applied to their values.  Attributes named
+    in _lazy hold the nested object as JSON text until first accessed, when it is decoded
+    into the record class given there.  A subclass's __slots__ list only its own attributes
+    (see DuplicateCertificate); _all_slots() gives those of its bases too.
+    """
+
+    __slots__ = ()
+    _fields = ()
+    _converters = {}
+    _lazy = {}
+
+    def __init__(self, **kwargs):
+        for attribute in self._all_slots():
+            setattr(self, attribute, kwargs.get(attribute.lstrip('_')))
+
+    @classmethod
+    def _all_slots(cls):
+        """The attributes of the class and its bases, computed once per class."""
+        slots = cls.__dict__.get('_slots')
+        if slots is None:
+            slots = tuple(attribute for klass in reversed(cls.__mro__)
+                          for attribute in klass.__dict__.get('__slots__', ()))
+            cls._slots = slots
+        return slots
+
+    @classmethod
+    def from_dict(cls, d):
+        record = cls.__new__(cls)
+        converters = cls._converters
+        lazy = cls._lazy
+        for attribute, source in cls._fields:
+            value = source(d) if callable(source) else d.get(source)
+            if value is not None:
+                if attribute in converters:
+                    value = converters[attribute](value)
+                elif attribute in lazy:
+                    value = codec.dumps(value)
+            setattr(record, attribute, value)
+        return record
+
+    def _get_lazy(self, attribute):
+        value = getattr(self, attribute)
+        if isinstance(value, basestring):
+            value = self._lazy[attribute].from_dict(codec.loads(value))
+            setattr(self, attribute, value)
+        return value
+
+    def to_dict(self):
+        d = {}
+        for attribute in self._all_slots():
+            value = self._get_lazy(attribute) if attribute in self._lazy else getattr(self, attribute)
+            if isinstance(value, _Record):
+                value = value.to_dict()
+            elif isinstance(value, tuple):
+                value = list(value)
+            d[attribute.lstrip('_')] = value
+        return d
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '%s(id=%r)' % (self.__class__.__name__, getattr(self, 'id', None))
+
+
+class Certificate(_Record):
+    __slots__ = ('id', 'common_name', 'dns_names', 'serial_number', 'thumbprint', 'valid_from', 'valid_till',
+                 'date_created', 'signature_hash', 'key_size', 'organization_units', 'server_platform_id',
+                 'server_platform_name', 'ca_cert_id', 'csr')
+    _fields = (
+        ('id', 'id'),
+        ('common_name', 'common_name'),
+        ('dns_names', 'dns_names'),
+        ('serial_number', 'serial_number'),
+        ('thumbprint', 'thumbprint'),
+        ('valid_from', 'valid_from'),
+        ('valid_till', 'valid_till'),
+        ('date_created', 'date_created'),
+        ('signature_hash', 'signature_hash'),
+        ('key_size', 'key_size'),
+        ('organization_units', 'organization_units'),
+        ('server_platform_id', _nested('server_platform', 'id')),
+        ('server_platform_name', _nested('server_platform', 'name', _intern)),
+        ('ca_cert_id', _nested('ca_cert', 'id')),
+        ('csr', 'csr'),
+    )
+    _converters = {
+        'common_name': _text,
+        'dns_names': _texts,
+        'serial_number': _text,
+        'thumbprint': _text,
+        'valid_from': _intern,
+        'valid_till': _intern,
+        'date_created': _text,
+        'signature_hash': _intern,
+        'organization_units': _texts,
+        'csr': _text,
+    }
+
+
+class DuplicateCertificate(Certificate):
+    __slots__ = ('sub_id', 'status')
+    _fields = Certificate._fields + (
+        ('sub_id', 'sub_id'),
+        ('status', 'status'),
+    )
+    _converters = dict(Certificate._converters, sub_id=_text, status=_intern)
+
+
+class Organization(_Record):
+    __slots__ = ('id', 'name', 'display_name', 'address', 'address2', 'city', 'state', 'zip', 'country',
+                 'telephone', 'unit', 'container_id', 'organization_contact')
+    _fields = (
+        ('id', 'id'),
+        ('name', 'name'),
+        ('display_name', 'display_name'),
+        ('address', 'address'),
+        ('address2', 'address2'),
+        ('city', 'city'),
+        ('state', 'state'),
+        ('zip', 'zip'),
+        ('country', 'country'),
+        ('telephone', 'telephone'),
+        ('unit', 'unit'),
+        ('container_id', _nested('container', 'id')),
+        ('organization_contact', 'organization_contact'),
+    )
+    _converters = {
+        'name': _text,
+        'display_name': _text,
+        'address': _text,
+        'address2': _text,
+        'city': _intern,
+        'state': _intern,
+        'zip': _text,
+        'country': _intern,
+        'telephone': _text,
+        'unit': _text,
+    }
+
+
+class Domain(_Record):
+    __slots__ = ('id', 'name', 'organization_id', 'container_id', 'is_active', 'date_created')
+    _fields = (
+        ('id', 'id'),
+        ('name', 'name'),
+        ('organization_id', _nested('organization', 'id')),
+        ('container_id', _nested('container', 'id')),
+        ('is_active', 'is_active'),
+        ('date_created', 'date_created'),
+    )
+    _converters = {
+        'name': _text,
+        'date_created': _text,
+    }
+
+
+class Order(_Record):
+    __slots__ = ('id', 'status', 'date_created', 'validity_years', 'product_name_id', 'product_name',
+                 'product_type', 'container_id', '_certificate', '_organization')
+    _fields = (
+        ('id', 'id'),
+        ('status', 'status'),
+        ('date_created', 'date_created'),
+        ('validity_years', 'validity_years'),
+        ('product_name_id', _nested('product', 'name_id', _intern)),
+        ('product_name', _nested('product', 'name', _intern)),
+        ('product_type', _nested('product', 'type', _intern)),
+        ('container_id', _nested('container', 'id')),
+        ('_certificate', 'certificate'),
+        ('_organization', 'organization'),
+    )
+    _converters = {
+        'status': _intern,
+        'date_created': _text,
+    }
+    _lazy = {
+        '_certificate': Certificate,
+        '_organization': Organization,
+    }
+
+    @property
+    def certificate(self):
+        return self._get_lazy('_certificate')
+
+    @property
+    def organization(self):
+        return self._get_lazy('_organization')
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,442 @@
+#!/usr/bin/env python
+
+"""
+Bulk issuance.  IssuancePipeline takes each certificate through four stages, each run by its
+own pool of threads with its own CertificateOrder:
+
+    submit   place() the order, or create_duplicate() of an existing one
+    poll     view() the order (or list_duplicates()) until it is issued
+    download download() the certificate chain (or download_duplicate())
+    install  write the chain to out_dir (or hand it to an install callable)
+
+The stages are connected by bounded queues, so a slow stage holds back the ones before it
+instead of letting work pile up, and the items to issue are read lazily.  Polling does not
+hold a thread while it waits: pending orders are kept in a queue ordered by when they are
+next due to be polled.
+
+Each stage an item completes is recorded in a Checkpoint file.  Run again with the same
+checkpoint, the pipeline skips the items already installed or failed, polls those already
+submitted without submitting them again, and downloads those already issued.  With a
+Journal as well, an order sent but not yet answered when the run crashed is not submitted
+again either (see digicert_client.journal), e.g.
+
+    pool = ConnectionPool()
+    pipeline = IssuancePipeline(lambda: CertificateOrder(host, api_key, conn=pool.connection(host)),
+                                out_dir='/etc/ssl/issued', checkpoint=Checkpoint('issuance.jsonl'))
+    for issuance in pipeline.run({'name': o['common_name'], 'order': o} for o in orders):
+        print issuance.name, issuance.stage, issuance.error
+"""
+
+import heapq
+import json
+import os
+import re
+import tempfile
+import threading
+from httplib import HTTPException
+from Queue import Queue
+from timeit import default_timer
+
+from . import journal
+
+SUBMITTED = 'submitted'
+ISSUED = 'issued'
+INSTALLED = 'installed'
+FAILED = 'failed'
+
+ISSUED_STATUSES = frozenset(['issued', 'approved'])
+FAILED_STATUSES = frozenset(['rejected', 'denied', 'canceled', 'cancelled', 'revoked', 'expired'])
+
+_UNSAFE_FILENAME = re.compile(r'[^A-Za-z0-9.-]')
+
+
+class Issuance(object):
+    """One certificate going through an IssuancePipeline."""
+
+    __slots__ = ('name', 'order', 'duplicate_of', 'duplicate', 'order_id', 'sub_id', 'stage', 'path', 'error',
+                 'polls')
+
+    def __init__(self, name, order=None, duplicate_of=None, duplicate=None):
+        """
+        :param name: Name of the item, unique within a checkpoint
+        :param order: The properties of a new order, as passed to CertificateOrder.place()
+        :param duplicate_of: The id of the order to create a duplicate of, instead of placing an order
+        :param duplicate: The properties of the duplicate, as passed to CertificateOrder.create_duplicate()
+        """
+        self.name = name
+        self.order = order
+        self.duplicate_of = duplicate_of
+        self.duplicate = duplicate
+        self.order_id = duplicate_of
+        self.sub_id = None
+        self.stage = None
+        self.path = None
+        self.error = None
+        self.polls = 0
+
+    @classmethod
+    def from_spec(cls, spec):
+        """An Issuance from a dict with 'order', or 'duplicate_of' and 'duplicate', and optionally 'name'."""
+        if isinstance(spec, Issuance):
+            return spec
+        order = spec.get('order')
+        if order is None and spec.get('duplicate_of') is None:
+            raise KeyError('No value provided for required property "order" or "duplicate_of"')
+        name = spec.get('name') or (order or {}).get('common_name')
+        if not name:
+            raise KeyError('No value provided for required property "name"')
+        return cls(name, order, spec.get('duplicate_of'), spec.get('duplicate') or {})
+
+    def __repr__(self):
+        return 'Issuance(name=%r, stage=%r, order_id=%r)' % (self.name, self.stage, self.order_id)
+
+
+class Checkpoint(object):
+    """
+    An append-only JSON-lines file of the stages items have completed.  Each record is flushed
+    as it is written, so it survives the process crashing (but not necessarily the machine).
+    """
+
+    _fields = ('order_id', 'sub_id', 'path', 'error')
+
+    def __init__(self, path):
+        """:param path: The checkpoint file; created if missing"""
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def load(self):
+        """The latest recorded state of each item, by name: dicts with 'stage', 'order_id', etc."""
+        states = {}
+        try:
+            f = open(self.path)
+        except IOError:
+            return states
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # a record cut short by a crash
+                    continue
+                states.setdefault(record['name'], {}).update(record)
+        return states
+
+    def record(self, issuance):
+        """Record the stage issuance has reached."""
+        record = {'name': issuance.name, 'stage': issuance.stage}
+        for field in self._fields:
+            value = getattr(issuance, field)
+            if value is not None:
+                record[field] = value if 'error' != field else str(value)
+        line = json.dumps(record, sort_keys=True) + '\n'
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a')
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class _PollQueue(object):
+    """Items ordered by when they are due.  New items wait while maxsize items are queued."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._heap = []
+        self._count = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def put(self, item, when=0.0, requeue=False):
+        """Add item, due at when; new items wait for room, but requeued ones are always accepted."""
+        with self._condition:
+            while not requeue and len(self._heap) >= self.maxsize and not self._closed:
+                self._condition.wait()
+            self._count += 1
+            heapq.heappush(self._heap, (when, self._count, item))
+            self._condition.notify_all()
+
+    def get(self):
+        """The earliest item, once it is due, or None once the queue is closed."""
+        with self._condition:
+            while not self._closed:
+                if self._heap:
+                    wait = self._heap[0][0] - default_timer()
+                    if wait <= 0:
+                        item = heapq.heappop(self._heap)[2]
+                        self._condition.notify_all()
+                        return item
+                    self._condition.wait(wait)
+                else:
+                    self._condition.wait()
+            return None
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+def _get(response, key):
+    if hasattr(response, 'get'):
+        return response.get(key)
+    return getattr(response, key, None)
+
+
+def _sub_id_order(duplicate):
+    # sub ids are numbers ('001', '010'); compared as text, '9' would sort after '10'
+    sub_id = str(_get(duplicate, 'sub_id'))
+    return (int(sub_id), '') if sub_id.isdigit() else (-1, sub_id)
+
+
+def _pem_chain(pems):
+    return ''.join(pem.strip().replace('\r\n', '\n') + '\n' for pem in pems if pem and pem.strip())
+
+
+class IssuancePipeline(object):
+    """Submits, polls, downloads and installs certificates in bulk; see the module's documentation."""
+
+    def __init__(self, make_order, out_dir=None, install=None, checkpoint=None, journal=None, submit_workers=4,
+                 poll_workers=4, download_workers=4, install_workers=1, queue_size=100, poll_interval=30.0,
+                 max_polls=None):
+        """
+        :param make_order: Callable returning a new CertificateOrder; each worker thread makes its own
+        :param out_dir: Directory the chains are written to, as <name>.pem, if no install callable is given
+        :param install: Optional callable taking (issuance, chain) that installs the PEM chain and returns
+        where it was installed
+        :param checkpoint: Optional Checkpoint to record progress in and resume from
+        :param journal: Optional Journal (see digicert_client.journal) through which orders are submitted, so
+        that an order sent just before a crash is never submitted again
+        :param submit_workers: Number of orders submitted at a time
+        :param poll_workers: Number of orders polled at a time
+        :param download_workers: Number of certificates downloaded at a time
+        :param install_workers: Number of certificates installed at a time
+        :param queue_size: Maximum number of items waiting for each stage
+        :param poll_interval: Seconds between polls of an order that has not been issued yet
+        :param max_polls: Optional number of polls after which an order that has not been issued fails
+        """
+        if install is None and out_dir is None:
+            raise KeyError('No value provided for required property "out_dir" or "install"')
+        self.make_order = make_order
+        self.out_dir = out_dir
+        self.install = install or self._write_chain
+        self.checkpoint = checkpoint
+        self.journal = journal
+        self.workers = {'submit': submit_workers, 'poll': poll_workers, 'download': download_workers,
+                        'install': install_workers}
+        self.queue_size = queue_size
+        self.poll_interval = poll_interval
+        self.max_polls = max_polls
+
+    def _write_chain(self, issuance, chain):
+        path = os.path.join(self.out_dir, _UNSAFE_FILENAME.sub('_', issuance.name.replace('*', 'wildcard')) + '.pem')
+        fd, tmp = tempfile.mkstemp(dir=self.out_dir, prefix='.pem')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(chain)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp, 0644)
+            os.rename(tmp, path)
+        except:
+            os.unlink(tmp)
+            raise
+        return path
+
+    # Stages; each takes the worker's CertificateOrder and the item from its queue, and returns the
+    # queue to pass the Issuance on to and the arguments to put() there, or None when it is finished.
+
+    def _submit(self, client, issuance):
+        if issuance.duplicate_of is None:
+            operation, params = 'place', issuance.order
+        else:
+            operation, params = 'create_duplicate', dict(issuance.duplicate, digicert_order_id=issuance.duplicate_of)
+        send = lambda p: getattr(client, operation)(**p)
+        if self.journal is not None:
+            submission = journal.submit(self.journal, issuance.name, operation, params, send)
+            if submission.error is not None:
+                raise submission.error
+            response = submission.response or {'id': submission.order_id}
+        else:
+            response = send(params)
+        if issuance.duplicate_of is None:
+            order_id = _get(response, 'id')
+            if order_id is None:
+                raise RuntimeError('Order not placed: %r' % (response,))
+            issuance.order_id = order_id
+        elif response is None or _get(response, 'errors'):
+            raise RuntimeError('Duplicate not created: %r' % (response,))
+        self._advance(issuance, SUBMITTED)
+        return self._poll_queue, (issuance,)
+
+    def _status(self, client, issuance):
+        if issuance.duplicate_of is None:
+            return _get(client.view(digicert_order_id=issuance.order_id), 'status')
+        duplicates = client.list_duplicates(digicert_order_id=issuance.duplicate_of) or []
+        csr = (_get(issuance.duplicate.get('certificate') or {}, 'csr') or '').split()
+        latest = None
+        for duplicate in duplicates:
+            if csr:
+                # only the duplicate with this CSR will do: until it is listed, the latest one is an
+                # earlier duplicate, with another key
+                if (_get(duplicate, 'csr') or '').split() == csr:
+                    latest = duplicate
+                    break
+            elif latest is None or _sub_id_order(duplicate) > _sub_id_order(latest):
+                latest = duplicate
+        if latest is None:
+            return None
+        issuance.sub_id = _get(latest, 'sub_id')
+        return _get(latest, 'status')
+
+    def _poll(self, client, issuance):
+        issuance.polls += 1
+        try:
+            status = self._status(client, issuance)
+        except (EnvironmentError, HTTPException, RuntimeError) as e:
+            status, issuance.error = None, e
+        if status in ISSUED_STATUSES:
+            issuance.error = None
+            self._advance(issuance, ISSUED)
+            return self._download_queue, (issuance,)
+        if status in FAILED_STATUSES:
+            raise RuntimeError('Order %s was %s' % (issuance.order_id, status))
+        if self.max_polls and issuance.polls >= self.max_polls:
+            raise RuntimeError('Order %s not issued after %d polls' % (issuance.order_id, issuance.polls))
+        return self._poll_queue, (issuance, default_timer() + self.poll_interval, True)
+
+    def _download(self, client, issuance):
+        if issuance.duplicate_of is None:
+            response = client.download(digicert_order_id=issuance.order_id)
+            certificates = _get(response, 'certificates')
+            if not certificates:
+                raise RuntimeError('Certificate not downloaded: %r' % (response,))
+            chain = _pem_chain(certificates.get(name) for name in ('certificate', 'intermediate', 'root'))
+        else:
+            response = client.download_duplicate(digicert_order_id=issuance.duplicate_of, sub_id=issuance.sub_id)
+            if not isinstance(response, list):
+                raise RuntimeError('Duplicate not downloaded: %r' % (response,))
+            chain = _pem_chain(response)
+        return self._install_queue, ((issuance, chain),)
+
+    def _install(self, client, item):
+        issuance, chain = item
+        issuance.path = self.install(issuance, chain)
+        self._advance(issuance, INSTALLED)
+        return None
+
+    def _advance(self, issuance, stage):
+        issuance.stage = stage
+        if self.checkpoint is not None:
+            self.checkpoint.record(issuance)
+
+    def _worker(self, stage, queue):
+        client = self.make_order() if 'install' != stage else None
+        handle = getattr(self, '_' + stage)
+        while True:
+            item = queue.get()
+            if item is None:
+                return
+            issuance = item[0] if isinstance(item, tuple) else item
+            if self._stopped:
+                continue
+            try:
+                following = handle(client, item)
+            except Exception as e:
+                issuance.error = e
+                self._advance(issuance, FAILED)
+                following = None
+            if following is None:
+                self._finished.put(issuance)
+            else:
+                next_queue, args = following
+                next_queue.put(*args)
+
+    def _feed(self, specs):
+        states = self.checkpoint.load() if self.checkpoint is not None else {}
+        count = 0
+        try:
+            for spec in specs:
+                if self._stopped:
+                    break
+                count += 1
+                try:
+                    issuance = Issuance.from_spec(spec)
+                except Exception as e:
+                    issuance = Issuance(_get(spec, 'name'))
+                    issuance.stage, issuance.error = FAILED, e
+                    self._finished.put(issuance)
+                    continue
+                state = states.get(issuance.name)
+                if state is not None:
+                    issuance.stage = state.get('stage')
+                    issuance.order_id = state.get('order_id', issuance.order_id)
+                    issuance.sub_id = state.get('sub_id')
+                    issuance.path = state.get('path')
+                    issuance.error = state.get('error')
+                if issuance.stage in (INSTALLED, FAILED):
+                    self._finished.put(issuance)
+                elif ISSUED == issuance.stage:
+                    self._download_queue.put(issuance)
+                elif SUBMITTED == issuance.stage:
+                    self._poll_queue.put(issuance)
+                else:
+                    self._submit_queue.put(issuance)
+        finally:
+            self._finished.put(count)
+
+    def run(self, specs):
+        """
+        Issue a certificate for each item.
+
+        :param specs: An iterable of Issuance, or of dicts with either 'order' (the properties of a new
+        order, see CertificateOrder.place()) or 'duplicate_of' (an order id) and 'duplicate' (the
+        properties of the duplicate, see CertificateOrder.create_duplicate()), and a unique 'name'
+        (defaulting to the order's common_name).  It is read lazily.
+        :return: a generator of the Issuance of each item, as it is finished: with stage INSTALLED and
+        path set if it succeeded, or with stage FAILED and error set if it did not (including items
+        whose spec is invalid, which are not submitted)
+        """
+        self._stopped = False
+        self._finished = Queue()
+        self._submit_queue = Queue(self.queue_size)
+        self._poll_queue = _PollQueue(self.queue_size)
+        self._download_queue = Queue(self.queue_size)
+        self._install_queue = Queue(self.queue_size)
+        queues = {'submit': self._submit_queue, 'poll': self._poll_queue, 'download': self._download_queue,
+                  'install': self._install_queue}
+        threads = [threading.Thread(target=self._feed, args=(specs,))]
+        for stage, queue in queues.items():
+            for _ in range(self.workers[stage]):
+                threads.append(threading.Thread(target=self._worker, args=(stage, queue)))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        done, total = 0, None
+        try:
+            while total is None or done < total:
+                item = self._finished.get()
+                if isinstance(item, Issuance):
+                    done += 1
+                    yield item
+                else:
+                    total = item
+        finally:
+            self._stopped = True
+            self._poll_queue.close()
+            for stage, queue in queues.items():
+                if queue is not self._poll_queue:
+                    for _ in range(self.workers[stage]):
+                        queue.put(None)
+            if self.checkpoint is not None:
+                self.checkpoint.close()
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+
+import json
+import threading
+import time
+import unittest
+
+from . import MockConnection
+from .. import CertificateOrder
+from ..api.commands.v2 import DuplicateTemplate, OrderDuplicateCommand
+from ..bulk import imap_unordered
+from ..https.pool import ConnectionPool, PooledConnection
+from .TestValidation import RSA_2048_CSR, RSA_1024_SHA1_CSR
+
+
+class CloningConnection(MockConnection):
+    """MockConnection whose clones record the requests of all of them."""
+
+    def __init__(self, host, responses=None, requests=None):
+        MockConnection.__init__(self, host, responses)
+        self.requests = requests if requests is not None else []
+        self.threads = set()
+
+    def clone(self):
+        clone = CloningConnection(self.host, self.responses, self.requests)
+        clone.threads = self.threads
+        return clone
+
+    def request(self, method, path, params, headers):
+        MockConnection.request(self, method, path, params, headers)
+        self.requests.append((method, path, params))
+        self.threads.add(threading.current_thread().ident)
+
+
+class SlowConnection(CloningConnection):
+    """CloningConnection whose requests after the first take a while."""
+
+    def clone(self):
+        clone = SlowConnection(self.host, self.responses, self.requests)
+        clone.threads = self.threads
+        return clone
+
+    def request(self, method, path, params, headers):
+        CloningConnection.request(self, method, path, params, headers)
+        if len(self.requests) > 1:
+            time.sleep(0.05)
+
+
+class TestBulk(unittest.TestCase):
+    def test_results_and_errors(self):
+        def square(state, item):
+            if 3 == item:
+                raise ValueError('three')
+            return state + item * item
+
+        results = dict((item, (result, error)) for item, result, error in
+                       imap_unordered(square, range(10), workers=3, initializer=lambda: 100))
+        self.assertEqual(10, len(results))
+        self.assertEqual((181, None), results[9])
+        self.assertEqual(None, results[3][0])
+        self.assertTrue(isinstance(results[3][1], ValueError))
+
+    def test_state_per_worker(self):
+        states = []
+        lock = threading.Lock()
+
+        def initializer():
+            with lock:
+                states.append(object())
+                return states[-1]
+
+        used = set(id(state) for _, state, _ in imap_unordered(lambda state, item: state, range(50), workers=4,
+                                                               initializer=initializer))
+        self.assertEqual(4, len(states))
+        self.assertTrue(used <= set(id(state) for state in states))
+
+    def test_items_read_lazily(self):
+        taken = []
+
+        def items():
+            for i in range(100):
+                taken.append(i)
+                yield i
+
+        results = imap_unordered(lambda state, item: item, items(), workers=2, backlog=5)
+        next(results)
+        self.assertTrue(len(taken) <= 6)
+        self.assertEqual(99, len(list(results)))
+
+    def test_closed_early(self):
+        called = []
+
+        def work(state, item):
+            called.append(item)
+            if item:
+                time.sleep(0.05)
+            return item
+
+        results = imap_unordered(work, range(100), workers=2, backlog=10)
+        next(results)
+        results.close()
+        self.assertTrue(len(called) <= 3, called)
+
+    def test_failed_initializer(self):
+        def initializer():
+            raise RuntimeError('no connection')
+
+        results = list(imap_unordered(lambda state, item: item, range(3), workers=2, initializer=initializer))
+        self.assertEqual(3, len(results))
+        self.assertTrue(all(isinstance(error, RuntimeError) for _, _, error in results))
+
+
+class TestBulkOrders(unittest.TestCase):
+    def test_worker_order(self):
+        order = CertificateOrder(host='localhost', customer_api_key='abc123', lookup_ttl=60)
+        worker = order.worker_order()
+        self.assertTrue(isinstance(worker.conn, PooledConnection))
+        self.assertTrue(worker.conn.pool is order.worker_order().conn.pool)
+        self.assertEqual((60, 'abc123'), (worker.lookup_ttl, worker.customer_api_key))
+        order._lookups['/services/v2/user/me'] = (0, {'id': 1}, 0)
+        worker = order.worker_order()
+        worker._lookups['/services/v2/domain'] = (0, [], 0)
+        self.assertTrue('/services/v2/user/me' in worker._lookups)
+        self.assertEqual(['/services/v2/user/me'], list(order._lookups))
+        pool = ConnectionPool()
+        order = CertificateOrder(host='localhost', customer_api_key='abc123',
+                                 conn=pool.connection('localhost', 443, proxy='proxy.fakeco.biz:3128'))
+        worker = order.worker_order()
+        self.assertTrue(worker.conn is not order.conn and worker.conn.pool is pool)
+        self.assertEqual(order.conn.key, worker.conn.key)
+        self.assertEqual(None, CertificateOrder(host='localhost', customer_api_key='abc123',
+                                                conn=MockConnection('localhost')).worker_order())
+
+    def test_upload_csr_many(self):
+        conn = CloningConnection('localhost')
+        order = CertificateOrder(host='localhost', customer_api_key='abc123', conn=conn)
+        items = [(i, RSA_2048_CSR) for i in range(20)] + [(20, RSA_1024_SHA1_CSR), (21, 'not a csr')]
+        results = dict((order_id, (response, error)) for order_id, response, error in
+                       order.upload_csr_many(items, concurrency=4))
+        self.assertEqual(range(22), sorted(results))
+        self.assertEqual(20, len(conn.requests))
+        self.assertEqual(set('/services/v2/order/certificate/%d/csr' % i for i in range(20)),
+                         set(path for _, path, _ in conn.requests))
+        self.assertEqual(set([None]), set(error for _, error in results.values()))
+        self.assertEqual(400, results[20][0]['status'])
+        self.assertEqual(['weak_key', 'weak_signature'], sorted(e['code'] for e in results[20][0]['response']['errors']))
+        self.assertEqual(['invalid_csr'], [e['code'] for e in results[21][0]['response']['errors']])
+        self.assertTrue(len(conn.threads) > 1)
+
+    def test_upload_csr_many_closed_early(self):
+        conn = SlowConnection('localhost')
+        order = CertificateOrder(host='localhost', customer_api_key='abc123', conn=conn)
+        results = order.upload_csr_many(((i, RSA_2048_CSR) for i in range(100)), concurrency=4)
+        next(results)
+        results.close()
+        sent = len(conn.requests)
+        self.assertTrue(sent <= 5, sent)
+        time.sleep(0.1)
+        self.assertEqual(sent, len(conn.requests))
+
+    def test_upload_csr_many_without_validation(self):
+        conn = MockConnection('localhost')
+        order = CertificateOrder(host='localhost', customer_api_key='abc123', conn=conn)
+        results = list(order.upload_csr_many([(1, 'not a csr')], validate=False))
+        self.assertEqual(1, len(results))
+        self.assertEqual('/services/v2/order/certificate/1/csr', conn.path)
+
+    def test_duplicate_template_body(self):
+        template = DuplicateTemplate(server_platform={'id': 2}, signature_hash='sha256', common_name='example.com')
+        for overrides in [{}, {'csr': 'CSR'}, {'csr': 'CSR', 'signature_hash': 'sha384'},
+                          {'dns_names': ['a.example.com', 'b.example.com'], 'csr': u'CSR\u00e9'}]:
+            expected = dict(template.certificate)
+            expected.update(overrides)
+            self.assertEqual({'certificate': expected}, json.loads(template.body(overrides)))
+            cmd = OrderDuplicateCommand(customer_api_key='abc123', digicert_order_id=5, template=template,
+                                        certificate=overrides)
+            self.assertEqual({'certificate': expected}, json.loads(cmd.get_params()))
+            self.assertEqual(expected, cmd.certificate)
+            self.assertEqual('/services/v2/order/certificate/5/duplicate', cmd.get_path())
+        self.assertEqual({'certificate': {}}, json.loads(DuplicateTemplate().body({})))
+        cmd = OrderDuplicateCommand(customer_api_key='abc123', digicert_order_id=5, template=template,
+                                    certificate={'csr': 'CSR'}, comments='hi', cache_params=True)
+        self.assertEqual({'certificate': dict(template.certificate, csr='CSR'), 'comments': 'hi'},
+                         json.loads(cmd.get_params()))
+        self.assertEqual(4, len(template._shared))
+
+    def test_create_duplicates_many(self):
+        conn = CloningConnection('localhost')
+        order = CertificateOrder(host='localhost', customer_api_key='abc123', conn=conn)
+        template = {'server_platform': {'id': 2}, 'signature_hash': 'sha256', 'common_name': 'example.com'}
+        items = [(42, {'csr': RSA_2048_CSR, 'dns_names': ['example.com', 'www.example.com'], 'comments': 'node%d' % i})
+                 for i in range(20)]
+        items.append((42, {'csr': RSA_2048_CSR, 'dns_names': ['example.com']}))
+        results = list(order.create_duplicates_many(items, template=template, concurrency=4))
+        self.assertEqual(21, len(results))
+        self.assertEqual(set([None]), set(error for _, _, error in results))
+        rejected = [response for item, response, _ in results if 'comments' not in item[1]]
+        self.assertEqual(['csr_san_mismatch'], [e['code'] for e in rejected[0]['response']['errors']])
+        self.assertEqual(20, len(conn.requests))
+        self.assertEqual(set(['/services/v2/order/certificate/42/duplicate']), set(path for _, path, _ in conn.requests))
+        bodies = sorted(json.loads(body)['certificate']['comments'] for _, _, body in conn.requests)
+        self.assertEqual(sorted('node%d' % i for i in range(20)), bodies)
+        body = json.loads(conn.requests[0][2])['certificate']
+        self.assertEqual(('sha256', {'id': 2}, RSA_2048_CSR), (body['signature_hash'], body['server_platform'], body['csr']))
+        self.assertTrue(len(conn.threads) > 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+import unittest
+
+from ..api import Request, codec
+from ..api.queries.v2 import ViewOrderDetailsQuery
+
+
+class HeaderResponse(object):
+    def __init__(self, body, content_type=None):
+        self.status = 200
+        self.reason = 'OK'
+        self.body = body
+        self.content_type = content_type
+
+    def read(self):
+        return self.body
+
+    def getheader(self, name, default=None):
+        if 'content-type' == name.lower() and self.content_type is not None:
+            return self.content_type
+        return default
+
+
+class HeaderConnection(object):
+    def __init__(self, response):
+        self.response = response
+
+    def request(self, method, path, params, headers):
+        pass
+
+    def getresponse(self):
+        return self.response
+
+    def close(self):
+        pass
+
+
+class TestCodec(unittest.TestCase):
+    def send(self, body, content_type=None):
+        query = ViewOrderDetailsQuery(customer_api_key='abc123', order_id='OID-223344')
+        return Request(query, 'localhost', HeaderConnection(HeaderResponse(body, content_type))).send()
+
+    def test_json_content_type_is_decoded(self):
+        response = self.send('{"id": "OID-223344"}', 'application/json; charset=utf-8')
+        self.assertEqual('OID-223344', response['id'])
+
+    def test_other_content_types_are_not_decoded(self):
+        response = self.send('["not", "decoded"]', 'application/x-pem-file')
+        self.assertEqual('["not", "decoded"]', response['response'])
+
+    def test_body_without_content_type_is_decoded_if_it_parses(self):
+        self.assertEqual('OID-223344', self.send('{"id": "OID-223344"}')['id'])
+        self.assertEqual('-----BEGIN CERTIFICATE-----', self.send('-----BEGIN CERTIFICATE-----')['response'])
+
+    def test_invalid_json_is_returned_raw(self):
+        self.assertEqual('{"id": ', self.send('{"id": ', 'application/json')['response'])
+
+    def test_is_json(self):
+        self.assertTrue(codec.is_json('application/json'))
+        self.assertTrue(codec.is_json('Application/JSON;charset=UTF-8'))
+        self.assertTrue(codec.is_json('application/problem+json'))
+        self.assertFalse(codec.is_json('application/zip'))
+        self.assertFalse(codec.is_json('text/plain'))
+
+    def test_use(self):
+        current = codec.name
+        try:
+            self.assertEqual('json', codec.use('json'))
+            self.assertEqual({'a': [1, 2]}, codec.loads(codec.dumps({'a': [1, 2]})))
+            self.assertRaises(ValueError, codec.use, 'pickle')
+        finally:
+            codec.use(current)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+import unittest
+import zlib
+
+from . import MockConnection, MockResponse
+from .. import CertificateOrder
+from ..api import Request
+from ..api.compression import Decompressor, decompressor_for, decoding_reader
+from ..api.queries.v2 import ViewOrdersQuery
+
+
+def _compress(data, encoding):
+    wbits = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS, 'raw': -zlib.MAX_WBITS}.get(encoding)
+    if wbits is None:
+        return data
+    compressor = zlib.compressobj(6, zlib.DEFLATED, wbits)
+    return compressor.compress(data) + compressor.flush()
+
+
+class CompressedResponse(MockResponse):
+    def __init__(self, status, reason, payload, encoding):
+        MockResponse.__init__(self, status, reason, payload)
+        self.encoding = encoding
+        if encoding is not None:
+            self.body = _compress(self.body, 'raw' if 'raw deflate' == encoding else encoding)
+
+    def getheader(self, name, default=None):
+        if 'content-encoding' == name.lower() and self.encoding is not None:
+            return 'deflate' if 'raw deflate' == self.encoding else self.encoding
+        return MockResponse.getheader(self, name, default)
+
+
+class CompressingConnection(MockConnection):
+    encoding = 'gzip'
+
+    def getresponse(self):
+        status, reason, response = self.responses[self.path]
+        return CompressedResponse(status, reason, response, self.encoding)
+
+
+class TestCompression(unittest.TestCase):
+    orders = [{'id': i, 'status': 'issued', 'certificate': {'common_name': 'host%d.fakeco.biz' % i}}
+              for i in range(500)]
+
+    def order(self, encoding, status=200):
+        conn = CompressingConnection('localhost', responses={
+            '/services/v2/order/certificate': (status, 'OK', {'orders': self.orders}),
+        })
+        conn.encoding = encoding
+        return CertificateOrder(host='localhost', customer_api_key='abc123', conn=conn), conn
+
+    def test_encodings_accepted(self):
+        order, conn = self.order('gzip')
+        order.view_all()
+        self.assertEqual('gzip, deflate', conn.headers['Accept-Encoding'])
+
+    def test_buffered_responses_decompressed(self):
+        for encoding in ('gzip', 'deflate', 'raw deflate', None):
+            order, conn = self.order(encoding)
+            self.assertEqual(self.orders, order.view_all()['orders'])
+
+    def test_streamed_responses_decompressed(self):
+        for encoding in ('gzip', 'deflate', 'raw deflate'):
+            conn = CompressingConnection('localhost', responses={
+                '/services/v2/order/certificate': (200, 'OK', {'orders': self.orders}),
+            })
+            conn.encoding = encoding
+            request = Request(action=ViewOrdersQuery(customer_api_key='abc123'), host='localhost', conn=conn)
+            for chunk_size in (1, 100, 1 << 16):
+                request.response_bytes = 0
+                self.assertEqual(self.orders, list(request.iter_items(chunk_size)))
+                self.assertTrue(0 < request.response_bytes < len(str(self.orders)) / 4)
+
+    def test_failures_decompressed(self):
+        order, conn = self.order('gzip', status=403)
+        try:
+            list(order.view_all(stream=True))
+            self.fail('No RuntimeError')
+        except RuntimeError as e:
+            self.assertTrue('host0.fakeco.biz' in str(e))
+
+    def test_reads_bounded(self):
+        body = 'x' * 100000
+        compressed = _compress(body, 'gzip')
+        offsets = [0]
+
+        def read(size):
+            data = compressed[offsets[0]:offsets[0] + size]
+            offsets[0] += len(data)
+            return data
+
+        sizes = []
+        counted = []
+        read = decoding_reader(read, Decompressor('gzip'), counted.append)
+        while True:
+            data = read(4096)
+            if not data:
+                break
+            sizes.append(len(data))
+        self.assertEqual(len(body), sum(sizes))
+        self.assertTrue(max(sizes) <= 4096)
+        self.assertEqual(len(compressed), sum(counted))
+
+    def test_unsupported_and_corrupt_bodies(self):
+        self.assertRaises(RuntimeError, decompressor_for, CompressedResponse(200, 'OK', {}, 'br'))
+        self.assertEqual(None, decompressor_for(CompressedResponse(200, 'OK', {}, 'identity')))
+        decompressor = Decompressor('gzip')
+        self.assertRaises(ValueError, decompressor.decompress, 'not gzip data')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+import json
+import unittest
+
+from ..api import credentials
+from ..api.credentials import Credentials, credentials_for
+from ..api.commands.v2 import OrderCertificateCommand, OrderDuplicateCommand
+from ..api.queries.v1 import ViewOrderDetailsQuery as ViewOrderDetailsQueryV1
+from ..api.queries.v2 import ViewOrderDetailsQuery, ViewOrdersQuery
+
+
+class TestCredentials(unittest.TestCase):
+    def test_shared_per_key_and_version(self):
+        first = ViewOrderDetailsQuery(customer_api_key='key-1', order_id='1')
+        second = ViewOrdersQuery(customer_api_key='key-1')
+        other = ViewOrdersQuery(customer_api_key='key-2')
+        self.assertTrue(first._credentials is second._credentials)
+        self.assertEqual('key-1', first.get_headers()['X-DC-DEVKEY'])
+        self.assertEqual('key-2', other.get_headers()['X-DC-DEVKEY'])
+        self.assertTrue(credentials_for('key-1') is credentials_for('key-1', None, 2))
+        self.assertFalse(credentials_for('key-1') is credentials_for('key-1', '12345', 1))
+
+    def test_headers_returned_are_copies(self):
+        query = ViewOrdersQuery(customer_api_key='key-1')
+        query.get_headers()['X-DC-DEVKEY'] = 'tampered'
+        self.assertEqual('key-1', ViewOrdersQuery(customer_api_key='key-1').get_headers()['X-DC-DEVKEY'])
+        self.assertEqual('key-1', query.get_headers()['X-DC-DEVKEY'])
+
+    def test_cache_bounded(self):
+        first = credentials_for('key-first')
+        for i in range(credentials.MAX_CACHED):
+            credentials_for('key-%d' % i)
+        self.assertEqual(credentials.MAX_CACHED, len(credentials._credentials))
+        self.assertFalse(credentials_for('key-first') is first)
+        self.assertEqual('key-first', credentials_for('key-first').headers['X-DC-DEVKEY'])
+
+    def test_v1_headers(self):
+        query = ViewOrderDetailsQueryV1(customer_api_key='abapsdrtaewrh89249sbs89as0d', customer_name='12345',
+                                        order_id='1')
+        headers = query.get_headers()
+        self.assertEqual('MTIzNDU6YWJhcHNkcnRhZXdyaDg5MjQ5c2JzODlhczBk', headers['Authorization'])
+        self.assertEqual('application/x-www-form-urlencoded', headers['Content-Type'])
+        self.assertFalse('X-DC-DEVKEY' in headers)
+        self.assertEqual('12345', query.customer_name)
+        self.assertEqual('abapsdrtaewrh89249sbs89as0d', query.customer_api_key)
+        self.assertFalse('Authorization' in ViewOrdersQuery(customer_api_key='abc').get_headers())
+        self.assertRaises(KeyError, Credentials, 'abc', None, 1)
+        self.assertRaises(ValueError, Credentials, 'abc', None, 3)
+
+    def test_set_header_is_per_action(self):
+        first = ViewOrdersQuery(customer_api_key='key-1')
+        second = ViewOrdersQuery(customer_api_key='key-1')
+        first.set_header('X-Request-Id', 'abc')
+        self.assertEqual('abc', first.get_headers()['X-Request-Id'])
+        self.assertFalse('X-Request-Id' in second.get_headers())
+        self.assertFalse('X-Request-Id' in credentials_for('key-1').headers)
+
+    def test_command_str(self):
+        cmd = OrderCertificateCommand(customer_api_key='abc123', certificate_type='sslplus', csr='---CSR---',
+                                      validity=1, common_name='fakeco.biz', organization_id='654321')
+        d = json.loads(str(cmd))
+        self.assertEqual('fakeco.biz', d['common_name'])
+        self.assertEqual('abc123', d['_headers']['X-DC-DEVKEY'])
+        self.assertTrue(cmd._credentials is credentials_for('abc123'))
+
+    def test_key_not_in_body(self):
+        cmd = OrderDuplicateCommand(customer_api_key='secret-key', digicert_order_id='1234',
+                                    certificate={'common_name': 'fakeco.biz'})
+        body = cmd.get_params()
+        self.assertEqual({'certificate': {'common_name': 'fakeco.biz'}}, json.loads(body))
+        self.assertEqual(body, cmd.get_params())
+        self.assertEqual('/services/v2/order/certificate/1234/duplicate', cmd.get_path())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+import calendar
+import unittest
+
+from ..inventory import OrderTable, DomainIndex
+from ..models import Order
+
+
+def _order(order_id, status, product='ssl_plus', valid_till=None, names=()):
+    order = {'id': order_id, 'status': status, 'product': {'name_id': product}}
+    if valid_till:
+        order['certificate'] = {'id': order_id * 10, 'common_name': names[0], 'dns_names': list(names),
+                                'valid_from': '2015-01-01', 'valid_till': valid_till}
+    return order
+
+
+class TestInventory(unittest.TestCase):
+    orders = [
+        _order(1, 'issued', valid_till='2016-02-01', names=('a.fakeco.biz', 'www.a.fakeco.biz')),
+        _order(2, 'issued', 'ssl_wildcard', valid_till='2017-06-01T00:00:00+00:00', names=('*.fakeco.biz',)),
+        _order(3, 'pending'),
+        _order(4, 'revoked', valid_till='2016-03-01', names=('b.fakeco.biz',)),
+        _order(5, 'issued', valid_till='2016-01-15', names=('c.fakeco.biz',)),
+    ]
+
+    def setUp(self):
+        self.table = OrderTable.from_orders(self.orders)
+
+    def test_from_view_all_response(self):
+        table = OrderTable.from_orders({'orders': self.orders})
+        self.assertEqual(list(self.table.order_ids), list(table.order_ids))
+        self.assertEqual(0, len(OrderTable.from_orders({'orders': []}).order_ids))
+        index = DomainIndex.from_orders({'orders': self.orders})
+        self.assertEqual(set([1, 2]), index.covering('a.fakeco.biz'))
+
+    def test_columns(self):
+        self.assertEqual(5, len(self.table))
+        self.assertEqual([1, 2, 3, 4, 5], list(self.table.order_ids))
+        self.assertEqual(calendar.timegm((2017, 6, 1, 0, 0, 0)), self.table.valid_till[1])
+        self.assertEqual(0, self.table.valid_till[2])
+        row = self.table.row(0)
+        self.assertEqual(('issued', 'ssl_plus', 10), (row['status'], row['product'], row['certificate_id']))
+        self.assertEqual(('a.fakeco.biz', ['www.a.fakeco.biz']), (row['common_name'], row['dns_names']))
+        self.assertEqual((None, []), (self.table.row(2)['common_name'], self.table.row(2)['dns_names']))
+
+    def test_filters(self):
+        issued = self.table.where('status', 'issued')
+        self.assertEqual([1, 2, 5], issued.ids())
+        expiring = issued & self.table.less('valid_till', '2016-03-01')
+        self.assertEqual([1, 5], expiring.ids())
+        self.assertEqual(2, len(expiring))
+        self.assertEqual([2], (issued & ~expiring).ids())
+        self.assertEqual([1, 3, 5], (expiring | self.table.where('status', 'pending')).ids())
+        self.assertEqual([1, 2, 4, 5], self.table.where('status', 'issued', 'revoked').ids())
+        self.assertEqual([1, 4], self.table.between('valid_till', '2016-02-01', '2016-03-02').ids())
+        self.assertEqual([2], self.table.greater('valid_till', '2016-03-01').ids())
+        self.assertEqual([], self.table.where('status', 'unknown').ids())
+        self.assertFalse(self.table.where('status', 'unknown'))
+
+    def test_count_by(self):
+        self.assertEqual({'issued': 3, 'pending': 1, 'revoked': 1}, self.table.count_by('status'))
+        issued = self.table.where('status', 'issued')
+        self.assertEqual({'ssl_plus': 2, 'ssl_wildcard': 1}, self.table.count_by('product', issued))
+        self.assertEqual({calendar.timegm((2015, 1, 1, 0, 0, 0)): 3}, self.table.count_by('valid_from', issued))
+        self.assertRaises(KeyError, self.table.count_by, 'common_name')
+
+    def test_models_and_empty_table(self):
+        table = OrderTable.from_orders(Order.from_dict(order) for order in self.orders)
+        self.assertEqual(self.table.row(0), table.row(0))
+        self.assertEqual([1, 5], (table.where('status', 'issued') & table.less('valid_till', '2016-03-01')).ids())
+        self.assertEqual([], OrderTable().where('status', 'issued').ids())
+        self.assertEqual({}, OrderTable().count_by('status'))
+
+
+class TestDomainIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = DomainIndex.from_orders(TestInventory.orders)
+
+    def test_covering(self):
+        self.assertEqual(set([1, 2]), self.index.covering('a.fakeco.biz'))
+        self.assertEqual(set([1]), self.index.covering('WWW.A.FakeCo.biz.'))
+        self.assertEqual(set([2, 4]), self.index.covering('b.fakeco.biz'))
+        self.assertEqual(set([2]), self.index.covering('zzz.fakeco.biz'))
+        self.assertEqual(set(), self.index.covering('fakeco.biz'))
+        self.assertEqual(set(), self.index.covering('x.www.fakeco.biz'))
+        self.assertEqual(set(), self.index.covering('other.biz'))
+
+    def test_under(self):
+        self.assertEqual(set([1, 2, 4, 5]), self.index.under('fakeco.biz'))
+        self.assertEqual(set([1]), self.index.under('a.fakeco.biz'))
+        self.assertEqual(set([1, 2, 4, 5]), self.index.under('biz'))
+        self.assertEqual(set(), self.index.under('other.biz'))
+
+    def test_insert_and_delete(self):
+        self.index.delete(4)
+        self.assertEqual(set([2]), self.index.covering('b.fakeco.biz'))
+        self.assertFalse(4 in self.index)
+        self.index.delete(4)
+        self.index.insert(_order(1, 'issued', valid_till='2017-02-01', names=('d.fakeco.biz',)))
+        self.assertEqual(set(), self.index.covering('www.a.fakeco.biz'))
+        self.assertEqual(set([1, 2]), self.index.covering('d.fakeco.biz'))
+        self.assertEqual(set(['d.fakeco.biz']), self.index.names(1))
+        for order_id in (1, 2, 5):
+            self.index.delete(order_id)
+        self.assertEqual(0, len(self.index))
+        self.assertEqual({}, self.index._root.children)
+
+    def test_models(self):
+        index = DomainIndex.from_orders(Order.from_dict(order) for order in TestInventory.orders)
+        self.assertEqual(set([2, 4]), index.covering('b.fakeco.biz'))
+        self.assertEqual(4, len(index))
+
+
+if __name__ == '__main__':
+    unittest.main()
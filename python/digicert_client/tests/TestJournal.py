@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+from ..journal import Journal, fingerprint, submit, submit_many, SUBMITTED, SKIPPED, IN_DOUBT, FAILED
+from ..pipeline import IssuancePipeline, INSTALLED
+from ..pipeline import FAILED as PIPELINE_FAILED
+from .TestPipeline import FakeServer, FakeOrder
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'journal.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def items(self, count):
+        return [('host%d' % i, {'common_name': 'host%d.example.com' % i}) for i in range(count)]
+
+    def test_fingerprint(self):
+        self.assertEqual(fingerprint('place', {'a': 1, 'b': [1, 2]}), fingerprint('place', {'b': [1, 2], 'a': 1}))
+        self.assertNotEqual(fingerprint('place', {'a': 1}), fingerprint('place', {'a': 2}))
+        self.assertNotEqual(fingerprint('place', {'a': 1}), fingerprint('create_duplicate', {'a': 1}))
+
+    def test_restart_skips_completed_items(self):
+        server = FakeServer()
+        with Journal(self.path) as journal:
+            results = list(submit_many(journal, lambda: FakeOrder(server), self.items(20), workers=4))
+        self.assertEqual(set([SUBMITTED]), set(r.status for r in results))
+        self.assertEqual(20, server.calls['place'])
+        order_ids = dict((r.key, r.order_id) for r in results)
+
+        again = FakeServer()
+        with Journal(self.path) as journal:
+            results = list(submit_many(journal, lambda: FakeOrder(again), self.items(25), workers=4))
+        self.assertEqual(5, again.calls['place'])
+        skipped = dict((r.key, r.order_id) for r in results if SKIPPED == r.status)
+        self.assertEqual(order_ids, skipped)
+
+    def test_changed_request_resubmitted(self):
+        server = FakeServer()
+        with Journal(self.path) as journal:
+            list(submit_many(journal, lambda: FakeOrder(server), self.items(2)))
+            changed = [('host0', {'common_name': 'host0.example.com', 'comments': 'renewal'})]
+            self.assertEqual([SUBMITTED], [r.status for r in submit_many(journal, lambda: FakeOrder(server), changed)])
+        self.assertEqual(3, server.calls['place'])
+
+    def test_in_doubt_and_failed(self):
+        def lost(params):
+            raise socket.error('connection reset')
+
+        def broken(params):
+            raise KeyError('csr')
+
+        with Journal(self.path) as journal:
+            self.assertEqual(IN_DOUBT, submit(journal, 'a', 'place', {}, lost).status)
+            self.assertEqual(FAILED, submit(journal, 'b', 'place', {}, broken).status)
+            rejected = submit(journal, 'c', 'place', {}, lambda p: {'status': 400, 'errors': [{'code': 'bad'}]})
+            self.assertEqual(FAILED, rejected.status)
+        with Journal(self.path) as journal:
+            self.assertEqual(['a'], journal.in_doubt())
+            calls = []
+            send = lambda params: calls.append(params) or {'id': 9}
+            self.assertEqual(IN_DOUBT, submit(journal, 'a', 'place', {}, send).status)
+            self.assertEqual((SUBMITTED, 9), (submit(journal, 'b', 'place', {}, send).status, journal.state('b')['order_id']))
+            self.assertEqual(SUBMITTED, submit(journal, 'c', 'place', {}, send).status)
+            self.assertEqual(2, len(calls))
+
+    def test_torn_record_cut_off(self):
+        with Journal(self.path) as journal:
+            submit(journal, 'a', 'place', {}, lambda p: {'id': 1, 'requests': [{'id': 2}]})
+        with open(self.path, 'a') as f:
+            f.write('{"op":"intent","key":"b"')
+        with Journal(self.path) as journal:
+            self.assertEqual(None, journal.state('b'))
+            self.assertEqual([2], journal.state('a')['request_ids'])
+            submit(journal, 'b', 'place', {}, lambda p: {'id': 3})
+        with Journal(self.path) as journal:
+            self.assertEqual(3, journal.state('b')['order_id'])
+        with open(self.path) as f:
+            self.assertEqual(4, len(f.readlines()))
+
+    def test_group_commit(self):
+        journal = Journal(self.path)
+        start = threading.Event()
+
+        def append(i):
+            start.wait()
+            for j in range(50):
+                journal.begin('k%d-%d' % (i, j), 'fp', 'place')
+
+        threads = [threading.Thread(target=append, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+        journal.close()
+        self.assertEqual(400, journal.stats['records'])
+        self.assertTrue(journal.stats['syncs'] <= 400)
+        self.assertEqual(400, len(Journal(self.path).in_doubt()))
+
+    def test_pipeline_with_journal(self):
+        server = FakeServer()
+        journal = Journal(self.path)
+        # host1's order was sent just before a crash, host0's was placed as order 5
+        submit(journal, 'host0.example.com', 'place', {'common_name': 'host0.example.com'}, lambda p: {'id': 5})
+        journal.begin('host1.example.com', fingerprint('place', {'common_name': 'host1.example.com'}), 'place')
+        server.orders[5] = 0
+        pipeline = IssuancePipeline(lambda: FakeOrder(server), out_dir=self.dir, journal=journal, poll_interval=0.01)
+        specs = [{'order': {'common_name': 'host%d.example.com' % i}} for i in range(3)]
+        results = dict((r.name, r) for r in pipeline.run(specs))
+        self.assertEqual((INSTALLED, 5), (results['host0.example.com'].stage, results['host0.example.com'].order_id))
+        self.assertEqual(PIPELINE_FAILED, results['host1.example.com'].stage)
+        self.assertEqual(INSTALLED, results['host2.example.com'].stage)
+        self.assertEqual(1, server.calls['place'])
+
+
+if __name__ == '__main__':
+    unittest.main()
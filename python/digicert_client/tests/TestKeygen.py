@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+from distutils.spawn import find_executable
+
+from . import MockConnection
+from .. import CertificateOrder
+from ..keygen import KeyGenerator, place_orders
+from ..validation import parse_csr, validate_order
+from .TestValidation import ORDER
+
+
+@unittest.skipUnless(find_executable('openssl'), 'openssl is not installed')
+class TestKeygen(unittest.TestCase):
+    def setUp(self):
+        self.key_dir = os.path.join(tempfile.mkdtemp(), 'keys')
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.key_dir))
+
+    def order(self, common_name, **kwargs):
+        order = dict(ORDER, common_name=common_name, **kwargs)
+        del order['csr']
+        return order
+
+    def test_generate_one(self):
+        generator = KeyGenerator(self.key_dir, key_size=2048)
+        generated = generator.generate_one(self.order('example.com', org_name='Example/Widgets, Inc.'))
+        self.assertEqual(0700, stat.S_IMODE(os.stat(self.key_dir).st_mode))
+        self.assertEqual(0600, stat.S_IMODE(os.stat(generated.key_path).st_mode))
+        self.assertTrue(os.path.basename(generated.key_path).startswith('example.com.'))
+        with open(generated.key_path) as f:
+            self.assertTrue('PRIVATE KEY' in f.read())
+        info = parse_csr(generated.csr)
+        self.assertEqual(('example.com', ('www.example.com',), 'rsa', 2048),
+                         (info.common_name, info.dns_names, info.key_type, info.key_size))
+        self.assertEqual(generated.csr, generated.order['csr'])
+        self.assertEqual([('csr', 'csr_san_mismatch')],
+                         [(e['field'], e['code']) for e in validate_order(dict(generated.order, sans=None))])
+        self.assertEqual([], validate_order(generated.order))
+
+    def test_ec_keys(self):
+        generator = KeyGenerator(self.key_dir, key_type='ec', curve='secp384r1')
+        generated = generator.generate_one(self.order('*.example.com', sans=None, certificate_type='wildcard'))
+        self.assertTrue('wildcard.example.com.' in generated.key_path)
+        info = parse_csr(generated.csr)
+        self.assertEqual(('*.example.com', 'ec', 'P-384'), (info.common_name, info.key_type, info.curve))
+        self.assertRaises(ValueError, KeyGenerator, self.key_dir, key_type='dsa')
+
+    def test_failures_reported(self):
+        generator = KeyGenerator(self.key_dir, key_type='ec', curve='no-such-curve')
+        results = list(generator.generate([self.order('a.example.com'), {}]))
+        self.assertEqual(2, len(results))
+        self.assertTrue(isinstance(results[0].error, (RuntimeError, KeyError)))
+        self.assertTrue(all(result.error is not None for result in results))
+        self.assertEqual([], os.listdir(self.key_dir))
+
+    def test_backpressure(self):
+        taken = []
+
+        def orders():
+            for i in range(10):
+                taken.append(i)
+                yield self.order('host%d.example.com' % i, sans=None, certificate_type='sslplus')
+
+        generator = KeyGenerator(self.key_dir, key_type='ec', workers=2, backlog=3)
+        results = generator.generate(orders())
+        first = next(results)
+        self.assertTrue(len(taken) <= 4)
+        rest = list(results)
+        self.assertEqual(['host%d.example.com' % i for i in range(10)],
+                         sorted((r.common_name for r in [first] + rest), key=lambda name: int(name[4:-12])))
+        self.assertEqual(10, len(set(r.key_path for r in [first] + rest)))
+
+    def test_place_orders_links_keys(self):
+        conn = MockConnection('localhost')
+        client = CertificateOrder(host='localhost', customer_api_key='abc123', customer_name='12345', conn=conn)
+        generator = KeyGenerator(self.key_dir, key_type='ec', workers=2)
+        orders = [self.order('host%d.example.com' % i, sans=None, certificate_type='sslplus') for i in range(3)]
+        results = list(place_orders(client, orders, generator))
+        self.assertEqual(3, len(results))
+        for generated, response in results:
+            self.assertEqual('OID-223344', generated.order_id)
+            self.assertEqual('OID-223344', response['id'])
+        manifest = generator.manifest()
+        self.assertEqual(sorted(g.key_path for g, r in results), sorted(entry['key_path'] for entry in manifest))
+        self.assertEqual(set(['OID-223344']), set(entry['order_id'] for entry in manifest))
+        self.assertEqual([], KeyGenerator(os.path.join(self.key_dir, 'other')).manifest())
+
+
+if __name__ == '__main__':
+    unittest.main()
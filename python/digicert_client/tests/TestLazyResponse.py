@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+import unittest
+
+from . import MockConnection
+from .. import CertificateOrder, LazyResponse
+from ..api.queries.v2 import ViewOrderDetailsQuery
+
+
+class TestLazyResponse(unittest.TestCase):
+    payload = {'id': 'OID-223344', 'status': 'issued', 'certificate': {'id': 990929, 'dns_names': ['fakeco.biz']}}
+    v2order = CertificateOrder(host='localhost',
+                               customer_api_key='abc123',
+                               lazy_responses=True,
+                               conn=MockConnection('localhost', responses={
+                                   '/services/v2/order/certificate/OID-223344': (200, 'OK', payload),
+                                   '/services/v2/order/certificate/OID-404': (404, 'Not Found', {'errors': []}),
+                               }))
+
+    def test_wraps_payload_without_copying(self):
+        payload = dict(self.payload)
+        query = ViewOrderDetailsQuery(customer_api_key='abc123', order_id='OID-223344')
+        response = query.process_response(200, 'OK', payload, lazy=True)
+        self.assertTrue(isinstance(response, LazyResponse))
+        self.assertTrue(response.payload is payload)
+        self.assertTrue(response['certificate'] is payload['certificate'])
+
+    def test_plain_dict_by_default(self):
+        query = ViewOrderDetailsQuery(customer_api_key='abc123', order_id='OID-223344')
+        response = query.process_response(200, 'OK', dict(self.payload))
+        self.assertEqual(dict, type(response))
+        self.assertEqual(dict(self.payload, http_status=200, http_reason='OK'), response)
+
+    def test_dict_compatible(self):
+        response = self.v2order.view(digicert_order_id='OID-223344')
+        expected = dict(self.payload, http_status=200, http_reason='OK')
+        self.assertEqual(200, response.http_status)
+        self.assertEqual('OK', response.http_reason)
+        self.assertEqual(200, response['http_status'])
+        self.assertEqual(990929, response['certificate']['id'])
+        self.assertEqual(expected, response)
+        self.assertEqual(response, expected)
+        self.assertEqual(expected, dict(response))
+        self.assertEqual(expected, response.to_dict())
+        self.assertEqual(len(expected), len(response))
+        self.assertEqual(sorted(expected.keys()), sorted(response.keys()))
+        self.assertEqual(sorted(expected.items()), sorted(response.items()))
+        self.assertTrue('http_reason' in response)
+        self.assertFalse('missing' in response)
+        self.assertEqual('default', response.get('missing', 'default'))
+        self.assertRaises(KeyError, lambda: response['missing'])
+
+    def test_assignment(self):
+        response = LazyResponse(200, 'OK', {'id': 1})
+        response['http_status'] = 201
+        response['comments'] = 'hi'
+        del response['id']
+        self.assertEqual(201, response.http_status)
+        self.assertEqual({'http_status': 201, 'http_reason': 'OK', 'comments': 'hi'}, response)
+
+    def test_error_response(self):
+        response = self.v2order.view(digicert_order_id='OID-404')
+        self.assertEqual(404, response.http_status)
+        self.assertEqual([], response['errors'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+import unittest
+
+from . import MockConnection
+from .. import CertificateOrder
+from ..models import Order, Certificate, Domain, DuplicateCertificate
+
+
+class TestModels(unittest.TestCase):
+    order = {
+        'id': 1001,
+        'status': u'issued',
+        'date_created': u'2016-01-05T17:05:26+00:00',
+        'validity_years': 1,
+        'product': {'name_id': u'ssl_plus', 'name': u'SSL Plus', 'type': u'ssl_certificate'},
+        'container': {'id': 5},
+        'certificate': {'id': 2002, 'common_name': u'fakeco.biz', 'dns_names': [u'fakeco.biz', u'www.fakeco.biz'],
+                        'valid_till': u'2017-01-05', 'signature_hash': u'sha256',
+                        'server_platform': {'id': -1, 'name': u'OTHER'}},
+        'organization': {'id': 564738, 'name': u'FakeCo', 'city': u'Nowhere', 'country': u'us',
+                         'container': {'id': 5}},
+        'unlisted': {'big': 'x' * 100},
+    }
+
+    def test_order_fields(self):
+        order = Order.from_dict(self.order)
+        self.assertEqual(1001, order.id)
+        self.assertEqual('issued', order.status)
+        self.assertTrue(isinstance(order.status, str))
+        self.assertEqual('ssl_plus', order.product_name_id)
+        self.assertEqual(5, order.container_id)
+        self.assertFalse(hasattr(order, '__dict__'))
+        self.assertFalse(hasattr(order, 'unlisted'))
+
+    def test_strings_are_interned(self):
+        first = Order.from_dict(self.order)
+        second = Order.from_dict(dict(self.order, status=u''.join([u'iss', u'ued'])))
+        self.assertTrue(first.status is second.status)
+        self.assertTrue(first.product_name is second.product_name)
+
+    def test_nested_objects_decoded_on_access(self):
+        order = Order.from_dict(self.order)
+        self.assertTrue(isinstance(order._certificate, str))
+        certificate = order.certificate
+        self.assertTrue(isinstance(certificate, Certificate))
+        self.assertTrue(certificate is order.certificate)
+        self.assertEqual(('fakeco.biz', 'www.fakeco.biz'), certificate.dns_names)
+        self.assertEqual('OTHER', certificate.server_platform_name)
+        self.assertEqual('FakeCo', order.organization.name)
+        self.assertEqual(5, order.organization.container_id)
+        self.assertEqual(None, Order.from_dict({'id': 1}).certificate)
+
+    def test_to_dict(self):
+        order = Order(id=1, status='pending', certificate=Certificate(id=2, dns_names=('a',)))
+        d = order.to_dict()
+        self.assertEqual('pending', d['status'])
+        self.assertEqual(['a'], d['certificate']['dns_names'])
+        self.assertEqual(order, Order(id=1, status='pending', certificate=Certificate(id=2, dns_names=('a',))))
+        self.assertNotEqual(order, Order(id=1))
+
+    def test_domain_and_duplicate(self):
+        domain = Domain.from_dict({'id': 3, 'name': u'fakeco.biz', 'organization': {'id': 564738}})
+        self.assertEqual(564738, domain.organization_id)
+        duplicate = DuplicateCertificate.from_dict({'sub_id': u'001', 'status': u'approved', 'common_name': u'x'})
+        self.assertEqual(('001', 'approved', 'x'), (duplicate.sub_id, duplicate.status, duplicate.common_name))
+        duplicate = DuplicateCertificate.from_dict({'id': 1, 'common_name': u'a.com', 'sub_id': u'001',
+                                                    'status': u'issued'})
+        d = duplicate.to_dict()
+        self.assertEqual((1, 'a.com', '001', 'issued'), (d['id'], d['common_name'], d['sub_id'], d['status']))
+        self.assertEqual(duplicate, DuplicateCertificate(id=1, common_name='a.com', sub_id='001', status='issued'))
+        self.assertNotEqual(duplicate, DuplicateCertificate.from_dict({'id': 2, 'common_name': u'b.com',
+                                                                       'sub_id': u'001', 'status': u'issued'}))
+
+    def order_with(self, responses, **kwargs):
+        return CertificateOrder(host='localhost', customer_api_key='abc123', models=True,
+                                conn=MockConnection('localhost', responses=responses), **kwargs)
+
+    def test_certificate_order_returns_models(self):
+        order = self.order_with({
+            '/services/v2/order/certificate/1001': (200, 'OK', self.order),
+            '/services/v2/order/certificate': (200, 'OK', {'orders': [self.order, {'id': 1002}]}),
+            '/services/v2/order/certificate/1001/duplicate': (200, 'OK', {'certificates': [{'sub_id': '001'}]}),
+        })
+        self.assertEqual('fakeco.biz', order.view(digicert_order_id=1001).certificate.common_name)
+        self.assertEqual([1001, 1002], [o.id for o in order.view_all()])
+        self.assertEqual([1001, 1002], [o.id for o in order.view_all(stream=True)])
+        self.assertEqual(['001'], [d.sub_id for d in order.list_duplicates(digicert_order_id=1001)])
+
+    def test_failures_and_lookups_are_not_models(self):
+        responses = {
+            '/services/v2/order/certificate/1001': (404, 'Not Found', {'errors': []}),
+            '/services/v2/user/me': (200, 'OK', {'id': '1', 'container': {'id': '987654'}}),
+            '/services/v2/organization?container_id=987654': (200, 'OK', {'organizations': [
+                {'id': '564738', 'name': 'FakeCo', 'address': '123 Nowhere Lane', 'city': 'Nowhere',
+                 'state': 'UT', 'zip': '12345', 'country': 'US'}]}),
+            '/services/v2/domain?container_id=987654': (200, 'OK', {'domains': [
+                {'id': '239487', 'name': 'fakeco.biz', 'organization': {'id': '564738'}}]}),
+            '/services/v2/order/certificate/ssl_plus': (201, 'Created', {'id': 'OID-223344'}),
+        }
+        order = self.order_with(responses)
+        self.assertEqual(404, order.view(digicert_order_id=1001)['http_status'])
+        response = order.place(common_name='fakeco.biz', certificate_type='sslplus', validity=1, csr='---CSR---',
+                               org_name='FakeCo', org_addr1='123 Nowhere Lane', org_city='Nowhere', org_state='UT',
+                               org_zip='12345', org_country='US')
+        self.assertEqual('OID-223344', response['id'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+import json
+import unittest
+from urlparse import parse_qs
+
+from ..api.commands import Command
+from ..api.commands.v1 import OrderCertificateCommand as OrderCertificateCommandV1
+from ..api.commands.v2 import OrderCertificateCommand as OrderCertificateCommandV2, OrderDuplicateCommand, \
+    UploadCSRCommand
+from ..api.params import compile_params
+from ..api.queries.v1 import ViewOrderDetailsQuery as ViewOrderDetailsQueryV1
+from ..api.queries.v2 import ViewOrderDetailsQuery
+
+
+class TestParams(unittest.TestCase):
+    order = {'certificate_type': 'sslplus', 'csr': '-----BEGIN CERTIFICATE REQUEST-----\nAB+/=\n', 'validity': '2',
+             'common_name': 'fakeco.biz', 'org_name': 'Fake Co', 'org_addr1': '123 Nowhere Lane',
+             'org_city': 'Nowhere', 'org_state': 'UT', 'org_zip': '12345', 'org_country': 'US',
+             'org_contact_firstname': 'William', 'org_contact_lastname': 'Billson',
+             'org_contact_email': 'bbillson@fakeco.biz', 'org_contact_telephone': '2345556789'}
+
+    def test_form_body(self):
+        cmd = OrderCertificateCommandV1(customer_api_key='abc', customer_name='12345', server_type='2',
+                                        sans=['a.fakeco.biz'], undeclared='x', **self.order)
+        body = cmd.get_params()
+        fields = dict((k, v[0]) for k, v in parse_qs(body).items())
+        expected = dict(self.order, server_type='2', sans="['a.fakeco.biz']", undeclared='x')
+        self.assertEqual(expected, fields)
+        self.assertTrue(body.startswith('certificate_type=sslplus&csr=-----BEGIN+CERTIFICATE+REQUEST-----%0AAB%2B%2F%3D'))
+        self.assertEqual(2, cmd.validity)
+
+    def test_json_body(self):
+        cmd = OrderCertificateCommandV2(customer_api_key='abc', organization_id='654321', **self.order)
+        body = json.loads(cmd.get_params())
+        self.assertEqual({'id': '654321'}, body['organization'])
+        self.assertEqual('fakeco.biz', body['certificate']['common_name'])
+        self.assertEqual(2, body['validity'])
+        self.assertFalse('_customer_api_key' in body)
+        self.assertEqual({'order_id': '1', 'csr': 'CSR'},
+                         json.loads(UploadCSRCommand(customer_api_key='abc', order_id='1', csr='CSR').get_params()))
+
+    def test_optional_fields_round_trip(self):
+        cmd = OrderCertificateCommandV2(customer_api_key='abc', organization_id='654321', dns_names=['a.fakeco.biz'],
+                                        renewal_of_order_id=42, comments='renewal', **self.order)
+        body = json.loads(cmd.get_params())
+        self.assertEqual(['a.fakeco.biz'], body['dns_names'])
+        self.assertEqual(42, body['renewal_of_order_id'])
+        self.assertEqual('renewal', body['comments'])
+        fields = parse_qs(OrderCertificateCommandV1(customer_api_key='abc', customer_name='12345',
+                                                    dns_names=['a.fakeco.biz'], **self.order).get_params())
+        self.assertEqual(["['a.fakeco.biz']"], fields['dns_names'])
+        duplicate = OrderDuplicateCommand(customer_api_key='abc', digicert_order_id=1, comments='hi',
+                                          certificate={'common_name': 'fakeco.biz'})
+        self.assertEqual({'certificate': {'common_name': 'fakeco.biz'}, 'comments': 'hi'},
+                         json.loads(duplicate.get_params()))
+
+    def test_queries(self):
+        self.assertEqual(None, ViewOrderDetailsQuery(customer_api_key='abc', order_id='1').get_params())
+        self.assertEqual('order_id=OID-1',
+                         ViewOrderDetailsQueryV1(customer_api_key='abc', customer_name='12345',
+                                                 order_id='OID-1').get_params())
+
+    def test_undeclared_actions_send_public_attributes(self):
+        body = Command(customer_api_key='abc', name='x y', count=2).get_params()
+        self.assertEqual({'name': ['x y'], 'count': ['2']}, parse_qs(body))
+
+    def test_cached_body(self):
+        cmd = UploadCSRCommand(customer_api_key='abc', order_id='1', csr='CSR', cache_params=True)
+        body = cmd.get_params()
+        cmd.csr = 'CHANGED'
+        self.assertTrue(body is cmd.get_params())
+        uncached = UploadCSRCommand(customer_api_key='abc', order_id='1', csr='CSR')
+        uncached.get_params()
+        uncached.csr = 'CHANGED'
+        self.assertTrue('CHANGED' in uncached.get_params())
+        self.assertFalse('cache_params' in uncached.get_params())
+
+    def test_unsupported_format(self):
+        self.assertRaises(ValueError, compile_params, ('a',), 'xml')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,6 +4,7 @@ import unittest
 import ssl
 
 from ..https import verify_peer
+from ..https.hostname import HostnameMatcher, LRUCache, match_hostname, _matchers, _results
 
 
 class TestPeerVerifier(unittest.TestCase):
@@ -152,5 +153,51 @@ class TestPeerVerifier(unittest.TestCase):
         except ssl.SSLError as e:
             self.fail(e)
 
+    def test_wildcard_dont_match_other_domain(self):
+        for host in ['www.example.org', 'www.other.com', 'login.example.org']:
+            self.assertRaises(ssl.SSLError, verify_peer, host, self.wildcard_cert_info)
+            self.assertRaises(ssl.SSLError, verify_peer, host, self.partial_wildcard_cert_info)
+
+    def test_common_name_ignored_with_sans(self):
+        cert_info = dict(self.wildcard_san_cert_info, subjectAltName=(('DNS', 'other.example.org'),))
+        self.assertRaises(ssl.SSLError, verify_peer, 'www.example.com', cert_info)
+
+    def test_subject_as_returned_by_getpeercert(self):
+        cert_info = {'subject': ((('organizationName', u'Example, Inc.'),), (('commonName', u'www.example.com'),))}
+        verify_peer('www.example.com', cert_info)
+        self.assertRaises(ssl.SSLError, verify_peer, 'example.com', cert_info)
+
+
+class TestHostnameMatcher(unittest.TestCase):
+    def test_rfc6125_rules(self):
+        matcher = HostnameMatcher(['WWW.Example.com', '*.wild.example.com', 'f*o.example.net', 'www.*.example.org',
+                                   '*', '*.*.example.biz', 'xn--*.example.info', '*.xn--bcher-kva.example'])
+        for host in ['www.example.com', 'www.EXAMPLE.com.', 'a.wild.example.com', 'foo.example.net',
+                     'fo.example.net', 'x.xn--bcher-kva.example']:
+            self.assertTrue(matcher.match(host), host)
+        for host in ['wild.example.com', 'a.b.wild.example.com', '.wild.example.com', 'bar.example.net',
+                     'www.a.example.org', 'localhost', 'a.b.example.biz', 'xn--abc.example.info', '']:
+            self.assertFalse(matcher.match(host), host)
+
+    def test_results_are_cached(self):
+        _matchers.clear()
+        _results.clear()
+        self.assertTrue(match_hostname('www.example.com', TestPeerVerifier.wildcard_cert_info, 'fp1'))
+        self.assertTrue(match_hostname('www.example.com', {}, 'fp1'))
+        self.assertFalse(match_hostname('example.com', {}, 'fp1'))
+        self.assertEqual(1, len(_matchers))
+        self.assertEqual(2, len(_results))
+
+    def test_lru_cache(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(1, cache.get('a'))
+        cache.put('c', 3)
+        self.assertEqual(None, cache.get('b'))
+        self.assertEqual((1, 3), (cache.get('a'), cache.get('c')))
+        self.assertEqual(2, len(cache))
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from . import MockConnection
+from .. import CertificateOrder
+from ..pipeline import IssuancePipeline, Checkpoint, Issuance, INSTALLED, FAILED, SUBMITTED
+from .TestValidation import ORDER
+
+CHAIN = {
+    'certificate': '-----BEGIN CERTIFICATE-----\r\nleaf\r\n-----END CERTIFICATE-----',
+    'intermediate': '-----BEGIN CERTIFICATE-----\r\nintermediate\r\n-----END CERTIFICATE-----',
+    'root': '-----BEGIN CERTIFICATE-----\r\nroot\r\n-----END CERTIFICATE-----',
+}
+
+
+class FakeServer(object):
+    """The orders placed, shared by the FakeOrder made for each worker."""
+
+    def __init__(self, polls_until_issued=1, reject=()):
+        self.polls_until_issued = polls_until_issued
+        self.reject = reject
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.orders = {}
+        self.next_id = 1000
+
+    def count(self, name):
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+
+class FakeOrder(object):
+    """CertificateOrder-like client of a FakeServer."""
+
+    def __init__(self, server):
+        self.server = server
+
+    def place(self, **kwargs):
+        self.server.count('place')
+        if kwargs['common_name'] in self.server.reject:
+            return {'status': 400, 'reason': 'Bad Request', 'response': {'errors': [{'code': 'invalid_csr'}]}}
+        with self.server.lock:
+            self.server.next_id += 1
+            order_id = self.server.next_id
+            self.server.orders[order_id] = 0
+        return {'id': order_id, 'requests': [{'id': order_id}]}
+
+    def view(self, digicert_order_id=None):
+        self.server.count('view')
+        with self.server.lock:
+            self.server.orders[digicert_order_id] += 1
+            polls = self.server.orders[digicert_order_id]
+        return {'id': digicert_order_id, 'status': 'issued' if polls >= self.server.polls_until_issued else 'pending'}
+
+    def download(self, digicert_order_id=None):
+        self.server.count('download')
+        return {'http_status': 200, 'certificates': CHAIN}
+
+    def create_duplicate(self, digicert_order_id=None, **kwargs):
+        self.server.count('create_duplicate')
+        return {'id': digicert_order_id, 'requests': [{'id': 5}]}
+
+    def list_duplicates(self, digicert_order_id=None):
+        self.server.count('list_duplicates')
+        return [{'sub_id': '001', 'status': 'approved', 'csr': 'other'},
+                {'sub_id': '002', 'status': 'approved', 'csr': 'duplicate\r\ncsr'},
+                {'sub_id': '9', 'status': 'pending'},
+                {'sub_id': '10', 'status': 'issued'}]
+
+    def download_duplicate(self, digicert_order_id=None, sub_id=None):
+        self.server.count('download_duplicate:%s' % sub_id)
+        return [CHAIN['certificate'] + '\r\n', CHAIN['intermediate'] + '\r\n']
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def pipeline(self, server, **kwargs):
+        kwargs.setdefault('poll_interval', 0.01)
+        return IssuancePipeline(lambda: FakeOrder(server), out_dir=self.dir, **kwargs)
+
+    @staticmethod
+    def orders(count):
+        return [{'order': {'common_name': 'host%d.example.com' % i}} for i in range(count)]
+
+    def test_issues_and_installs(self):
+        server = FakeServer(polls_until_issued=3)
+        results = list(self.pipeline(server).run(self.orders(20)))
+        self.assertEqual(20, len(results))
+        self.assertEqual(set([INSTALLED]), set(r.stage for r in results))
+        self.assertEqual({'place': 20, 'view': 60, 'download': 20}, server.calls)
+        with open(os.path.join(self.dir, 'host7.example.com.pem')) as f:
+            self.assertEqual('-----BEGIN CERTIFICATE-----\nleaf\n-----END CERTIFICATE-----\n'
+                             '-----BEGIN CERTIFICATE-----\nintermediate\n-----END CERTIFICATE-----\n'
+                             '-----BEGIN CERTIFICATE-----\nroot\n-----END CERTIFICATE-----\n', f.read())
+        self.assertEqual(20, len(os.listdir(self.dir)))
+
+    def test_failures(self):
+        server = FakeServer(polls_until_issued=100)
+        results = dict((r.name, r) for r in self.pipeline(server, max_polls=2).run(self.orders(2)))
+        self.assertEqual(set([FAILED]), set(r.stage for r in results.values()))
+        self.assertTrue('not issued after 2 polls' in str(results['host0.example.com'].error))
+        server = FakeServer(reject=('host1.example.com',))
+        results = dict((r.name, r) for r in self.pipeline(server).run(self.orders(2)))
+        self.assertEqual(INSTALLED, results['host0.example.com'].stage)
+        self.assertEqual(FAILED, results['host1.example.com'].stage)
+        self.assertTrue('Order not placed' in str(results['host1.example.com'].error))
+
+    def test_duplicates(self):
+        server = FakeServer()
+        specs = [{'name': 'node1', 'duplicate_of': 42, 'duplicate': {'certificate': {'csr': 'duplicate\ncsr'}}},
+                 {'name': 'node2', 'duplicate_of': 42, 'duplicate': {'certificate': {}}}]
+        installed = []
+        pipeline = self.pipeline(server, max_polls=5,
+                                 install=lambda issuance, chain: installed.append(chain) or issuance.name)
+        results = dict((r.name, r) for r in pipeline.run(specs))
+        self.assertEqual(('002', INSTALLED, 'node1'), (results['node1'].sub_id, results['node1'].stage,
+                                                      results['node1'].path))
+        self.assertEqual(('10', INSTALLED), (results['node2'].sub_id, results['node2'].stage))
+        self.assertEqual(1, server.calls['download_duplicate:002'])
+        self.assertEqual(['-----BEGIN CERTIFICATE-----\nleaf\n-----END CERTIFICATE-----\n'
+                          '-----BEGIN CERTIFICATE-----\nintermediate\n-----END CERTIFICATE-----\n'] * 2, installed)
+
+    def test_duplicate_waits_for_its_csr(self):
+        server = FakeServer()
+        listings = [[{'sub_id': '001', 'status': 'issued', 'csr': 'older\r\ncsr'}]] * 2
+        listings.append(listings[0] + [{'sub_id': '002', 'status': 'issued', 'csr': 'new\r\ncsr'}])
+
+        class ListingOrder(FakeOrder):
+            def list_duplicates(self, digicert_order_id=None):
+                self.server.count('list_duplicates')
+                return listings[min(self.server.calls['list_duplicates'], len(listings)) - 1]
+
+        pipeline = IssuancePipeline(lambda: ListingOrder(server), out_dir=self.dir, poll_interval=0.01, max_polls=5)
+        results = list(pipeline.run([{'name': 'node1', 'duplicate_of': 42,
+                                      'duplicate': {'certificate': {'csr': 'new\ncsr'}}}]))
+        self.assertEqual(('002', INSTALLED), (results[0].sub_id, results[0].stage))
+        self.assertEqual(3, server.calls['list_duplicates'])
+        self.assertFalse('download_duplicate:001' in server.calls)
+
+    def test_invalid_specs_reported(self):
+        server = FakeServer()
+        specs = [{'order': {'common_name': 'host0.example.com'}}, {'name': 'nothing'}, None,
+                 {'order': {'common_name': 'host1.example.com'}}]
+        results = list(self.pipeline(server).run(specs))
+        self.assertEqual(4, len(results))
+        failed = [r for r in results if FAILED == r.stage]
+        self.assertEqual(set(['nothing', None]), set(r.name for r in failed))
+        self.assertTrue(all(r.error is not None for r in failed))
+        self.assertEqual(2, server.calls['place'])
+
+    def test_resume_from_checkpoint(self):
+        path = os.path.join(self.dir, 'checkpoint.jsonl')
+        checkpoint = Checkpoint(path)
+        done = Issuance('host0.example.com')
+        done.stage, done.order_id, done.path = INSTALLED, 1, '/somewhere'
+        checkpoint.record(done)
+        submitted = Issuance('host1.example.com')
+        submitted.stage, submitted.order_id = SUBMITTED, 1001
+        checkpoint.record(submitted)
+        checkpoint.close()
+        with open(path, 'a') as f:
+            f.write('{"name": "host2.exa')
+        server = FakeServer()
+        server.orders[1001] = 0
+        server.next_id = 1001
+        results = dict((r.name, r) for r in self.pipeline(server, checkpoint=Checkpoint(path)).run(self.orders(3)))
+        self.assertEqual(set([INSTALLED]), set(r.stage for r in results.values()))
+        self.assertEqual('/somewhere', results['host0.example.com'].path)
+        self.assertEqual(1001, results['host1.example.com'].order_id)
+        self.assertEqual({'place': 1, 'view': 2, 'download': 2}, server.calls)
+        states = Checkpoint(path).load()
+        self.assertEqual(set([INSTALLED]), set(state['stage'] for state in states.values()))
+        again = FakeServer()
+        list(self.pipeline(again, checkpoint=Checkpoint(path)).run(self.orders(3)))
+        self.assertEqual({}, again.calls)
+
+    def test_backpressure(self):
+        taken = []
+        gate = threading.Event()
+
+        def specs():
+            for spec in self.orders(50):
+                taken.append(spec)
+                yield spec
+
+        def install(issuance, chain):
+            gate.wait()
+            return issuance.name
+
+        server = FakeServer()
+        results = self.pipeline(server, install=install, queue_size=2, submit_workers=1, poll_workers=1,
+                                download_workers=1).run(specs())
+        threading.Timer(0.2, gate.set).start()
+        first = next(results)
+        # install blocked: at most one item in each stage and two in each queue, plus one being fed
+        self.assertTrue(len(taken) <= 13, len(taken))
+        self.assertEqual(49, len(list(results)))
+        self.assertEqual(INSTALLED, first.stage)
+
+    def test_with_certificate_order(self):
+        details = {'order_id': 7, 'status': 'issued', 'common_name': 'example.com', 'product_name': 'SSL Plus'}
+        responses = {
+            '/clients/retail/api/?action=order_certificate': (
+                201, 'Created', {'response': {'result': 'success', 'return': {'order_id': 7}}}),
+            '/clients/retail/api/?action=order_view_details': (
+                200, 'OK', {'response': {'result': 'success', 'return': {'certificate_details': details}}}),
+            '/clients/retail/api/?action=retrieve_certificate': (
+                200, 'OK', {'response': {'result': 'success', 'return': {'certs': CHAIN}}}),
+        }
+        make_order = lambda: CertificateOrder('localhost', 'abc123', customer_name='12345',
+                                              conn=MockConnection('localhost', responses))
+        pipeline = IssuancePipeline(make_order, out_dir=self.dir, poll_interval=0.01)
+        results = list(pipeline.run([{'order': dict(ORDER, common_name='example.com')}]))
+        self.assertEqual([(INSTALLED, 7)], [(r.stage, r.order_id) for r in results])
+        with open(results[0].path) as f:
+            self.assertEqual(3, f.read().count('BEGIN CERTIFICATE'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+import unittest
+
+from . import MockConnection
+from .. import CertificateOrder
+
+
+class TestPlaceTrace(unittest.TestCase):
+    me_response = (200, 'OK', {'id': '102938', 'container': {'id': '987654'}},)
+    my_org_response = (200, 'OK', {
+        'organizations':
+        [{
+            'id': '564738',
+            'name': 'FakeCo',
+            'address': '123 Nowhere Lane',
+            'zip': '12345',
+            'city': 'Nowhere',
+            'state': 'UT',
+            'country': 'US',
+        }, ],
+    }, )
+    my_domain_response = (200, 'OK', {
+        'domains':
+        [{
+            'id': '239487',
+            'name': 'fakeco.biz',
+            'organization': {'id': '564738'},
+        }, ],
+    }, )
+    v2_order_created_response = (201, 'Created', {'id': 'OID-223344', 'requests': {'id': '288382'}},)
+    responses = {
+        '/services/v2/user/me': me_response,
+        '/services/v2/organization?container_id=987654': my_org_response,
+        '/services/v2/domain?container_id=987654': my_domain_response,
+        '/services/v2/order/certificate/ssl_plus': v2_order_created_response,
+    }
+    order = {
+        'common_name': 'fakeco.biz',
+        'certificate_type': 'sslplus',
+        'validity': 1,
+        'org_name': 'FakeCo',
+        'org_addr1': '123 Nowhere Lane',
+        'org_city': 'Nowhere',
+        'org_state': 'UT',
+        'org_zip': '12345',
+        'org_country': 'US',
+        'org_contact_firstname': 'William',
+        'org_contact_lastname': 'Billson',
+        'org_contact_email': 'bbillson@fakeco.biz',
+        'org_contact_telephone': '2345556789',
+        'csr': '---CSR---',
+    }
+
+    def setUp(self):
+        self.traces = []
+
+    def get_order(self, lookup_ttl=0):
+        return CertificateOrder(host='localhost',
+                                customer_api_key='abc123',
+                                conn=MockConnection('localhost', responses=self.responses),
+                                trace_hook=self.traces.append,
+                                lookup_ttl=lookup_ttl)
+
+    def test_place_records_each_step(self):
+        response = self.get_order().place(**self.order)
+        self.assertEqual('OID-223344', response['id'])
+        self.assertEqual(1, len(self.traces))
+        trace = self.traces[0]
+        self.assertEqual('place', trace.operation)
+        self.assertEqual(['MyUserQuery', 'OrganizationByContainerIdQuery', 'DomainByContainerIdQuery',
+                          'OrderCertificateCommand'], [step['action'] for step in trace.steps])
+        self.assertEqual([200, 200, 200, 201], [step['status'] for step in trace.steps])
+        self.assertEqual([None, 1, 1, None], [step['items'] for step in trace.steps])
+        self.assertEqual(['miss'] * 4, [step['cache'] for step in trace.steps])
+        for step in trace.steps:
+            self.assertTrue(step['response_bytes'] > 0)
+            self.assertTrue(step['elapsed'] >= 0)
+        self.assertTrue(trace.steps[3]['request_bytes'] > 0)
+
+    def test_place_reports_cached_lookups(self):
+        order = self.get_order(lookup_ttl=60)
+        order.place(**self.order)
+        order.place(**self.order)
+        self.assertEqual(['miss'] * 4, [step['cache'] for step in self.traces[0].steps])
+        self.assertEqual(['hit', 'hit', 'hit', 'miss'], [step['cache'] for step in self.traces[1].steps])
+        self.assertEqual(self.traces[0].steps[1]['response_bytes'], self.traces[1].steps[1]['response_bytes'])
+
+    def test_trace_delivered_when_no_matching_organization(self):
+        d = dict(self.order)
+        d['org_name'] = 'Another Co'
+        response = self.get_order().place(**d)
+        self.assertEqual(404, response['status'])
+        self.assertEqual(2, len(self.traces[0].steps))
+
+    def test_no_trace_without_hook(self):
+        order = CertificateOrder(host='localhost',
+                                 customer_api_key='abc123',
+                                 conn=MockConnection('localhost', responses=self.responses))
+        self.assertEqual('OID-223344', order.place(**self.order)['id'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+
+import os
+import resource
+import socket
+import unittest
+from httplib import BadStatusLine
+
+from ..https.pool import ConnectionPool, _split_address
+
+
+class FakeResponse(object):
+    def __init__(self, will_close=False):
+        self.will_close = will_close
+        self.read_all = False
+
+    def isclosed(self):
+        return self.read_all
+
+    def read(self):
+        self.read_all = True
+        return '{}'
+
+
+class FakeConnection(object):
+    created = []
+    fail_new = None
+
+    def __init__(self, host, port, **kwargs):
+        self.host = host
+        self.port = port
+        self.kwargs = kwargs
+        self.tunnel = None
+        self.sock = None
+        self.closed = False
+        self.requests = []
+        self.will_close = False
+        self.fail_request = None
+        self.fail_response = None
+        self.timings = None
+        FakeConnection.created.append(self)
+
+    def set_tunnel(self, host, port=None, headers=None):
+        self.tunnel = (host, port, headers)
+
+    def request(self, method, url, body=None, headers={}):
+        if self.fail_request is not None:
+            raise self.fail_request
+        if self.sock is None:
+            if FakeConnection.fail_new is not None:
+                raise FakeConnection.fail_new
+            self.sock, self.peer = socket.socketpair()
+            self.timings = {'connect': 0.5, 'tunnel': 0.25 if self.tunnel else None, 'handshake': 1.0}
+        self.requests.append((method, url, body, headers))
+
+    def getresponse(self):
+        if self.fail_response is not None:
+            raise self.fail_response
+        return FakeResponse(self.will_close)
+
+    def close(self):
+        self.closed = True
+        if self.sock is not None:
+            self.sock.close()
+            self.peer.close()
+            self.sock = None
+
+
+class TestPool(unittest.TestCase):
+    def setUp(self):
+        FakeConnection.created = []
+        FakeConnection.fail_new = None
+        self.pool = ConnectionPool(connection_class=FakeConnection, ca_file='roots.pem')
+
+    def roundtrip(self, conn, read=True):
+        conn.request('GET', '/order')
+        response = conn.getresponse()
+        if read:
+            response.read()
+        conn.close()
+        return response
+
+    def test_connection_reused(self):
+        conn = self.pool.connection('api.fakeco.biz', 443)
+        self.roundtrip(conn)
+        self.roundtrip(conn)
+        self.roundtrip(self.pool.connection('api.fakeco.biz', 443))
+        self.assertEqual(1, len(FakeConnection.created))
+        self.assertEqual({'ca_file': 'roots.pem'}, FakeConnection.created[0].kwargs)
+        self.assertEqual(3, len(FakeConnection.created[0].requests))
+        self.assertEqual(1, self.pool.stats['opened'])
+        self.assertEqual(2, self.pool.stats['reused'])
+        self.roundtrip(self.pool.connection('api.fakeco.biz', 8443))
+        self.assertEqual(2, len(FakeConnection.created))
+
+    def test_tunnel_through_proxy(self):
+        conn = self.pool.connection('api.fakeco.biz', 443, proxy='proxy.fakeco.biz:3128', proxy_auth=('user', 'pw'))
+        self.roundtrip(conn)
+        self.roundtrip(conn)
+        self.roundtrip(self.pool.connection('api.fakeco.biz', 443, proxy=('proxy.fakeco.biz', 3128),
+                                            proxy_auth=('user', 'pw')))
+        self.assertEqual(1, len(FakeConnection.created))
+        created = FakeConnection.created[0]
+        self.assertEqual(('proxy.fakeco.biz', 3128), (created.host, created.port))
+        self.assertEqual(('api.fakeco.biz', 443, {'Proxy-Authorization': 'Basic dXNlcjpwdw=='}), created.tunnel)
+        self.assertEqual(1, self.pool.stats['tunnels'])
+        self.assertEqual(0.25, self.pool.stats['tunnel_time'])
+        self.assertEqual(1.0, self.pool.stats['handshake_time'])
+        self.roundtrip(self.pool.connection('api.fakeco.biz', 443))
+        self.assertEqual(2, len(FakeConnection.created))
+        self.assertEqual(None, FakeConnection.created[1].tunnel)
+        self.assertEqual(('proxy.fakeco.biz', 8080), _split_address('proxy.fakeco.biz', 8080))
+
+    def test_proxy_header_built_once(self):
+        headers = self.pool._proxy_headers_for(('proxy.fakeco.biz', 3128), ('user', 'pw'))
+        self.assertTrue(headers is self.pool._proxy_headers_for(('proxy.fakeco.biz', 3128), ('user', 'pw')))
+        self.assertEqual({}, self.pool._proxy_headers_for(('proxy.fakeco.biz', 3128), None))
+
+    def test_unread_or_closing_responses_not_kept(self):
+        conn = self.pool.connection('api.fakeco.biz', 443)
+        self.roundtrip(conn, read=False)
+        self.assertTrue(FakeConnection.created[0].closed)
+        self.roundtrip(conn)
+        FakeConnection.created[1].will_close = True
+        self.roundtrip(conn)
+        self.assertTrue(FakeConnection.created[1].closed)
+        self.roundtrip(conn)
+        self.assertEqual(3, len(FakeConnection.created))
+
+    def test_idle_limits(self):
+        self.pool.max_idle = 1
+        first, second = self.pool.connection('api.fakeco.biz'), self.pool.connection('api.fakeco.biz')
+        first.request('GET', '/order')
+        second.request('GET', '/order')
+        first.getresponse().read()
+        second.getresponse().read()
+        first.close()
+        second.close()
+        self.assertEqual(1, self.pool.stats['discarded'])
+        self.assertTrue(FakeConnection.created[1].closed)
+        self.pool.idle_timeout = -1
+        self.roundtrip(first)
+        self.assertEqual(2, self.pool.stats['discarded'])
+        self.assertTrue(FakeConnection.created[0].closed)
+        self.pool.clear()
+        self.assertTrue(FakeConnection.created[2].closed)
+
+    def test_stale_connection_retried(self):
+        conn = self.pool.connection('api.fakeco.biz', 443)
+        self.roundtrip(conn)
+        FakeConnection.created[0].fail_request = socket.error(32, 'Broken pipe')
+        self.roundtrip(conn)
+        self.assertTrue(FakeConnection.created[0].closed)
+        FakeConnection.created[1].fail_response = BadStatusLine('')
+        self.roundtrip(conn)
+        self.assertEqual(3, len(FakeConnection.created))
+        self.assertEqual(3, self.pool.stats['opened'])
+
+    def test_failed_post_not_retried(self):
+        conn = self.pool.connection('api.fakeco.biz', 443)
+        self.roundtrip(conn)
+        FakeConnection.created[0].fail_request = socket.error(104, 'Connection reset by peer')
+        self.assertRaises(socket.error, conn.request, 'POST', '/order', '{}')
+        self.assertTrue(FakeConnection.created[0].closed)
+        self.roundtrip(conn)
+        FakeConnection.created[1].fail_response = socket.timeout('timed out')
+        conn.request('POST', '/order', '{}')
+        self.assertRaises(socket.timeout, conn.getresponse)
+        conn.close()
+        self.assertTrue(FakeConnection.created[1].closed)
+        self.assertEqual(2, len(FakeConnection.created))
+        self.assertEqual([('POST', '/order', '{}', {})], FakeConnection.created[1].requests[1:])
+
+    def test_closed_by_server_while_idle(self):
+        conn = self.pool.connection('api.fakeco.biz', 443)
+        self.roundtrip(conn)
+        FakeConnection.created[0].peer.close()
+        self.roundtrip(conn)
+        self.assertEqual(2, len(FakeConnection.created))
+        self.assertEqual(1, self.pool.stats['discarded'])
+        self.assertEqual(0, self.pool.stats['reused'])
+
+    def test_high_descriptors_reused(self):
+        if resource.getrlimit(resource.RLIMIT_NOFILE)[0] < 1100:
+            self.skipTest('needs more than 1024 file descriptors')
+        held = []
+        try:
+            while not held or held[-1] < 1024:
+                held.append(os.open(os.devnull, os.O_RDONLY))
+            conn = self.pool.connection('api.fakeco.biz', 443)
+            self.roundtrip(conn)
+            self.assertTrue(FakeConnection.created[0].sock.fileno() >= 1024)
+            self.roundtrip(conn)
+            self.assertEqual((1, 1, 0), (len(FakeConnection.created), self.pool.stats['reused'],
+                                         self.pool.stats['discarded']))
+            self.pool.clear()
+        finally:
+            for fd in held:
+                os.close(fd)
+
+    def test_new_connection_errors_raised(self):
+        FakeConnection.fail_new = socket.error(111, 'Connection refused')
+        self.assertRaises(socket.error, self.roundtrip, self.pool.connection('api.fakeco.biz', 443))
+        self.assertEqual(0, self.pool.stats['opened'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from timeit import default_timer
+
+from . import MockConnection
+from .. import CertificateOrder
+from ..https.replay import Cassette, RecordingConnection, ReplayConnection, redact_body, REDACTED
+
+
+class TestReplay(unittest.TestCase):
+    v2_view_order_response = (200, 'OK', {'id': 'OID-223344', 'status': 'issued',
+                                          'certificate': {'id': 990929, 'common_name': 'fakeco.biz'}})
+    v2_duplicate_created_response = (201, 'Created', {'id': 'OID-223344', 'requests': [{'id': '288382'}]})
+    responses = {
+        '/services/v2/order/certificate/OID-223344': v2_view_order_response,
+        '/services/v2/order/certificate/OID-223344/duplicate': v2_duplicate_created_response,
+    }
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def record(self, cassette):
+        conn = RecordingConnection(MockConnection('localhost', responses=self.responses), cassette)
+        order = CertificateOrder(host='localhost', customer_api_key='abc123', conn=conn)
+        order.view(digicert_order_id='OID-223344')
+        order.create_duplicate(digicert_order_id='OID-223344',
+                               certificate={'common_name': 'fakeco.biz', 'csr': '---CSR---'})
+        return order
+
+    def test_record_and_replay(self):
+        path = os.path.join(self.dir, 'cassette.jsonl.gz')
+        cassette = Cassette.create(path)
+        self.record(cassette)
+        cassette.close()
+
+        replayed = Cassette.load(path)
+        self.assertEqual(2, len(replayed.exchanges))
+        self.assertEqual(['GET', 'POST'], [exchange['m'] for exchange in replayed.exchanges])
+        order = CertificateOrder(host='localhost', customer_api_key='abc123', conn=ReplayConnection(replayed))
+        for _ in range(2):
+            response = order.view(digicert_order_id='OID-223344')
+            self.assertEqual(200, response['http_status'])
+            self.assertEqual(990929, response['certificate']['id'])
+
+    def test_unrecorded_request_fails(self):
+        cassette = Cassette()
+        self.record(cassette)
+        order = CertificateOrder(host='localhost', customer_api_key='abc123', conn=ReplayConnection(cassette))
+        self.assertRaises(RuntimeError, order.view, digicert_order_id='OID-998877')
+
+    def test_secrets_are_not_recorded(self):
+        path = os.path.join(self.dir, 'cassette.jsonl')
+        cassette = Cassette()
+        self.record(cassette)
+        cassette.save(path)
+        with open(path) as f:
+            contents = f.read()
+        self.assertEqual(-1, contents.find('abc123'))
+        self.assertEqual(-1, contents.find('X-DC-DEVKEY'))
+
+    def test_redact_body(self):
+        self.assertEqual('customer_api_key=%s&order_id=1' % REDACTED,
+                         redact_body('customer_api_key=abc123&order_id=1'))
+        self.assertEqual({'_customer_api_key': REDACTED, 'certificate': {'csr': '---CSR---'}},
+                         json.loads(redact_body(json.dumps({'_customer_api_key': 'abc123',
+                                                            'certificate': {'csr': '---CSR---'}}))))
+
+    def test_replay_with_recorded_timing(self):
+        cassette = Cassette()
+        self.record(cassette)
+        cassette.exchanges[0]['d'] = 0.05
+        order = CertificateOrder(host='localhost', customer_api_key='abc123',
+                                 conn=ReplayConnection(cassette, timing=True, speed=2.0))
+        started = default_timer()
+        order.view(digicert_order_id='OID-223344')
+        self.assertTrue(default_timer() - started >= 0.025)
+
+    def test_binary_bodies_round_trip(self):
+        path = os.path.join(self.dir, 'cassette.jsonl')
+        cassette = Cassette()
+        cassette.record(0.0, 0.0, 'GET', '/zip', None, {}, 200, 'OK', {'content-type': 'application/zip'},
+                        'PK\x03\x04\xff\xfe')
+        cassette.save(path)
+        rsp = ReplayConnection(Cassette.load(path))
+        rsp.request('GET', '/zip')
+        response = rsp.getresponse()
+        self.assertEqual('PK\x03\x04\xff\xfe', response.read())
+        self.assertEqual('application/zip', response.getheader('Content-Type'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+import os
+import resource
+import socket
+import unittest
+
+from ..https.resolver import Resolver
+
+
+def _info(host, port, family=socket.AF_INET):
+    return family, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', (host, port)
+
+
+class TestResolver(unittest.TestCase):
+    def setUp(self):
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(5)
+        self.port = self.listener.getsockname()[1]
+        closed = socket.socket()
+        closed.bind(('127.0.0.1', 0))
+        self.closed_port = closed.getsockname()[1]
+        closed.close()
+        self.lookups = []
+        self.addresses = [_info('127.0.0.1', self.closed_port), _info('127.0.0.1', self.port)]
+
+    def tearDown(self):
+        self.listener.close()
+
+    def getaddrinfo(self, host, port, family, socktype):
+        self.lookups.append((host, port))
+        if host == 'unresolvable':
+            raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+        return self.addresses
+
+    def test_resolutions_cached(self):
+        resolver = Resolver(getaddrinfo=self.getaddrinfo)
+        resolver.resolve('api.fakeco.biz', 443)
+        resolver.resolve('api.fakeco.biz', 443)
+        resolver.resolve('api.fakeco.biz', 8443)
+        self.assertEqual([('api.fakeco.biz', 443), ('api.fakeco.biz', 8443)], self.lookups)
+        Resolver(ttl=0, getaddrinfo=self.getaddrinfo).resolve('api.fakeco.biz', 443)
+        self.assertEqual(3, len(self.lookups))
+
+    def test_expired_entry_used_when_resolution_fails(self):
+        resolver = Resolver(ttl=-1, getaddrinfo=self.getaddrinfo)
+        resolver.resolve('api.fakeco.biz', 443)
+        resolver._addresses[('unresolvable', 443)] = resolver._addresses[('api.fakeco.biz', 443)]
+        self.assertEqual(self.addresses, resolver.resolve('unresolvable', 443))
+        self.assertRaises(socket.gaierror, resolver.resolve, 'unresolvable', 80)
+
+    def test_failed_address_skipped(self):
+        resolver = Resolver(getaddrinfo=self.getaddrinfo)
+        sock = resolver.create_connection(('api.fakeco.biz', 443), timeout=5)
+        self.assertEqual(self.port, sock.getpeername()[1])
+        self.assertEqual(5, sock.gettimeout())
+        sock.close()
+        self.assertTrue(resolver.recently_failed(('127.0.0.1', self.closed_port)))
+        self.assertEqual(self.port, resolver._ordered(self.addresses)[0][4][1])
+        resolver.failure_ttl = 0
+        resolver.mark_failed(('127.0.0.1', self.port))
+        self.assertFalse(resolver.recently_failed(('127.0.0.1', self.port)))
+
+    def test_high_descriptors(self):
+        if resource.getrlimit(resource.RLIMIT_NOFILE)[0] < 1100:
+            self.skipTest('needs more than 1024 file descriptors')
+        held = []
+        try:
+            while not held or held[-1] < 1024:
+                held.append(os.open(os.devnull, os.O_RDONLY))
+            sock = Resolver(getaddrinfo=self.getaddrinfo).create_connection(('api.fakeco.biz', 443), timeout=5)
+            self.assertTrue(sock.fileno() >= 1024)
+            self.assertEqual(self.port, sock.getpeername()[1])
+            sock.close()
+        finally:
+            for fd in held:
+                os.close(fd)
+
+    def test_all_addresses_fail(self):
+        self.addresses = [_info('127.0.0.1', self.closed_port)]
+        resolver = Resolver(getaddrinfo=self.getaddrinfo)
+        self.assertRaises(socket.error, resolver.create_connection, ('api.fakeco.biz', 443))
+        self.addresses = []
+        self.assertRaises(socket.error, Resolver(getaddrinfo=self.getaddrinfo).create_connection,
+                          ('api.fakeco.biz', 443))
+
+    def test_families_interleaved(self):
+        infos = [_info('::1', 1, socket.AF_INET6), _info('::2', 1, socket.AF_INET6),
+                 _info('10.0.0.1', 1), _info('10.0.0.2', 1)]
+        resolver = Resolver()
+        self.assertEqual(['::1', '10.0.0.1', '::2', '10.0.0.2'], [info[4][0] for info in resolver._ordered(infos)])
+        resolver.mark_failed(('::1', 1))
+        self.assertEqual(['10.0.0.1', '::2', '10.0.0.2', '::1'], [info[4][0] for info in resolver._ordered(infos)])
+
+
+if __name__ == '__main__':
+    unittest.main()
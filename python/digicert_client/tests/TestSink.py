@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+import hashlib
+import json
+import unittest
+import zlib
+from StringIO import StringIO
+
+from . import MockConnection, MockResponse
+from .. import CertificateOrder
+from ..api import Request
+from ..api.queries.v2 import ViewOrdersQuery
+
+
+class SizedResponse(MockResponse):
+    """MockResponse with readinto() and the response headers given."""
+
+    def __init__(self, status, reason, payload, headers=None):
+        MockResponse.__init__(self, status, reason, payload)
+        self.headers = headers or {}
+        self.readinto_calls = 0
+
+    def readinto(self, b):
+        self.readinto_calls += 1
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name.lower(), MockResponse.getheader(self, name, default))
+
+
+class SizedConnection(MockConnection):
+    response_headers = None
+    encoding = None
+    last = None
+
+    def getresponse(self):
+        status, reason, payload = self.responses[self.path]
+        response = SizedResponse(status, reason, payload, dict(self.response_headers or {}))
+        if self.encoding is not None:
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            response.body = compressor.compress(response.body) + compressor.flush()
+            response.headers['content-encoding'] = self.encoding
+        self.last = response
+        return response
+
+    def close(self):
+        self.closed = getattr(self, 'closed', 0) + 1
+
+
+class TestSink(unittest.TestCase):
+    orders = [{'id': i, 'status': 'issued', 'certificate': {'common_name': 'host%d.fakeco.biz' % i}}
+              for i in range(200)]
+    body = json.dumps({'orders': orders})
+
+    def request(self, status=200, max_body_size=None, **conn_attributes):
+        conn = SizedConnection('localhost', responses={
+            '/services/v2/order/certificate': (status, 'OK', {'orders': self.orders}),
+        })
+        for name, value in conn_attributes.items():
+            setattr(conn, name, value)
+        return Request(action=ViewOrdersQuery(customer_api_key='abc123'), host='localhost', conn=conn,
+                       max_body_size=max_body_size), conn
+
+    def test_sinks(self):
+        f = StringIO()
+        request, conn = self.request()
+        self.assertEqual(len(self.body), request.send_to(f, chunk_size=100))
+        self.assertEqual(self.body, f.getvalue())
+        self.assertEqual(len(self.body), request.response_bytes)
+        digest = hashlib.sha256()
+        self.request()[0].send_to(digest)
+        self.assertEqual(hashlib.sha256(self.body).hexdigest(), digest.hexdigest())
+        chunks = []
+        self.request()[0].send_to(lambda chunk: chunks.append(str(chunk)), chunk_size=1000)
+        self.assertEqual(self.body, ''.join(chunks))
+        self.assertTrue(max(len(chunk) for chunk in chunks) <= 1000)
+        self.assertRaises(TypeError, self.request()[0].send_to, object())
+
+    def test_buffer_reused(self):
+        buf = bytearray(512)
+        f = StringIO()
+        request, conn = self.request()
+        request.send_to(f, buf=buf)
+        self.assertEqual(self.body, f.getvalue())
+        self.assertEqual(len(self.body) / 512 + 2, conn.last.readinto_calls)
+        request.send_to(f, buf=buf)
+        self.assertEqual(self.body * 2, f.getvalue())
+
+    def test_compressed_body_written_decompressed(self):
+        f = StringIO()
+        request, conn = self.request(encoding='gzip')
+        self.assertEqual(len(self.body), request.send_to(f, buf=bytearray(64)))
+        self.assertEqual(self.body, f.getvalue())
+        self.assertTrue(request.response_bytes < len(self.body) / 4)
+
+    def test_failure_not_written(self):
+        f = StringIO()
+        request, conn = self.request(status=404)
+        self.assertRaises(RuntimeError, request.send_to, f)
+        self.assertEqual('', f.getvalue())
+
+    def test_max_body_size(self):
+        limit = len(self.body) - 1
+        self.assertRaises(RuntimeError, self.request(max_body_size=limit)[0].send_to, StringIO())
+        self.assertRaises(RuntimeError, self.request(max_body_size=limit)[0].send)
+        self.assertRaises(RuntimeError, list, self.request(max_body_size=limit)[0].iter_items(chunk_size=100))
+        self.assertRaises(RuntimeError, self.request(max_body_size=limit, encoding='gzip')[0].send)
+        self.assertRaises(RuntimeError, list, self.request(max_body_size=limit, encoding='gzip')[0].iter_items())
+        request, conn = self.request(max_body_size=limit)
+        self.assertRaises(RuntimeError, request.send)
+        self.assertEqual(1, conn.closed)
+        self.assertEqual(self.orders, self.request(max_body_size=len(self.body))[0].send()['orders'])
+        self.assertEqual(self.orders, list(self.request(max_body_size=len(self.body))[0].iter_items()))
+
+    def test_declared_length_checked_before_reading(self):
+        request, conn = self.request(max_body_size=100, response_headers={'content-length': str(len(self.body))})
+        self.assertRaises(RuntimeError, request.send_to, StringIO())
+        self.assertEqual(0, conn.last.offset)
+
+    def test_download_to_sink(self):
+        pem = 'x' * 5000
+        conn = SizedConnection('localhost', responses={
+            '/services/v2/certificate/123/download/format/pem_all': (200, 'OK', pem),
+        })
+        order = CertificateOrder(host='localhost', customer_api_key='abc123', conn=conn)
+        f = StringIO()
+        self.assertEqual(len(json.dumps(pem)), order.download(digicert_certificate_id='123', sink=f))
+        self.assertEqual(json.dumps(pem), f.getvalue())
+        order = CertificateOrder(host='localhost', customer_api_key='abc123', conn=conn, max_body_size=1000)
+        self.assertRaises(RuntimeError, order.download, digicert_certificate_id='123', sink=StringIO())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+import json
+import unittest
+from StringIO import StringIO
+
+from . import MockConnection
+from .. import CertificateOrder
+from ..api.stream import iter_array_items
+
+
+class TestStream(unittest.TestCase):
+    orders = [
+        {'id': 1, 'status': 'issued', 'certificate': {'common_name': 'a.fakeco.biz', 'dns_names': ['[', '{']}},
+        {'id': 2, 'status': 'pending', 'certificate': {'common_name': 'b "quoted" \\ name'}},
+        {'id': 3, 'status': 'issued', 'product': {'name': u'SSL Plus \u2713'}},
+    ]
+    body = json.dumps({'page': {'total': 3, 'data': [9, 9]}, 'orders': orders, 'after': {'orders': []}})
+
+    def items(self, body, key='orders', chunk_size=7):
+        return list(iter_array_items(StringIO(body).read, key, chunk_size))
+
+    def test_yields_array_elements(self):
+        for chunk_size in (1, 2, 7, 64, 1 << 16):
+            self.assertEqual(self.orders, self.items(self.body, chunk_size=chunk_size))
+
+    def test_scalar_elements(self):
+        self.assertEqual([123456, -1.5, None, True, 'x'],
+                         self.items('{"orders": [123456, -1.5e0, null, true, "x"]}', chunk_size=1))
+
+    def test_empty_and_missing_arrays(self):
+        self.assertEqual([], self.items('{"orders": []}'))
+        self.assertEqual([], self.items('{}'))
+        self.assertEqual([], self.items('{"errors": [{"code": "x"}]}'))
+        self.assertEqual([], self.items('{"orders": null}'))
+
+    def test_truncated_body_raises(self):
+        self.assertRaises(ValueError, self.items, self.body[:-40])
+        self.assertRaises(ValueError, self.items, '[1, 2]')
+
+    def test_view_all_stream(self):
+        order = CertificateOrder(host='localhost', customer_api_key='abc123',
+                                 conn=MockConnection('localhost', responses={
+                                     '/services/v2/order/certificate': (200, 'OK', {'orders': self.orders}),
+                                 }))
+        streamed = order.view_all(stream=True)
+        self.assertEqual(1, next(streamed)['id'])
+        self.assertEqual([2, 3], [o['id'] for o in streamed])
+
+    def test_view_all_stream_failure(self):
+        order = CertificateOrder(host='localhost', customer_api_key='abc123',
+                                 conn=MockConnection('localhost', responses={
+                                     '/services/v2/order/certificate': (403, 'Forbidden', {'errors': []}),
+                                 }))
+        self.assertRaises(RuntimeError, list, order.view_all(stream=True))
+
+    def test_place_with_streamed_lookups(self):
+        traces = []
+        responses = {
+            '/services/v2/user/me': (200, 'OK', {'id': '1', 'container': {'id': '987654'}}),
+            '/services/v2/organization?container_id=987654': (200, 'OK', {'organizations': [
+                {'id': '1', 'name': 'Other', 'address': '', 'city': '', 'state': '', 'zip': '', 'country': ''},
+                {'id': '564738', 'name': 'FakeCo', 'address': '123 Nowhere Lane', 'city': 'Nowhere',
+                 'state': 'UT', 'zip': '12345', 'country': 'US'},
+            ]}),
+            '/services/v2/domain?container_id=987654': (200, 'OK', {'domains': [
+                {'id': '239487', 'name': 'fakeco.biz', 'organization': {'id': '564738'}},
+                {'id': '239488', 'name': 'other.biz', 'organization': {'id': '1'}},
+            ]}),
+            '/services/v2/order/certificate/ssl_plus': (201, 'Created', {'id': 'OID-223344'}),
+        }
+        order = CertificateOrder(host='localhost', customer_api_key='abc123', stream_lookups=True,
+                                 trace_hook=traces.append, conn=MockConnection('localhost', responses=responses))
+        response = order.place(common_name='fakeco.biz', certificate_type='sslplus', validity=1, csr='---CSR---',
+                               org_name='FakeCo', org_addr1='123 Nowhere Lane', org_city='Nowhere', org_state='UT',
+                               org_zip='12345', org_country='US')
+        self.assertEqual('OID-223344', response['id'])
+        self.assertEqual([None, 2, 1, None], [step['items'] for step in traces[0].steps])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+import ssl
+import unittest
+
+from ..https import VerifiedHTTPSConnection, trust_context, DEFAULT_CA_FILE, _as_cadata
+
+
+class TestTrustStore(unittest.TestCase):
+    def setUp(self):
+        with open(DEFAULT_CA_FILE) as f:
+            self.pem = f.read()
+        self.roots = ssl.create_default_context(cafile=DEFAULT_CA_FILE).cert_store_stats()['x509_ca']
+
+    def test_default_roots_loaded_once(self):
+        first = VerifiedHTTPSConnection('localhost')
+        second = VerifiedHTTPSConnection('localhost', port=8443)
+        self.assertTrue(first.context is second.context)
+        self.assertTrue(first.context is trust_context())
+        self.assertEqual(DEFAULT_CA_FILE, first.ca_file)
+        self.assertEqual(self.roots, first.context.cert_store_stats()['x509_ca'])
+        self.assertEqual(ssl.CERT_REQUIRED, first.context.verify_mode)
+
+    def test_in_memory_data(self):
+        conn = VerifiedHTTPSConnection('localhost', ca_data=self.pem)
+        self.assertEqual(self.roots, conn.context.cert_store_stats()['x509_ca'])
+        self.assertEqual(None, conn.ca_file)
+        der = ssl.PEM_cert_to_DER_cert(self.pem)
+        conn = VerifiedHTTPSConnection('localhost', ca_data=der)
+        self.assertEqual(1, conn.context.cert_store_stats()['x509_ca'])
+
+    def test_der_bundles(self):
+        pems = self.pem.split('-----END CERTIFICATE-----')[:2]
+        ders = [ssl.PEM_cert_to_DER_cert(pem.strip() + '-----END CERTIFICATE-----') for pem in pems]
+        converted = _as_cadata(''.join(ders))
+        self.assertEqual(2, converted.count('-----BEGIN CERTIFICATE-----'))
+        self.assertEqual(ders, [ssl.PEM_cert_to_DER_cert(pem.strip() + '-----END CERTIFICATE-----')
+                                for pem in converted.split('-----END CERTIFICATE-----')[:2]])
+
+    def test_fails_at_construction(self):
+        self.assertRaises(RuntimeError, VerifiedHTTPSConnection, 'localhost', ca_file='/nonexistent/roots.pem')
+        self.assertRaises(RuntimeError, VerifiedHTTPSConnection, 'localhost', ca_data='')
+        self.assertRaises(RuntimeError, VerifiedHTTPSConnection, 'localhost', ca_data='not a certificate')
+        self.assertRaises(RuntimeError, VerifiedHTTPSConnection, 'localhost',
+                          ca_data='-----BEGIN CERTIFICATE-----\nAAAA\n-----END CERTIFICATE-----\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
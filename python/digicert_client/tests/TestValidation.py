@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+import unittest
+from binascii import a2b_base64
+
+from . import MockConnection
+from .. import CertificateOrder
+from ..validation import parse_csr, validate_order, validate_orders
+
+# openssl req -new -newkey rsa:2048 -subj "/C=US/ST=UT/O=Example, Inc./CN=example.com" -sha256
+#     -addext "subjectAltName=DNS:example.com,DNS:www.example.com"
+RSA_2048_CSR = '\r\n'.join([
+    '-----BEGIN CERTIFICATE REQUEST-----',
+    'MIICxzCCAa8CAQAwSDELMAkGA1UEBhMCVVMxCzAJBgNVBAgMAlVUMRYwFAYDVQQK',
+    'DA1FeGFtcGxlLCBJbmMuMRQwEgYDVQQDDAtleGFtcGxlLmNvbTCCASIwDQYJKoZI',
+    'hvcNAQEBBQADggEPADCCAQoCggEBAJ6aeMtSRRCKHJOG6gHxn0OS0nNyPOCdSuRw',
+    'DT8E1t1m+ODxM5QZj0L7CgszjHpk/HgKpOA7Fwz3w+8A6xcSDt6iBs5DBQpa79ja',
+    '5jkBpVep4qMOCCVCWLMQbs5QRTBEP90oyVGOTgpyjuc05WDRvv5qbanlYbT46Gm+',
+    'VtCdSRbn3mrCTNKk4N6hqGFzYMjYqix9CnfkLMLP53bRkGvQWaGvrUFr6j8Q1IIf',
+    'geWMbUYu4WtUSEPI7XGoGEYuyR2nATx6Syq3QJyKo+EIz0CGlZk+XbPoao7y3XkN',
+    'zGfg9Zro8mj6VCHigEugB+HC9s64sHaWE/jqftyHAN95DfqwrA8CAwEAAaA6MDgG',
+    'CSqGSIb3DQEJDjErMCkwJwYDVR0RBCAwHoILZXhhbXBsZS5jb22CD3d3dy5leGFt',
+    'cGxlLmNvbTANBgkqhkiG9w0BAQsFAAOCAQEAM9bPQPobILk17gKYP6lE2N6DAcwe',
+    'XPPC1FfAfv+BvMa+QfuELzOs+2bFPK4LwUD3gIOVV0LjKmr6smQX01UCmB92u8pz',
+    '7wRTPMDiogqbDjJMZjZL9dMNvBD9l0wfM5XdWaJMn02I7n2BnT6czLjKRTEqP+3V',
+    'Sj3dXpsQznLJCDN6PQdemMrLL+j8hbJzdwRH9SvCQgztqSZmH9dlWKTN+vf/vkzZ',
+    'fDLgC0giw9icRZXgnuDsZmvCwVncYMpzZVY7Ze9v3OEr0H7htvBQ4MeeYOgOAcOe',
+    'aEaInSEokFetDiCfMxBTpKCTYcZWhrx90+E4jSm3lMcpuWT1J0JeN9Puzg==',
+    '-----END CERTIFICATE REQUEST-----',
+])
+
+# openssl req -new -newkey rsa:1024 -subj "/CN=weak.example.com" -sha1
+RSA_1024_SHA1_CSR = '\r\n'.join([
+    '-----BEGIN CERTIFICATE REQUEST-----',
+    'MIIBWjCBxAIBADAbMRkwFwYDVQQDDBB3ZWFrLmV4YW1wbGUuY29tMIGfMA0GCSqG',
+    'SIb3DQEBAQUAA4GNADCBiQKBgQC1NYeA2QPDAcG3tBUx/m0cP5bC7lI7rYHLyYX1',
+    'l9ivgeFf8LgxNan+k4MdH2EH5D92K6sQUCAynniNAJDt8dk+WuCBiwcjvlyutRCW',
+    'paEV0BMvRskh5stWlJ9YYmP033EigT7Od9tikOaMhd1L0c6E5D/uotQ85kVEfMon',
+    'eB++6QIDAQABoAAwDQYJKoZIhvcNAQEFBQADgYEArQGJHO/Yal7ZFxlSQepSDdl6',
+    'TGFVSOe4Fj0YOur7/qjKTDTGovDBwTngavqYmgqsberFde7lPGUd5hwJ4ElgEhU7',
+    'k/ATseZraFheqjQoW4e69E2EheVrCyi9G72jkRvGTTpT2iGxwKid77CeDHvHvIBN',
+    'wBb4Lnky3c52fSuxh80=',
+    '-----END CERTIFICATE REQUEST-----',
+])
+
+# openssl req -new -newkey ec -pkeyopt ec_paramgen_curve:P-256 -subj "/CN=*.example.com" -sha256
+EC_P256_CSR = '\r\n'.join([
+    '-----BEGIN CERTIFICATE REQUEST-----',
+    'MIHTMHoCAQAwGDEWMBQGA1UEAwwNKi5leGFtcGxlLmNvbTBZMBMGByqGSM49AgEG',
+    'CCqGSM49AwEHA0IABL7GEfP+9ZK/U3yOe8uUTK9RfM5G09mamm1EtahxVV9RRIJH',
+    'Zf939b7UA8iJmB6y2b0fzUo/zHErnr5bQd4m+NKgADAKBggqhkjOPQQDAgNJADBG',
+    'AiEAnRuz7d2B3qmk1S2E8SprDsjICCpymRUq5hp2Cg4I4p4CIQCmYhbOUCpWwG+o',
+    'snM5jL5SN5YwC1nTfc7HXvobOKfEkQ==',
+    '-----END CERTIFICATE REQUEST-----',
+])
+
+ORDER = {
+    'certificate_type': 'uc',
+    'csr': RSA_2048_CSR,
+    'validity': 1,
+    'common_name': 'example.com',
+    'sans': ['www.example.com'],
+    'org_name': 'Example, Inc.',
+    'org_addr1': '123 Nowhere Lane',
+    'org_city': 'Nowhere',
+    'org_state': 'UT',
+    'org_zip': '84321',
+    'org_country': 'US',
+    'org_contact_firstname': 'William',
+    'org_contact_lastname': 'Billson',
+    'org_contact_email': 'bbillson@example.com',
+    'org_contact_telephone': '801-555-1234',
+}
+
+
+def order(**changes):
+    o = dict(ORDER)
+    for name, value in changes.items():
+        if value is None:
+            del o[name]
+        else:
+            o[name] = value
+    return o
+
+
+class TestValidation(unittest.TestCase):
+    def codes(self, errors):
+        return sorted((error['field'], error['code']) for error in errors)
+
+    def test_parse_csr(self):
+        info = parse_csr(RSA_2048_CSR)
+        self.assertEqual('example.com', info.common_name)
+        self.assertEqual(('example.com', 'www.example.com'), info.dns_names)
+        self.assertEqual(('rsa', 2048), (info.key_type, info.key_size))
+        self.assertEqual('sha256WithRSAEncryption', info.signature_algorithm)
+        info = parse_csr(RSA_1024_SHA1_CSR)
+        self.assertEqual(('rsa', 1024, 'sha1WithRSAEncryption'), (info.key_type, info.key_size, info.signature_algorithm))
+        self.assertEqual((), info.dns_names)
+        info = parse_csr(EC_P256_CSR)
+        self.assertEqual(('*.example.com', 'ec', 'P-256', 256, 'ecdsa-with-SHA256'),
+                         (info.common_name, info.key_type, info.curve, info.key_size, info.signature_algorithm))
+
+    def test_parse_der_csr(self):
+        der = a2b_base64(''.join(RSA_2048_CSR.splitlines()[1:-1]))
+        self.assertEqual(('example.com', 2048), (parse_csr(der).common_name, parse_csr(der).key_size))
+        self.assertEqual('example.com', parse_csr(unicode(RSA_2048_CSR)).common_name)
+
+    def test_parse_invalid_csr(self):
+        der = a2b_base64(''.join(RSA_2048_CSR.splitlines()[1:-1]))
+        for csr in ['', 'not a csr', '-----BEGIN CERTIFICATE REQUEST-----\r\nMIIBstandin', der[:100], der + 'x',
+                    '-----BEGIN CERTIFICATE REQUEST-----\r\n!!!!\r\n-----END CERTIFICATE REQUEST-----']:
+            self.assertRaises(ValueError, parse_csr, csr)
+
+    def test_valid_order(self):
+        self.assertEqual([], validate_order(ORDER))
+        self.assertEqual([], validate_order(order(certificate_type='wildcard', common_name='*.example.com',
+                                                  csr=EC_P256_CSR, sans=None)))
+        self.assertEqual([], validate_order(order(certificate_type='ssl_multi_domain', validity='3', org_country='ca',
+                                                  org_state='on', org_zip='K1A 0B1')))
+
+    def test_all_errors_returned(self):
+        errors = validate_order(order(org_name=None, org_city='  ', certificate_type='sslplus', validity=3,
+                                      org_country='USA', org_contact_email='bbillson', signature_hash='md5'))
+        self.assertEqual([('org_city', 'missing_field'), ('org_contact_email', 'invalid_org_contact_email'),
+                          ('org_country', 'invalid_org_country'), ('org_name', 'missing_field'),
+                          ('sans', 'sans_not_supported'), ('signature_hash', 'invalid_signature_hash')],
+                         self.codes(errors))
+        for error in errors:
+            self.assertTrue(error['message'])
+
+    def test_field_formats(self):
+        for email in [5, ['bbillson@example.com'], {}]:
+            self.assertEqual([('org_contact_email', 'invalid_org_contact_email')],
+                             self.codes(validate_order(order(org_contact_email=email))))
+        self.assertEqual([('certificate_type', 'invalid_certificate_type')],
+                         self.codes(validate_order(order(certificate_type=['ssl_plus']))))
+        self.assertEqual([('csr', 'invalid_csr')], self.codes(validate_order(order(csr={'pem': RSA_2048_CSR}))))
+        self.assertEqual([('org_state', 'invalid_org_state'), ('org_zip', 'invalid_org_zip')],
+                         self.codes(validate_order(order(org_state='Utah', org_zip='8432'))))
+        self.assertEqual([], validate_order(order(org_country='GB', org_state='Greater London', org_zip='SW1A 1AA')))
+        self.assertEqual([('org_contact_telephone', 'invalid_org_contact_telephone'), ('telephone', 'invalid_telephone')],
+                         self.codes(validate_order(order(org_contact_telephone='555', telephone='call me'))))
+        self.assertEqual([('common_name', 'invalid_common_name'), ('csr', 'csr_common_name_mismatch'),
+                          ('csr', 'csr_san_mismatch'), ('sans', 'invalid_sans'), ('server_type', 'invalid_server_type')],
+                         self.codes(validate_order(order(common_name='example..com', sans=['-bad.example.com'],
+                                                         server_type='apache'))))
+
+    def test_product_combinations(self):
+        self.assertEqual([('certificate_type', 'invalid_certificate_type')],
+                         self.codes(validate_order(order(certificate_type='ssl_deluxe'))))
+        self.assertEqual([('validity', 'invalid_validity')], self.codes(validate_order(order(validity=4))))
+        self.assertEqual([('validity', 'invalid_validity')],
+                         self.codes(validate_order(order(certificate_type='evmulti', validity=3))))
+        self.assertEqual([('common_name', 'invalid_common_name')],
+                         self.codes(validate_order(order(certificate_type='wildcard'))))
+        self.assertEqual([('common_name', 'invalid_common_name')],
+                         self.codes(validate_order(order(common_name='*.example.com', csr=EC_P256_CSR, sans=None,
+                                                         certificate_type='evssl'))))
+
+    def test_csr_checks(self):
+        self.assertEqual([('csr', 'csr_common_name_mismatch'), ('csr', 'weak_key'), ('csr', 'weak_signature')],
+                         self.codes(validate_order(order(csr=RSA_1024_SHA1_CSR))))
+        self.assertEqual([('csr', 'csr_san_mismatch')], self.codes(validate_order(order(sans=None))))
+        self.assertEqual([], validate_order(order(common_name='EXAMPLE.com', sans=['WWW.example.com'])))
+        self.assertEqual([('csr', 'invalid_csr')], self.codes(validate_order(order(csr='MIIBstandin'))))
+
+    def test_batch(self):
+        orders = [ORDER, order(validity=5), ORDER, order(csr=RSA_1024_SHA1_CSR, org_country='XX')]
+        failures = validate_orders(orders)
+        self.assertEqual([1, 3], sorted(failures))
+        self.assertEqual([('validity', 'invalid_validity')], self.codes(failures[1]))
+        self.assertEqual(4, len(failures[3]))
+        self.assertEqual({}, validate_orders([ORDER] * 3))
+
+    def test_place_with_preflight(self):
+        conn = MockConnection('localhost')
+        client = CertificateOrder(host='localhost', customer_api_key='abc123', customer_name='12345', conn=conn,
+                                  preflight=True)
+        response = client.place(**order(org_zip='nowhere'))
+        self.assertEqual(400, response['status'])
+        self.assertEqual([('org_zip', 'invalid_org_zip')], self.codes(response['response']['errors']))
+        self.assertEqual(None, conn.path)
+        self.assertEqual('OID-223344', client.place(**ORDER)['id'])
+        self.assertEqual('/clients/retail/api/?action=order_certificate', conn.path)
+        self.assertEqual(client.validate(**order(org_zip='nowhere')), response['response']['errors'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,9 +8,19 @@ class MockResponse:
         self.status = status
         self.reason = reason
         self.payload = payload
-
-    def read(self):
-        return json.dumps(self.payload)
+        self.body = json.dumps(payload)
+        self.offset = 0
+
+    def read(self, amt=None):
+        end = len(self.body) if amt is None else self.offset + amt
+        data = self.body[self.offset:end]
+        self.offset += len(data)
+        return data
+
+    def getheader(self, name, default=None):
+        if 'content-type' == name.lower():
+            return 'application/json'
+        return default
 
 
 class MockConnection:
@@ -0,0 +1,491 @@
+#!/usr/bin/env python
+
+"""
+Local preflight checks of certificate orders, to catch the errors the API would reject an
+order for without spending a round trip (or, for a V2 place(), four) finding out.
+
+validate_order() checks an order's properties (the kwargs of CertificateOrder.place()):
+that the required properties are present, the formats of the organization's country, state,
+postal code and contact details, the host names, and that the validity and names suit the
+product ordered.  It also parses the CSR (PEM or DER) with parse_csr() and checks its key
+and signature algorithm, and that the names it requests match common_name and sans.  The
+signature itself is not verified.  All of the errors found are returned together, as a list
+of dicts with the 'code', 'field' and 'message' of each, in the style of the V2 API's errors.
+
+validate_orders() checks a batch of orders before any of them is submitted, parsing each
+distinct CSR once, and validate_csr() checks a CSR on its own.
+"""
+
+import re
+from binascii import a2b_base64, Error as Base64Error
+
+from .api.commands.v1 import ORDER_FIELDS
+
+# certificate_type: (allows sans, wildcard, extended validation), for the V1 names, the
+# V1 aliases of V2 names, and the V2 names
+_PRODUCTS = {
+    'sslplus': (False, False, False),
+    'ssl_plus': (False, False, False),
+    'uc': (True, False, False),
+    'sslmultidomain': (True, False, False),
+    'ssl_multi_domain': (True, False, False),
+    'wildcard': (True, True, False),
+    'sslwildcard': (True, True, False),
+    'ssl_wildcard': (True, True, False),
+    'evssl': (False, False, True),
+    'sslevplus': (False, False, True),
+    'ssl_ev_plus': (False, False, True),
+    'evmulti': (True, False, True),
+    'sslevmultidomain': (True, False, True),
+    'ssl_ev_multi_domain': (True, False, True),
+}
+
+VALIDITY_YEARS = (1, 2, 3)
+EV_MAX_VALIDITY = 2
+SIGNATURE_HASHES = ('sha256', 'sha384', 'sha512')
+MIN_RSA_KEY_SIZE = 2048
+
+_COUNTRIES = frozenset('''
+    AD AE AF AG AI AL AM AO AQ AR AS AT AU AW AX AZ BA BB BD BE BF BG BH BI BJ BL BM BN BO BQ BR BS
+    BT BV BW BY BZ CA CC CD CF CG CH CI CK CL CM CN CO CR CU CV CW CX CY CZ DE DJ DK DM DO DZ EC EE
+    EG EH ER ES ET FI FJ FK FM FO FR GA GB GD GE GF GG GH GI GL GM GN GP GQ GR GS GT GU GW GY HK HM
+    HN HR HT HU ID IE IL IM IN IO IQ IR IS IT JE JM JO JP KE KG KH KI KM KN KP KR KW KY KZ LA LB LC
+    LI LK LR LS LT LU LV LY MA MC MD ME MF MG MH MK ML MM MN MO MP MQ MR MS MT MU MV MW MX MY MZ NA
+    NC NE NF NG NI NL NO NP NR NU NZ OM PA PE PF PG PH PK PL PM PN PR PS PT PW PY QA RE RO RS RU RW
+    SA SB SC SD SE SG SH SI SJ SK SL SM SN SO SR SS ST SV SX SY SZ TC TD TF TG TH TJ TK TL TM TN TO
+    TR TT TV TW TZ UA UG UM US UY UZ VA VC VE VG VI VN VU WF WS YE YT ZA ZM ZW
+'''.split())
+
+# org_state codes, and org_zip formats, for the countries whose codes are checked
+_STATES = {
+    'US': frozenset('''
+        AL AK AZ AR CA CO CT DE DC FL GA HI ID IL IN IA KS KY LA ME MD MA MI MN MS MO MT NE NV NH NJ
+        NM NY NC ND OH OK OR PA RI SC SD TN TX UT VT VA WA WV WI WY AS GU MP PR VI UM AA AE AP
+    '''.split()),
+    'CA': frozenset('AB BC MB NB NL NS NT NU ON PE QC SK YT'.split()),
+}
+_POSTAL_CODES = {
+    'US': re.compile(r'^\d{5}(-\d{4})?$'),
+    'CA': re.compile(r'^[A-Za-z]\d[A-Za-z] ?\d[A-Za-z]\d$'),
+}
+
+_HOSTNAME = re.compile(r'^(\*\.)?([a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?$')
+_EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+_TELEPHONE = re.compile(r'^\+?[\d\s().-]+$')
+_PEM = re.compile(r'-----BEGIN (NEW )?CERTIFICATE REQUEST-----(.*?)-----END (NEW )?CERTIFICATE REQUEST-----',
+                  re.DOTALL)
+
+_COMMON_NAME_OID = '2.5.4.3'
+_EXTENSION_REQUEST_OID = '1.2.840.113549.1.9.14'
+_SUBJECT_ALT_NAME_OID = '2.5.29.17'
+
+_KEY_TYPES = {
+    '1.2.840.113549.1.1.1': 'rsa',
+    '1.2.840.10045.2.1': 'ec',
+    '1.2.840.10040.4.1': 'dsa',
+}
+_CURVES = {
+    '1.2.840.10045.3.1.7': ('P-256', 256),
+    '1.3.132.0.34': ('P-384', 384),
+    '1.3.132.0.35': ('P-521', 521),
+}
+_SIGNATURE_ALGORITHMS = {
+    '1.2.840.113549.1.1.4': 'md5WithRSAEncryption',
+    '1.2.840.113549.1.1.5': 'sha1WithRSAEncryption',
+    '1.2.840.113549.1.1.10': 'rsassaPss',
+    '1.2.840.113549.1.1.11': 'sha256WithRSAEncryption',
+    '1.2.840.113549.1.1.12': 'sha384WithRSAEncryption',
+    '1.2.840.113549.1.1.13': 'sha512WithRSAEncryption',
+    '1.2.840.10045.4.1': 'ecdsa-with-SHA1',
+    '1.2.840.10045.4.3.2': 'ecdsa-with-SHA256',
+    '1.2.840.10045.4.3.3': 'ecdsa-with-SHA384',
+    '1.2.840.10045.4.3.4': 'ecdsa-with-SHA512',
+    '1.2.840.10040.4.3': 'dsa-with-SHA1',
+}
+_WEAK_SIGNATURE_ALGORITHMS = frozenset(['md5WithRSAEncryption', 'sha1WithRSAEncryption', 'ecdsa-with-SHA1',
+                                        'dsa-with-SHA1'])
+
+_SEQUENCE = 0x30
+_SET = 0x31
+_INTEGER = 0x02
+_BIT_STRING = 0x03
+_OID = 0x06
+_ATTRIBUTES = 0xa0
+_DNS_NAME = 0x82
+_BMP_STRING = 0x1e
+
+
+class CSRInfo(object):
+    """What parse_csr() found in a certificate signing request."""
+
+    __slots__ = ('common_name', 'dns_names', 'key_type', 'key_size', 'curve', 'signature_algorithm')
+
+    def __init__(self, common_name=None, dns_names=(), key_type=None, key_size=None, curve=None,
+                 signature_algorithm=None):
+        """
+        :param common_name: The subject's common name, or None if the subject has none
+        :param dns_names: The DNS names of the subjectAltName extension requested, if any
+        :param key_type: 'rsa', 'ec', 'dsa', or the OID of the public key's algorithm
+        :param key_size: The key's size in bits (the modulus for RSA, the curve for EC)
+        :param curve: The name ('P-256', etc.) or OID of an EC key's curve
+        :param signature_algorithm: The name ('sha256WithRSAEncryption', etc.) or OID of the
+        algorithm the request is signed with
+        """
+        self.common_name = common_name
+        self.dns_names = tuple(dns_names)
+        self.key_type = key_type
+        self.key_size = key_size
+        self.curve = curve
+        self.signature_algorithm = signature_algorithm
+
+    def __repr__(self):
+        return 'CSRInfo(common_name=%r, dns_names=%r, key_type=%r, key_size=%r, signature_algorithm=%r)' % (
+            self.common_name, self.dns_names, self.key_type, self.key_size, self.signature_algorithm)
+
+
+def _tlv(data, offset, end):
+    """The tag of the DER element at offset, and the start and end of its content."""
+    if offset + 2 > end:
+        raise ValueError('Truncated DER element')
+    tag = data[offset]
+    length = data[offset + 1]
+    offset += 2
+    if length & 0x80:
+        n = length & 0x7f
+        if not 0 < n <= 4 or offset + n > end:
+            raise ValueError('Invalid DER length')
+        length = 0
+        for b in data[offset:offset + n]:
+            length = length << 8 | b
+        offset += n
+    if offset + length > end:
+        raise ValueError('Truncated DER element')
+    return tag, offset, offset + length
+
+
+def _children(data, start, end, *tags):
+    """The elements in the content from start to end, checking the tags of the first len(tags) of them."""
+    items = []
+    while start < end:
+        item = _tlv(data, start, end)
+        items.append(item)
+        start = item[2]
+    if len(items) < len(tags) or any(item[0] != tag for item, tag in zip(items, tags)):
+        raise ValueError('Unexpected DER structure')
+    return items
+
+
+def _oid(data, start, end):
+    if start >= end:
+        raise ValueError('Empty OID')
+    first = data[start]
+    parts = [min(first // 40, 2), first - 40 * min(first // 40, 2)]
+    value = 0
+    for b in data[start + 1:end]:
+        value = value << 7 | (b & 0x7f)
+        if not b & 0x80:
+            parts.append(value)
+            value = 0
+    return '.'.join(str(part) for part in parts)
+
+
+def _bit_length(data, start, end):
+    """The size in bits of the unsigned integer from start to end."""
+    while start < end and not data[start]:
+        start += 1
+    if start == end:
+        return 0
+    return (end - start - 1) * 8 + data[start].bit_length()
+
+
+def _string(data, tag, start, end):
+    raw = str(data[start:end])
+    return raw.decode('utf-16-be') if _BMP_STRING == tag else raw.decode('utf-8')
+
+
+def _der(csr):
+    if isinstance(csr, unicode):
+        try:
+            csr = csr.encode('ascii')
+        except UnicodeEncodeError:
+            raise ValueError('A PEM CSR must be ASCII')
+    if '-----BEGIN' in csr:
+        match = _PEM.search(csr)
+        if match is None:
+            raise ValueError('No PEM certificate request found')
+        try:
+            return a2b_base64(''.join(match.group(2).split()))
+        except Base64Error:
+            raise ValueError('Invalid base64 in PEM certificate request')
+    if csr[:1] == chr(_SEQUENCE):
+        return csr
+    raise ValueError('Not a PEM or DER certificate request')
+
+
+def parse_csr(csr):
+    """
+    Parse a PKCS#10 certificate signing request.  Raises ValueError if it cannot be parsed.
+
+    :param csr: The request, PEM text or DER bytes
+    :return: a CSRInfo
+    """
+    data = bytearray(_der(csr))
+    tag, start, end = _tlv(data, 0, len(data))
+    if _SEQUENCE != tag or end != len(data):
+        raise ValueError('Not a DER certificate request')
+    request_info, algorithm, signature = _children(data, start, end, _SEQUENCE, _SEQUENCE, _BIT_STRING)[:3]
+    info = _children(data, request_info[1], request_info[2], _INTEGER, _SEQUENCE, _SEQUENCE)
+    csr_info = CSRInfo()
+
+    for rdn in _children(data, info[1][1], info[1][2]):
+        if _SET != rdn[0]:
+            raise ValueError('Unexpected DER structure')
+        for attribute in _children(data, rdn[1], rdn[2]):
+            oid, value = _children(data, attribute[1], attribute[2], _OID)[:2]
+            if _COMMON_NAME_OID == _oid(data, oid[1], oid[2]):
+                csr_info.common_name = _string(data, *value)
+
+    key_algorithm, key = _children(data, info[2][1], info[2][2], _SEQUENCE, _BIT_STRING)[:2]
+    algorithm_items = _children(data, key_algorithm[1], key_algorithm[2], _OID)
+    key_oid = _oid(data, algorithm_items[0][1], algorithm_items[0][2])
+    csr_info.key_type = _KEY_TYPES.get(key_oid, key_oid)
+    if 'rsa' == csr_info.key_type:
+        public_key = _tlv(data, key[1] + 1, key[2])
+        modulus = _children(data, public_key[1], public_key[2], _INTEGER, _INTEGER)[0]
+        csr_info.key_size = _bit_length(data, modulus[1], modulus[2])
+    elif 'ec' == csr_info.key_type and len(algorithm_items) > 1 and _OID == algorithm_items[1][0]:
+        curve_oid = _oid(data, algorithm_items[1][1], algorithm_items[1][2])
+        csr_info.curve, csr_info.key_size = _CURVES.get(curve_oid, (curve_oid, None))
+
+    if len(info) > 3 and _ATTRIBUTES == info[3][0]:
+        dns_names = []
+        for attribute in _children(data, info[3][1], info[3][2]):
+            oid, values = _children(data, attribute[1], attribute[2], _OID, _SET)[:2]
+            if _EXTENSION_REQUEST_OID != _oid(data, oid[1], oid[2]):
+                continue
+            for extensions in _children(data, values[1], values[2]):
+                for extension in _children(data, extensions[1], extensions[2]):
+                    items = _children(data, extension[1], extension[2], _OID)
+                    if _SUBJECT_ALT_NAME_OID != _oid(data, items[0][1], items[0][2]):
+                        continue
+                    names = _tlv(data, items[-1][1], items[-1][2])
+                    for name in _children(data, names[1], names[2]):
+                        if _DNS_NAME == name[0]:
+                            dns_names.append(str(data[name[1]:name[2]]))
+        csr_info.dns_names = tuple(dns_names)
+
+    signature_oid = _oid(data, *_children(data, algorithm[1], algorithm[2], _OID)[0][1:])
+    csr_info.signature_algorithm = _SIGNATURE_ALGORITHMS.get(signature_oid, signature_oid)
+    return csr_info
+
+
+def _is_blank(value):
+    return value is None or (isinstance(value, basestring) and not value.strip())
+
+
+def _code(value):
+    return value.strip().upper() if isinstance(value, basestring) else str(value)
+
+
+def _is_hostname(name):
+    return isinstance(name, basestring) and len(name) <= 253 and _HOSTNAME.match(name.lower()) is not None
+
+
+def _check_csr(csr_info, order, errors):
+    if 'rsa' == csr_info.key_type:
+        if csr_info.key_size < MIN_RSA_KEY_SIZE:
+            errors.append(_error('weak_key', 'csr', 'The CSR\'s RSA key is %d bits; at least %d are required'
+                                 % (csr_info.key_size, MIN_RSA_KEY_SIZE)))
+    elif 'ec' == csr_info.key_type:
+        if csr_info.key_size is None:
+            errors.append(_error('unsupported_key', 'csr', 'The CSR\'s EC key uses an unsupported curve (%s)'
+                                 % csr_info.curve))
+    else:
+        errors.append(_error('unsupported_key', 'csr', 'The CSR\'s key type (%s) is not supported' % csr_info.key_type))
+
+    if csr_info.signature_algorithm in _WEAK_SIGNATURE_ALGORITHMS:
+        errors.append(_error('weak_signature', 'csr', 'The CSR is signed with %s' % csr_info.signature_algorithm))
+    elif csr_info.signature_algorithm not in _SIGNATURE_ALGORITHMS.values():
+        errors.append(_error('unsupported_signature', 'csr', 'The CSR\'s signature algorithm (%s) is not supported'
+                             % csr_info.signature_algorithm))
+
+    common_name = order.get('common_name')
+    if not isinstance(common_name, basestring):
+        return
+    if csr_info.common_name is not None and csr_info.common_name.lower() != common_name.lower():
+        errors.append(_error('csr_common_name_mismatch', 'csr', 'The CSR\'s common name "%s" does not match "%s"'
+                             % (csr_info.common_name, common_name)))
+    ordered = set([common_name.lower()])
+    sans = order.get('sans')
+    if isinstance(sans, (list, tuple)):
+        ordered.update(name.lower() for name in sans if isinstance(name, basestring))
+    unordered = [name for name in csr_info.dns_names if name.lower() not in ordered]
+    if unordered:
+        errors.append(_error('csr_san_mismatch', 'csr', 'The CSR requests names not in common_name or sans: %s'
+                             % ', '.join(unordered)))
+
+
+def _error(code, field, message):
+    return {'code': code, 'field': field, 'message': message}
+
+
+def _parsed_csr(csr, csrs):
+    """The CSRInfo for csr, or the ValueError parsing it raised; csrs, if given, caches the results."""
+    if not isinstance(csr, basestring):
+        return ValueError('Expected PEM text or DER bytes, not %s' % type(csr).__name__)
+    if csrs is not None and csr in csrs:
+        return csrs[csr]
+    try:
+        result = parse_csr(csr)
+    except ValueError as e:
+        result = e
+    if csrs is not None:
+        csrs[csr] = result
+    return result
+
+
+def validate_order(order, csrs=None):
+    """
+    Check an order's properties before it is placed.
+
+    :param order: A dict of the properties passed to CertificateOrder.place()
+    :param csrs: Optional dict in which parsed CSRs are cached, keyed by the CSR
+    :return: a list of the errors found (dicts with 'code', 'field' and 'message'), empty if none were
+    """
+    errors = []
+    for field in ORDER_FIELDS:
+        if _is_blank(order.get(field)):
+            errors.append(_error('missing_field', field, 'No value provided for required property "%s"' % field))
+
+    product = None
+    certificate_type = order.get('certificate_type')
+    if not _is_blank(certificate_type):
+        product = _PRODUCTS.get(certificate_type) if isinstance(certificate_type, basestring) else None
+        if product is None:
+            errors.append(_error('invalid_certificate_type', 'certificate_type',
+                                 'Unknown certificate type "%s"' % certificate_type))
+    allows_sans, wildcard, ev = product or (True, None, False)
+
+    validity = order.get('validity')
+    if not _is_blank(validity):
+        try:
+            validity = int(validity)
+        except (TypeError, ValueError):
+            validity = None
+        if validity not in VALIDITY_YEARS:
+            errors.append(_error('invalid_validity', 'validity', 'Validity must be one of %s years'
+                                 % ', '.join(str(years) for years in VALIDITY_YEARS)))
+        elif ev and validity > EV_MAX_VALIDITY:
+            errors.append(_error('invalid_validity', 'validity', 'EV certificates are valid for at most %d years'
+                                 % EV_MAX_VALIDITY))
+
+    common_name = order.get('common_name')
+    if not _is_blank(common_name):
+        if not _is_hostname(common_name):
+            errors.append(_error('invalid_common_name', 'common_name', 'Invalid host name "%s"' % common_name))
+        elif wildcard and not common_name.startswith('*.'):
+            errors.append(_error('invalid_common_name', 'common_name',
+                                 'A wildcard certificate\'s common name must begin with "*."'))
+        elif wildcard is False and common_name.startswith('*.'):
+            errors.append(_error('invalid_common_name', 'common_name',
+                                 'Wildcard common names require a wildcard certificate type'))
+
+    sans = order.get('sans')
+    if sans:
+        if not isinstance(sans, (list, tuple)):
+            errors.append(_error('invalid_sans', 'sans', 'sans must be a list of host names'))
+        else:
+            invalid = [name for name in sans if not _is_hostname(name)]
+            if invalid:
+                errors.append(_error('invalid_sans', 'sans', 'Invalid host names in sans: %s'
+                                     % ', '.join(str(name) for name in invalid)))
+            if not allows_sans:
+                errors.append(_error('sans_not_supported', 'sans',
+                                     'Certificate type "%s" does not support sans' % certificate_type))
+
+    country = order.get('org_country')
+    if not _is_blank(country):
+        country = _code(country)
+        if country not in _COUNTRIES:
+            errors.append(_error('invalid_org_country', 'org_country',
+                                 'Unknown ISO 3166 country code "%s"' % order['org_country']))
+        state = order.get('org_state')
+        if country in _STATES and not _is_blank(state) and _code(state) not in _STATES[country]:
+            errors.append(_error('invalid_org_state', 'org_state', 'Unknown state or province code "%s" for %s'
+                                 % (state, country)))
+        postal_code = order.get('org_zip')
+        if country in _POSTAL_CODES and not _is_blank(postal_code) and \
+                not _POSTAL_CODES[country].match(str(postal_code).strip()):
+            errors.append(_error('invalid_org_zip', 'org_zip', 'Invalid postal code "%s" for %s'
+                                 % (postal_code, country)))
+
+    email = order.get('org_contact_email')
+    if not _is_blank(email) and not (isinstance(email, basestring) and _EMAIL.match(email)):
+        errors.append(_error('invalid_org_contact_email', 'org_contact_email', 'Invalid email address "%s"' % email))
+
+    for field in ('org_contact_telephone', 'telephone'):
+        telephone = order.get(field)
+        if not _is_blank(telephone):
+            telephone = str(telephone)
+            if not _TELEPHONE.match(telephone) or sum(c.isdigit() for c in telephone) < 7:
+                errors.append(_error('invalid_' + field, field, 'Invalid telephone number "%s"' % telephone))
+
+    for field in ('server_type', 'server_platform'):
+        if not _is_blank(order.get(field)):
+            try:
+                int(order[field])
+            except (TypeError, ValueError):
+                errors.append(_error('invalid_' + field, field, '%s must be an integer' % field))
+
+    signature_hash = order.get('signature_hash')
+    if not _is_blank(signature_hash) and signature_hash not in SIGNATURE_HASHES:
+        errors.append(_error('invalid_signature_hash', 'signature_hash', 'signature_hash must be one of %s'
+                             % ', '.join(SIGNATURE_HASHES)))
+
+    csr = order.get('csr')
+    if not _is_blank(csr):
+        errors.extend(validate_csr(csr, order.get('common_name'), order.get('sans'), csrs))
+    return errors
+
+
+def validate_csr(csr, common_name=None, sans=None, csrs=None):
+    """
+    Check a CSR on its own, e.g. before uploading it for an existing order: that it can be parsed,
+    its key and signature algorithm, and, if common_name is given, that the names it requests
+    are common_name and sans.
+
+    :param csr: The CSR, PEM text or DER bytes
+    :param csrs: Optional dict in which parsed CSRs are cached, keyed by the CSR
+    :return: a list of the errors found, empty if none were
+    """
+    errors = []
+    if _is_blank(csr):
+        errors.append(_error('missing_field', 'csr', 'No value provided for required property "csr"'))
+        return errors
+    csr_info = _parsed_csr(csr, csrs)
+    if isinstance(csr_info, ValueError):
+        errors.append(_error('invalid_csr', 'csr', 'The CSR could not be parsed: %s' % csr_info))
+    else:
+        _check_csr(csr_info, {'common_name': common_name, 'sans': sans}, errors)
+    return errors
+
+
+def validate_orders(orders):
+    """
+    Check a batch of orders before any of them is placed, parsing each distinct CSR once.
+
+    :param orders: An iterable of dicts of the properties passed to CertificateOrder.place()
+    :return: a dict mapping the index of each order with errors to its list of errors, empty if
+    every order passed
+    """
+    csrs = {}
+    failures = {}
+    for i, order in enumerate(orders):
+        errors = validate_order(order, csrs)
+        if errors:
+            failures[i] = errors
+    return failures
+
+
+if __name__ == '__main__':
+    pass
@@ -22,7 +22,7 @@ setup(
     author_email='support@digicert.com',
     license='MIT',
     zip_safe=False,
-    packages=find_packages(exclude=['tests.*', '*.tests.*', '*.tests', 'tests']),
+    packages=find_packages(exclude=['tests.*', '*.tests.*', '*.tests', 'tests', 'benchmarks', 'benchmarks.*']),
     include_package_data=True,
     test_suite='nose.collector',
     tests_require=['nose'],